@@ -0,0 +1,55 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 锚点：元素内的相对位置（宽、高的比例）
+ANCHORS = {
+    "center": (0.5, 0.5),
+    "top-left": (0.0, 0.0),
+    "top-right": (1.0, 0.0),
+    "bottom-left": (0.0, 1.0),
+    "bottom-right": (1.0, 1.0),
+}
+
+
+def resolve_point(geometry: Sequence[int], anchor: str = "center", offset: Optional[Sequence[int]] = None,
+                  pct: Optional[Sequence[float]] = None) -> Tuple[int, int]:
+    """
+    由元素几何信息计算坐标：先取锚点（或百分比位置），再加上像素偏移
+    :param geometry: 元素的(x, y, width, height)
+    :param anchor: 锚点名（见ANCHORS），指定pct时忽略
+    :param offset: 像素偏移(dx, dy)（可选）
+    :param pct: 元素内的百分比位置(0~1, 0~1)（可选）
+    :return: 绝对坐标(x, y)
+    """
+    x, y, width, height = geometry
+    if pct is not None:
+        fx, fy = pct
+    elif anchor in ANCHORS:
+        fx, fy = ANCHORS[anchor]
+    else:
+        raise ValueError(f"未知的锚点: {anchor}")
+    dx, dy = offset or (0, 0)
+    return x + int(width * fx) + dx, y + int(height * fy) + dy
+
+
+def symbolic_target(element_path: Optional[str] = None, role_name_list: Optional[List[Optional[str]]] = None,
+                    anchor: str = "center", offset: Optional[Sequence[int]] = None,
+                    pct: Optional[Sequence[float]] = None) -> Dict:
+    """
+    生成符号目标（指令参数中的at/end_at），由被测试机器在注入时按元素当前位置解析为坐标
+    :param element_path: 元素路径（为空表示被测应用本身）
+    :param role_name_list: 角色名列表（可选）
+    :param anchor: 锚点名（见ANCHORS）
+    :param offset: 像素偏移(dx, dy)（可选）
+    :param pct: 元素内的百分比位置（可选，优先于锚点）
+    :return: {"element_path", "role_name_list", "anchor", "offset", "pct"}（省略未指定的字段）
+    """
+    target = {"anchor": anchor}
+    if element_path:
+        target["element_path"] = element_path
+    if role_name_list:
+        target["role_name_list"] = list(role_name_list)
+    if offset:
+        target["offset"] = list(offset)
+    if pct is not None:
+        target["pct"] = list(pct)
+    return target
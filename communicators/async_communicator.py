@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+from protocol import (FORMAT_JSON, FRAME_HEADER, ProtocolError, decode_payload, encode_payload,
+                      pack_frame, parse_frame_header)
+
+
+class AsyncTestMachineCommunicator:
+    """
+    测试者机器的异步通信类：每个请求带唯一id，同一连接上可同时挂起多个请求
+    请求方法立即发送并返回Future，调用方在需要结果时再await
+    """
+
+    def __init__(self, target_host: str, target_port: int, payload_format: int = FORMAT_JSON):
+        """
+        :param target_host: 被测试机器的IP地址
+        :param target_port: 被测试机器的通信端口
+        :param payload_format: 请求负载编码（FORMAT_JSON 或 FORMAT_BINARY）
+        """
+        self.target_host = target_host
+        self.target_port = target_port
+        self.payload_format = payload_format
+        self.reader = None
+        self.writer = None
+        self._pending: Dict[int, asyncio.Future] = {}  # 请求id -> 等待响应的Future
+        self._ids = itertools.count(1)
+        self._read_task = None
+
+    async def connect(self) -> None:
+        """建立与被测试机器的TCP连接并启动响应读取任务"""
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.target_host, self.target_port)
+        except OSError as e:
+            raise ConnectionError(f"无法连接到被测试机器: {str(e)}")
+        self._read_task = asyncio.ensure_future(self._read_responses())
+        print(f"成功连接到被测试机器 {self.target_host}:{self.target_port}")
+
+    async def _read_responses(self) -> None:
+        """持续读取响应帧，按id交付给对应的Future"""
+        error = None
+        try:
+            while True:
+                try:
+                    header = await self.reader.readexactly(FRAME_HEADER.size)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        raise ProtocolError("连接在帧头中途断开")
+                    break  # 对端在帧边界正常关闭
+                length, payload_format = parse_frame_header(header)
+                payload = await self.reader.readexactly(length)
+                response = decode_payload(payload, payload_format)
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            error = e
+        # 连接结束：所有未完成的请求以通信错误结束
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(f"通信错误: {str(error) if error else '连接已关闭'}"))
+        self._pending.clear()
+
+    def send_request(self, request_type: str, data: Dict) -> asyncio.Future:
+        """
+        立即发送请求，不等待响应
+        :param request_type: 请求类型（get_element/get_elements/exec_commands）
+        :param data: 请求数据
+        :return: 结果为响应字典的Future
+        """
+        if not self.writer or self._read_task.done():
+            raise RuntimeError("通信错误: 连接未建立或已断开")
+        request_id = next(self._ids)
+        request = {
+            "id": request_id,
+            "type": request_type,
+            "data": data,
+            "timestamp": time.time()
+        }
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        # 写入发送缓冲区的顺序即请求到达被测试机器的顺序
+        self.writer.write(pack_frame(encode_payload(request, self.payload_format), self.payload_format))
+        return future
+
+    def get_element_info(self, element_path: str,
+                         role_name_list: Optional[List[Optional[str]]] = None) -> asyncio.Future:
+        """
+        请求获取元素信息
+        :param element_path: 元素路径（如"菜单/文件/新建"）
+        :param role_name_list: 元素角色名列表
+        :return: 结果为元素信息字典的Future
+        """
+        return self.send_request("get_element", {
+            "element_path": element_path,
+            "role_name_list": role_name_list
+        })
+
+    def get_elements_info(self, elements: List[Tuple[str, Optional[List[Optional[str]]]]]) -> asyncio.Future:
+        """
+        批量请求获取元素信息
+        :param elements: [(元素路径, 角色名列表), ...]
+        :return: 结果为批量查询响应的Future
+        """
+        return self.send_request("get_elements", {
+            "elements": [[element_path, role_name_list] for element_path, role_name_list in elements]
+        })
+
+    def wait_element_info(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None,
+                          timeout: float = 10.0) -> asyncio.Future:
+        """
+        请求等待元素出现
+        :param element_path: 元素路径
+        :param role_name_list: 元素角色名列表
+        :param timeout: 超时时间（秒）
+        :return: 结果为元素信息字典（额外包含等待耗时waited）的Future
+        """
+        return self.send_request("wait_element", {
+            "element_path": element_path,
+            "role_name_list": role_name_list,
+            "timeout": timeout
+        })
+
+    def execute_commands(self, commands: List[Dict]) -> asyncio.Future:
+        """
+        发送指令集到被测试机器执行（被测试机器按到达顺序串行执行）
+        :param commands: 指令集列表
+        :return: 结果为执行结果的Future
+        """
+        return self.send_request("exec_commands", {"commands": commands})
+
+    async def close(self) -> None:
+        """等待已发送请求的响应后关闭连接"""
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+            print("连接已关闭")
+        if self._read_task:
+            await self._read_task
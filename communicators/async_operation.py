@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Dict, List, Optional, Tuple
+from anchors import symbolic_target
+from async_communicator import AsyncTestMachineCommunicator
+from operation import Operation
+
+
+class AsyncOperation:
+    """
+    Operation的流水线异步版本：每个操作立即返回Future，脚本只在需要结果时await
+    元素位置查询可相互重叠；指令集按操作调用顺序发送，被测试机器按到达顺序注入输入
+    """
+
+    def __init__(self, communicator: AsyncTestMachineCommunicator):
+        """
+        :param communicator: 已连接的异步通信类实例（可使用AsyncOperation.connect创建）
+        """
+        self.communicator = communicator
+        self.commands_list = []  # 存储整个测试文件生成的指令列表（按发送顺序）
+        self._last_sent = None  # 上一个操作的"指令集已发送"Future，用于保证发送顺序
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @classmethod
+    async def connect(cls, test_machine_ip: str, test_machine_port: int = 8888) -> "AsyncOperation":
+        """
+        建立连接并创建异步操作类
+        :param test_machine_ip: 被测试机器的IP地址
+        :param test_machine_port: 被测试机器的通信端口
+        """
+        communicator = AsyncTestMachineCommunicator(test_machine_ip, test_machine_port)
+        await communicator.connect()
+        return cls(communicator)
+
+    @staticmethod
+    def _command(action: str, params: Dict) -> Dict:
+        """生成单个操作指令（格式与Operation._generate_command相同）"""
+        return {"action": action, "params": params, "timestamp": time.time()}
+
+    def get_location(self, element_path: str, role_name_list: Optional[List[str]] = None) -> asyncio.Future:
+        """
+        获取元素位置信息
+        :param element_path: 元素路径
+        :param role_name_list: 元素角色名列表（可选）
+        :return: 结果为位置信息字典{x,y,width,height,center_x,center_y}的Future
+        """
+        return asyncio.ensure_future(self._get_location(element_path, role_name_list))
+
+    async def _get_location(self, element_path: str, role_name_list: Optional[List[str]]) -> Dict:
+        response = await self.communicator.get_element_info(element_path, role_name_list)
+        if not response.get("success", False):
+            raise ValueError(f"获取元素位置失败: {response.get('error', '未知错误')}")
+        return Operation._parse_location(response["data"])
+
+    def get_locations(self, targets: List[Tuple[str, Optional[List[str]]]]) -> asyncio.Future:
+        """
+        一次网络往返获取多个元素的位置信息
+        :param targets: [(元素路径, 角色名列表), ...]
+        :return: 结果为位置信息字典列表的Future
+        """
+        return asyncio.ensure_future(self._get_locations(targets))
+
+    async def _get_locations(self, targets: List[Tuple[str, Optional[List[str]]]]) -> List[Dict]:
+        response = await self.communicator.get_elements_info(targets)
+        results = response.get("data") or []
+        if len(results) != len(targets):
+            raise ValueError(f"获取元素位置失败: {response.get('error', '响应数量不匹配')}")
+        locations = []
+        for (element_path, _), result in zip(targets, results):
+            if not result.get("success", False):
+                raise ValueError(f"获取元素位置失败: {element_path}: {result.get('error', '未知错误')}")
+            locations.append(Operation._parse_location(result["data"]))
+        return locations
+
+    def _submit(self, build_commands: Awaitable[List[Dict]]) -> asyncio.Future:
+        """
+        按调用顺序提交一个操作：先等待指令生成（可能需要查询元素位置），
+        再等待上一个操作的指令集发出后发送本操作的指令集
+        :param build_commands: 生成指令列表的协程
+        :return: 结果为执行结果的Future
+        """
+        previous = self._last_sent
+        sent = asyncio.get_running_loop().create_future()
+        self._last_sent = sent
+        return asyncio.ensure_future(self._send_in_order(build_commands, previous, sent))
+
+    async def _send_in_order(self, build_commands: Awaitable[List[Dict]],
+                             previous: Optional[asyncio.Future], sent: asyncio.Future) -> Dict:
+        error = None
+        try:
+            commands = await build_commands
+        except Exception as e:
+            error = e
+        try:
+            # 即使本操作失败也要等到前一个操作发出，后续操作才能继续，避免乱序
+            if previous is not None:
+                await previous
+            if error is None:
+                self.commands_list.append(commands)
+                self.logger.info(f"当前操作要执行的指令集，共{len(commands)}条指令")
+                response = self.communicator.execute_commands(commands)
+        finally:
+            sent.set_result(None)
+        if error is not None:
+            raise error
+        result = await response
+        self.logger.info(f"执行指令集结果: {result}")
+        return result
+
+    def execute(self, commands: List[Dict]) -> asyncio.Future:
+        """
+        按顺序提交已生成的指令集
+        :param commands: 指令列表
+        :return: 结果为执行结果的Future
+        """
+        async def build():
+            return commands
+        return self._submit(build())
+
+    def click_element(self, element_path: str, role_name_list: Optional[List[str]] = None,
+                      button: str = "left") -> asyncio.Future:
+        """
+        点击元素（移动到中心位置后点击），元素位置由被测试机器在注入时解析
+        :param element_path: 元素路径
+        :param role_name_list: 元素角色名列表（可选）
+        :param button: 鼠标按键（left/right）
+        :return: 结果为执行结果的Future
+        """
+        at = symbolic_target(element_path, role_name_list)
+        return self.execute([
+            self._command("mouse_move", {"at": at}),
+            self._command("mouse_click", {"at": at, "button": button})
+        ])
+
+    def right_click_element(self, element_path: str, role_name_list: Optional[List[str]] = None) -> asyncio.Future:
+        """
+        右键点击元素
+        :param element_path: 元素路径
+        :param role_name_list: 元素角色名列表（可选）
+        :return: 结果为执行结果的Future
+        """
+        return self.click_element(element_path, role_name_list, button="right")
+
+    def input_text(self, element_path: Optional[str], text: str, role_name_list: Optional[List[str]] = None,
+                   interval: float = 0.0) -> asyncio.Future:
+        """
+        输入文本（若有元素则先点击激活）
+        :param element_path: 元素路径（可选）
+        :param text: 要输入的文本内容
+        :param role_name_list: 元素角色名列表（可选）
+        :param interval: 每个按键之间的间隔秒数
+        :return: 结果为执行结果的Future
+        """
+        location = self.get_location(element_path, role_name_list) if element_path else None
+
+        async def build():
+            commands = []
+            type_params = {"text": text, "interval": interval}
+            if location is not None:
+                loc = await location
+                commands.append(self._command("mouse_move", {"x": loc["center_x"], "y": loc["center_y"]}))
+                commands.append(self._command(
+                    "mouse_click", {"x": loc["center_x"], "y": loc["center_y"], "button": "left"}
+                ))
+                type_params.update({"element_path": element_path, "role_name_list": role_name_list})
+            commands.append(self._command("type_text", type_params))
+            return commands
+        return self._submit(build())
+
+    def hotkey(self, keys: List[str]) -> asyncio.Future:
+        """
+        组合键操作
+        :param keys: 组合键列表，如["Ctrl", "c"]
+        :return: 结果为执行结果的Future
+        """
+        return self.execute([self._command("hotkey", {"keys": keys})])
+
+    @staticmethod
+    def _drag_params(start_x: int, start_y: int, end_x: int, end_y: int,
+                     duration: float = 0.3, easing: str = "ease_in_out") -> Dict:
+        """drag_path指令参数（中间轨迹由被测试机器插值注入）"""
+        return {"x": start_x, "y": start_y, "end_x": end_x, "end_y": end_y,
+                "duration": duration, "easing": easing, "button": "left"}
+
+    def drag_to(self, start_x: int, start_y: int, end_x: int, end_y: int,
+                duration: float = 0.3, easing: str = "ease_in_out") -> asyncio.Future:
+        """
+        拖拽操作（绝对坐标）
+        :param duration: 从起点移动到终点的耗时（秒）
+        :param easing: 缓动函数名
+        :return: 结果为执行结果的Future
+        """
+        return self.execute([
+            self._command("drag_path", self._drag_params(start_x, start_y, end_x, end_y, duration, easing))
+        ])
+
+    def drag_item_to_parent(self, item_path: str, parent_path: str,
+                            item_role_list: Optional[List[str]] = None,
+                            parent_role_list: Optional[List[str]] = None) -> asyncio.Future:
+        """
+        拖拽元素到父元素中心
+        :return: 结果为执行结果的Future
+        """
+        locations = self.get_locations([(item_path, item_role_list), (parent_path, parent_role_list)])
+
+        async def build():
+            item_loc, parent_loc = await locations
+            return [self._command("drag_path", self._drag_params(
+                item_loc["center_x"], item_loc["center_y"], parent_loc["center_x"], parent_loc["center_y"]
+            ))]
+        return self._submit(build())
+
+    async def close(self) -> None:
+        """等待已提交的操作发出后关闭连接"""
+        if self._last_sent is not None:
+            await self._last_sent
+        await self.communicator.close()
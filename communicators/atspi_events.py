@@ -0,0 +1,77 @@
+import threading
+from typing import Callable, Iterable, List
+
+try:
+    import pyatspi
+except ImportError:  # 无AT-SPI桌面环境时退化为空操作
+    pyatspi = None
+
+# 元素缓存失效关注的事件
+DEFAULT_EVENT_TYPES = ("object:children-changed", "window:create", "window:destroy")
+
+
+class AtspiEventMonitor:
+    """
+    订阅AT-SPI事件并分发给已注册的监听者
+    事件循环在后台线程中运行；pyatspi不可用时start()不做任何事，available为False
+    """
+
+    def __init__(self, event_types: Iterable[str] = DEFAULT_EVENT_TYPES):
+        """
+        :param event_types: 订阅的事件类型（如"object:children-changed"）
+        """
+        self.event_types = list(event_types)
+        self.available = pyatspi is not None
+        self._listeners: List[Callable] = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        """事件循环是否已启动"""
+        return self._thread is not None
+
+    def add_listener(self, callback: Callable[[str, object], None]) -> None:
+        """
+        注册监听者
+        :param callback: 回调函数，参数为(事件类型字符串, 事件源节点)
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, object], None]) -> None:
+        """注销监听者"""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _on_event(self, event) -> None:
+        """pyatspi事件回调，转发给所有监听者"""
+        with self._lock:
+            listeners = list(self._listeners)
+        event_type = str(event.type)
+        for callback in listeners:
+            try:
+                callback(event_type, event.source)
+            except Exception as e:
+                print(f"AT-SPI事件处理失败: {event_type}: {str(e)}")
+
+    def start(self) -> bool:
+        """
+        注册事件并在后台线程中运行AT-SPI事件循环
+        :return: 是否成功启动（pyatspi不可用时返回False）
+        """
+        if not self.available or self._thread:
+            return self._thread is not None
+        pyatspi.Registry.registerEventListener(self._on_event, *self.event_types)
+        self._thread = threading.Thread(target=pyatspi.Registry.start, name="atspi-events", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """注销事件并停止事件循环"""
+        if not self._thread:
+            return
+        pyatspi.Registry.deregisterEventListener(self._on_event, *self.event_types)
+        pyatspi.Registry.stop()
+        self._thread = None
@@ -0,0 +1,518 @@
+import abc
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from dogtail.tree import SearchError
+except ImportError:
+    SearchError = LookupError  # 未安装dogtail时，节点查找失败统一抛出LookupError
+
+# 选择后端的环境变量，取值见create_backend
+BACKEND_ENV = "AUTO_TEST_BACKEND"
+# dogtail的鼠标键编号
+DOGTAIL_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+MOTION_DELAY = 0.001  # dogtail单次移动事件后的等待（秒）
+
+
+class AccessibilityBackend(abc.ABC):
+    """
+    无障碍后端接口：元素树查找、几何信息、输入注入和截图
+    抽象方法须全部实现，缺少实现的后端在创建时即报错
+    节点对象需提供dogtail节点的常用属性（name、roleName、children、position、size、extents、showing、child()），
+    元素缓存与树快照直接读取这些属性
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def root(self):
+        """桌面根节点"""
+        raise NotImplementedError
+
+    def application(self, app_name: str):
+        """
+        查找应用节点
+        :param app_name: 应用名称
+        :return: 应用节点，不存在时抛出LookupError
+        """
+        app = self.find_child(self.root(), app_name, "application", recursive=False)
+        if app is None:
+            raise LookupError(f"应用不存在: {app_name}")
+        return app
+
+    @abc.abstractmethod
+    def find_child(self, node, name: Optional[str] = None, role: Optional[str] = None, recursive: bool = True):
+        """
+        查找第一个匹配的后代节点
+        :param node: 起点节点
+        :param name: 名称（None表示不限制）
+        :param role: 角色名（None表示不限制）
+        :param recursive: 是否递归查找（False时只查直接子节点）
+        :return: 节点，未找到返回None
+        """
+        raise NotImplementedError
+
+    def geometry(self, node) -> Tuple[int, int, int, int]:
+        """节点的(x, y, width, height)"""
+        x, y = node.position
+        width, height = node.size
+        return x, y, width, height
+
+    def screen_geometry(self) -> Tuple[int, int, int, int]:
+        """整个屏幕的(x, y, width, height)，默认取桌面根节点的范围"""
+        return self.geometry(self.root())
+
+    @abc.abstractmethod
+    def motion(self, x: int, y: int) -> None:
+        """鼠标移动到绝对坐标"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        """在绝对坐标点击"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def press(self, button: str = "left") -> None:
+        """按下鼠标键"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, button: str = "left") -> None:
+        """释放鼠标键"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def key_combo(self, keys: List[str]) -> None:
+        """执行组合键（单个按键传入一项）"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def type_text(self, text: str, interval: float = 0.0) -> None:
+        """以键盘事件连续输入文本"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_text(self, node, text: str) -> bool:
+        """通过EditableText接口直接设置文本，返回是否成功（不支持时抛出NotImplementedError）"""
+        raise NotImplementedError
+
+    def refresh_rate(self) -> float:
+        """显示器刷新率（Hz），服务端按此频率注入拖拽轨迹的移动事件"""
+        return 60.0
+
+    @abc.abstractmethod
+    def screenshot(self, region: Optional[Tuple[int, int, int, int]] = None):
+        """
+        截取屏幕区域
+        :param region: (left, top, width, height)，None表示全屏
+        :return: RGB图像（PIL图像或高×宽×3的数组）
+        """
+        raise NotImplementedError
+
+
+class DogtailBackend(AccessibilityBackend):
+    """基于dogtail（AT-SPI）的真实桌面后端"""
+
+    name = "dogtail"
+
+    def __init__(self):
+        # 延迟导入，使其他后端无需安装dogtail
+        import dogtail.tree
+        from dogtail.config import config
+        from dogtail import rawinput
+        self._tree = dogtail.tree
+        self._config = config
+        self._rawinput = rawinput
+        self._refresh_rate = None
+        self._pointer = None
+
+    def root(self):
+        return self._tree.root
+
+    def application(self, app_name: str):
+        return self._tree.root.application(app_name)
+
+    def find_child(self, node, name=None, role=None, recursive=True):
+        try:
+            return node.child(name=name, roleName=role, recursive=recursive)
+        except SearchError:
+            return None
+
+    def _pointer_position(self):
+        """press/release需要坐标：取最后注入的位置，尚未注入过时读取当前鼠标位置"""
+        if self._pointer is None:
+            import pyautogui
+            self._pointer = tuple(pyautogui.position())
+        return self._pointer
+
+    def motion(self, x, y):
+        # 显式传入极短延迟，否则每次移动都会等待dogtail默认的动作延迟（mouseDelay为0时同样按默认值）
+        self._rawinput.absoluteMotion(x, y, mouseDelay=MOTION_DELAY)
+        self._pointer = (x, y)
+
+    def click(self, x, y, button="left"):
+        self._rawinput.click(x, y, button=DOGTAIL_BUTTONS[button])
+        self._pointer = (x, y)
+
+    def press(self, button="left"):
+        x, y = self._pointer_position()
+        self._rawinput.press(x, y, button=DOGTAIL_BUTTONS[button])
+
+    def release(self, button="left"):
+        x, y = self._pointer_position()
+        self._rawinput.release(x, y, button=DOGTAIL_BUTTONS[button])
+
+    def key_combo(self, keys):
+        self._rawinput.keyCombo(keys)
+
+    def type_text(self, text, interval=0.0):
+        saved_delay = self._config.typingDelay
+        try:
+            self._config.typingDelay = interval
+            self._rawinput.typeText(text)
+        finally:
+            self._config.typingDelay = saved_delay
+
+    def set_text(self, node, text):
+        return bool(node.queryEditableText().setTextContents(text))
+
+    def refresh_rate(self):
+        """读取xrandr中当前模式（带*标记）的刷新率，失败时为60Hz"""
+        if self._refresh_rate is None:
+            self._refresh_rate = 60.0
+            try:
+                output = subprocess.run(["xrandr", "--current"], stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, timeout=2).stdout.decode(errors="replace")
+                match = re.search(r"(\d+(?:\.\d+)?)\*", output)
+                if match and float(match.group(1)) > 0:
+                    self._refresh_rate = float(match.group(1))
+            except (OSError, subprocess.SubprocessError):
+                pass
+        return self._refresh_rate
+
+    def screen_geometry(self):
+        import pyautogui
+        width, height = pyautogui.size()
+        return 0, 0, width, height
+
+    def screenshot(self, region=None):
+        import pyautogui
+        return pyautogui.screenshot(region=region)
+
+
+class _StateSet:
+    """模拟AT-SPI状态集（供tree_snapshot读取状态名）"""
+
+    def __init__(self, states):
+        self._states = states
+
+    def getStates(self):
+        return list(self._states)
+
+    def contains(self, state):
+        return state in self._states
+
+
+class SyntheticNode:
+    """合成的无障碍树节点，属性与dogtail节点一致"""
+
+    def __init__(self, name: str, roleName: str, position=(0, 0), size=(0, 0), states=("showing",)):
+        self.name = name
+        self.roleName = roleName
+        self.position = tuple(position)
+        self.size = tuple(size)
+        self.states = set(states)
+        self.text = ""
+        self.parent = None
+        self.children: List["SyntheticNode"] = []
+
+    def add(self, node: "SyntheticNode") -> "SyntheticNode":
+        """追加子节点"""
+        node.parent = self
+        self.children.append(node)
+        return node
+
+    @property
+    def extents(self):
+        return (*self.position, *self.size)
+
+    @property
+    def showing(self):
+        return "showing" in self.states
+
+    def getState(self):
+        return _StateSet(self.states)
+
+    def find(self, name=None, roleName=None, recursive=True):
+        """先序深度优先查找第一个匹配的后代，未找到返回None"""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if (name is None or node.name == name) and (roleName is None or node.roleName == roleName):
+                return node
+            if recursive:
+                stack.extend(reversed(node.children))
+        return None
+
+    def child(self, name=None, roleName=None, recursive=True, retry=True, description=None):
+        """与dogtail的child()一致：未找到时抛出SearchError"""
+        node = self.find(name, roleName, recursive)
+        if node is None:
+            raise SearchError(f"未找到子节点: {name} ({roleName})")
+        return node
+
+    def application(self, name):
+        return self.child(name=name, roleName="application", recursive=False)
+
+    def __repr__(self):
+        return f"[{self.roleName} | {self.name}]"
+
+
+class SyntheticBackend(AccessibilityBackend):
+    """
+    纯Python的合成元素树后端：树由generate()生成或由tree_snapshot格式的快照加载；
+    输入注入只更新指针位置和按键状态，截图返回内存中的屏幕图像
+    """
+
+    name = "synthetic"
+
+    ROLES = ("panel", "push button", "menu item", "table cell", "check box")
+
+    def __init__(self, root: SyntheticNode, screen=None, screen_size=(1920, 1080)):
+        """
+        :param root: 桌面根节点
+        :param screen: 屏幕图像（高×宽×3的RGB数组，可选，默认为全黑）
+        :param screen_size: 未提供屏幕图像时的屏幕尺寸(宽, 高)
+        """
+        self._root = root
+        self.screen = screen
+        self.screen_size = screen_size
+        self.pointer = (0, 0)
+        self.pressed = set()
+
+    @classmethod
+    def generate(cls, depth: int = 6, width: int = 5, app_name: str = "QGIS3", **options) -> "SyntheticBackend":
+        """
+        生成规则的合成树：应用节点下每层width个子节点，共depth层
+        节点名为"n{层}_{序号}"，在父节点下唯一，不同子树之间重复（与真实界面一样）
+        :param depth: 树深度
+        :param width: 每个节点的子节点数
+        :param app_name: 应用名称
+        """
+        root = SyntheticNode("main", "desktop frame")
+        app = root.add(SyntheticNode(app_name, "application", (0, 0), (1920, 1080)))
+        level = [app]
+        for d in range(1, depth + 1):
+            next_level = []
+            for parent in level:
+                for i in range(width):
+                    node = SyntheticNode(f"n{d}_{i}", cls.ROLES[i % len(cls.ROLES)], (i * 20, d * 20), (18, 18))
+                    next_level.append(parent.add(node))
+            level = next_level
+        return cls(root, **options)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict, app_name: Optional[str] = None, **options) -> "SyntheticBackend":
+        """
+        由tree_snapshot.capture_tree格式的快照重建元素树
+        快照根节点不是桌面时，在其上补一个桌面根节点
+        :param snapshot: 快照字典
+        :param app_name: 快照根节点不是应用时，补一个同名应用节点包裹（可选）
+        """
+        from tree_snapshot import NODE_SIZE
+        strings, state_names, flat = snapshot["strings"], snapshot["states"], snapshot["nodes"]
+        nodes = []
+        for i in range(0, len(flat), NODE_SIZE):
+            name, role, parent, x, y, width, height, mask = flat[i:i + NODE_SIZE]
+            states = [state for bit, state in enumerate(state_names) if mask >> bit & 1]
+            node = SyntheticNode(strings[name], strings[role], (x, y), (width, height), states)
+            if parent >= 0:
+                nodes[parent].add(node)
+            nodes.append(node)
+        if not nodes:
+            raise ValueError("快照中没有节点")
+        top = nodes[0]
+        if top.roleName != "application" and app_name:
+            app = SyntheticNode(app_name, "application", top.position, top.size)
+            app.add(top)
+            top = app
+        if top.roleName == "desktop frame":
+            return cls(top, **options)
+        root = SyntheticNode("main", "desktop frame")
+        root.add(top)
+        return cls(root, **options)
+
+    @classmethod
+    def load(cls, path: str, **options) -> "SyntheticBackend":
+        """由快照JSON文件加载（可为快照本身，或snapshot_tree响应中的data）"""
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return cls.from_snapshot(snapshot.get("data", snapshot), **options)
+
+    def root(self):
+        return self._root
+
+    def find_child(self, node, name=None, role=None, recursive=True):
+        return node.find(name, role, recursive)
+
+    def motion(self, x, y):
+        self.pointer = (x, y)
+
+    def click(self, x, y, button="left"):
+        self.pointer = (x, y)
+
+    def press(self, button="left"):
+        self.pressed.add(button)
+
+    def release(self, button="left"):
+        self.pressed.discard(button)
+
+    def key_combo(self, keys):
+        pass
+
+    def type_text(self, text, interval=0.0):
+        pass
+
+    def set_text(self, node, text):
+        node.text = text
+        return True
+
+    def screen_geometry(self):
+        if self.screen is not None:
+            return 0, 0, self.screen.shape[1], self.screen.shape[0]
+        return (0, 0) + tuple(self.screen_size)
+
+    def screenshot(self, region=None):
+        import numpy as np
+        if self.screen is None:
+            width, height = self.screen_size
+            self.screen = np.zeros((height, width, 3), dtype=np.uint8)
+        if region is None:
+            return self.screen
+        left, top, width, height = region
+        return self.screen[top:top + height, left:left + width]
+
+
+class RecordingBackend(AccessibilityBackend):
+    """
+    记录型后端：查找和截图转发给内部后端，注入的输入按顺序记录（可选择不转发），
+    用于离线检查指令集实际产生的输入序列
+    """
+
+    name = "recording"
+
+    def __init__(self, inner: Optional[AccessibilityBackend] = None, forward: bool = True):
+        """
+        :param inner: 内部后端（默认为空的合成树）
+        :param forward: 是否把输入继续注入内部后端
+        """
+        self.inner = inner or SyntheticBackend(SyntheticNode("main", "desktop frame"))
+        self.forward = forward
+        self.events: List[Dict] = []
+        self.lookups = 0
+        self._lock = threading.Lock()
+
+    def _record(self, action: str, **params) -> None:
+        with self._lock:
+            self.events.append({"action": action, "params": params, "time": time.time()})
+        if self.forward:
+            getattr(self.inner, action)(**params)
+
+    def root(self):
+        return self.inner.root()
+
+    def application(self, app_name):
+        return self.inner.application(app_name)
+
+    def find_child(self, node, name=None, role=None, recursive=True):
+        with self._lock:
+            self.lookups += 1
+        return self.inner.find_child(node, name, role, recursive)
+
+    def geometry(self, node):
+        return self.inner.geometry(node)
+
+    def screen_geometry(self):
+        return self.inner.screen_geometry()
+
+    def refresh_rate(self):
+        return self.inner.refresh_rate()
+
+    def motion(self, x, y):
+        self._record("motion", x=x, y=y)
+
+    def click(self, x, y, button="left"):
+        self._record("click", x=x, y=y, button=button)
+
+    def press(self, button="left"):
+        self._record("press", button=button)
+
+    def release(self, button="left"):
+        self._record("release", button=button)
+
+    def key_combo(self, keys):
+        self._record("key_combo", keys=list(keys))
+
+    def type_text(self, text, interval=0.0):
+        self._record("type_text", text=text, interval=interval)
+
+    def set_text(self, node, text):
+        with self._lock:
+            self.events.append({"action": "set_text", "params": {"node": node.name, "text": text},
+                                "time": time.time()})
+        return self.inner.set_text(node, text) if self.forward else True
+
+    def screenshot(self, region=None):
+        return self.inner.screenshot(region)
+
+    def take_events(self) -> List[Dict]:
+        """取出并清空已记录的输入"""
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def save(self, path: str) -> None:
+        """把已记录的输入写入JSON Lines文件"""
+        with self._lock, open(path, "w", encoding="utf-8") as f:
+            for event in self.events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def create_backend(spec: Optional[str] = None) -> AccessibilityBackend:
+    """
+    按描述创建后端（默认读取环境变量AUTO_TEST_BACKEND，未设置时为dogtail）
+    :param spec: "dogtail"、"synthetic"（默认6层×5个）、"synthetic:深度x宽度"、
+                 "snapshot:快照文件路径"，以上任一可加前缀"recording+"记录注入的输入
+    :return: AccessibilityBackend
+    """
+    spec = spec or os.environ.get(BACKEND_ENV) or "dogtail"
+    if spec.startswith("recording+"):
+        return RecordingBackend(create_backend(spec[len("recording+"):]))
+    kind, _, arg = spec.partition(":")
+    if kind == "dogtail":
+        return DogtailBackend()
+    if kind == "synthetic":
+        depth, _, width = (arg or "6x5").partition("x")
+        return SyntheticBackend.generate(int(depth), int(width or 5))
+    if kind == "snapshot":
+        return SyntheticBackend.load(arg)
+    raise ValueError(f"未知的后端: {spec}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> AccessibilityBackend:
+    """获取进程内共享的后端（由AUTO_TEST_BACKEND决定）"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
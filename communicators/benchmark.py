@@ -0,0 +1,272 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from backends import RecordingBackend, SyntheticBackend
+from command_codec import CODEC_NAME
+from protocol import FORMAT_BINARY, FORMAT_JSON, encode_payload
+from tested_communicator import TestedMachineCommunicator
+from test_communicator import TestMachineCommunicator
+
+FORMAT_NAMES = {FORMAT_JSON: "json", FORMAT_BINARY: "binary"}
+
+
+def sample_paths(app, count: int, seed: int = 0) -> List[str]:
+    """
+    随机生成count条从应用节点逐级随机下行到叶子节点的路径
+    :param app: 应用节点（合成树）
+    """
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        node, parts = app, []
+        while node.children:
+            node = rng.choice(node.children)
+            parts.append(node.name)
+        paths.append('/'.join(parts))
+    return paths
+
+
+def summarize(latencies: List[float], elapsed: float, payload_bytes: int = 0, items: int = 0) -> Dict:
+    """
+    汇总一组请求的耗时
+    :param latencies: 每个请求的耗时（秒）
+    :param elapsed: 总耗时（秒）
+    :param payload_bytes: 请求负载总字节数
+    :param items: 处理的条目总数（如指令数）
+    """
+    ordered = sorted(latencies)
+
+    def pct(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 4) if ordered else 0.0
+
+    result = {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 4),
+        "requests_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": pct(0.5),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0.0
+    }
+    if payload_bytes:
+        result["payload_bytes"] = payload_bytes
+        result["payload_mb_per_s"] = round(payload_bytes / elapsed / 1e6, 3) if elapsed else 0.0
+    if items:
+        result["items_per_s"] = round(items / elapsed, 2) if elapsed else 0.0
+    return result
+
+
+class Benchmark:
+    """在本机启动被测试机器服务（合成树后端，输入注入为空操作），测量往返性能"""
+
+    def __init__(self, tree: SyntheticBackend, port: int = 18888, payload_format: Optional[int] = None,
+                 app_name: str = "QGIS3"):
+        """
+        :param tree: 合成树后端（SyntheticBackend.generate()生成或由快照加载）
+        :param port: 服务端口
+        :param payload_format: 负载编码（默认FORMAT_JSON）
+        :param app_name: 被测应用名称
+        """
+        self.port = port
+        self.app_name = app_name
+        self.app = tree.application(app_name)
+        self.payload_format = FORMAT_JSON if payload_format is None else payload_format
+        # 记录型后端包裹合成树：输入注入为空操作，同时可核对注入的输入条数
+        self.backend = RecordingBackend(tree)
+        self.server = TestedMachineCommunicator(bind_host="127.0.0.1", bind_port=port, backend=self.backend)
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.server.start, kwargs={"app_name": self.app_name}, daemon=True)
+        self._thread.start()
+        deadline = time.time() + 5
+        while not self.server.is_running and time.time() < deadline:
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        self.server.stop()
+
+    def client(self, payload_format: Optional[int] = None, command_codec: bool = True):
+        return TestMachineCommunicator("127.0.0.1", self.port,
+                                       self.payload_format if payload_format is None else payload_format,
+                                       command_codec=command_codec)
+
+    def bench_get_element(self, requests: int, cached: bool = True) -> Dict:
+        """
+        逐个发送get_element请求
+        :param requests: 请求数
+        :param cached: 是否允许服务端节点缓存（False时每个请求前清空缓存，测量完整的树遍历）
+        """
+        client = self.client()
+        paths = sample_paths(self.app, requests)
+        latencies = []
+        start = time.perf_counter()
+        for path in paths:
+            if not cached:
+                self.server.element_cache.clear()
+            t = time.perf_counter()
+            response = client.get_element_info(path)
+            latencies.append(time.perf_counter() - t)
+            if not response.get("success"):
+                raise RuntimeError(f"get_element失败: {response}")
+        result = summarize(latencies, time.perf_counter() - start)
+        client.close()
+        return result
+
+    def bench_get_element_concurrent(self, requests: int, clients: int) -> Dict:
+        """多个客户端并发发送get_element请求（每个客户端requests个）"""
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            client = self.client()
+            local = []
+            for path in sample_paths(self.app, requests, seed):
+                t = time.perf_counter()
+                client.get_element_info(path)
+                local.append(time.perf_counter() - t)
+            client.close()
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result = summarize(latencies, time.perf_counter() - start)
+        result["clients"] = clients
+        return result
+
+    def bench_get_elements(self, batch_size: int, requests: int) -> Dict:
+        """批量查询：每个请求查询batch_size个元素"""
+        client = self.client()
+        batches = [[(path, None) for path in sample_paths(self.app, batch_size, seed)]
+                   for seed in range(requests)]
+        latencies = []
+        start = time.perf_counter()
+        for batch in batches:
+            t = time.perf_counter()
+            client.get_elements_info(batch)
+            latencies.append(time.perf_counter() - t)
+        result = summarize(latencies, time.perf_counter() - start, items=batch_size * requests)
+        result["batch_size"] = batch_size
+        client.close()
+        return result
+
+    def bench_exec_commands(self, batch_size: int, requests: int, payload_format: Optional[int] = None,
+                            command_codec: bool = False) -> Dict:
+        """
+        指令集执行：每个请求batch_size条指令（不做节奏等待，只测量协议与调度开销）
+        :param command_codec: 是否使用协商的紧凑指令集编码（仅FORMAT_BINARY）
+        """
+        payload_format = self.payload_format if payload_format is None else payload_format
+        client = self.client(payload_format, command_codec)
+        actions = ("mouse_move", "mouse_click", "key_press")
+        commands = []
+        for i in range(batch_size):
+            action = actions[i % len(actions)]
+            params = {"key": "a"} if action == "key_press" else {"x": 100 + i, "y": 200 + i, "button": "left"}
+            commands.append({"action": action, "params": params, "timestamp": time.time(), "pacing": "none"})
+        codec = CODEC_NAME if client.command_codec else None  # 基准服务端总是支持紧凑编码
+        request_bytes = len(encode_payload(
+            {"type": "exec_commands", "data": client._commands_data(commands, codec), "timestamp": time.time()},
+            payload_format
+        ))
+        self.backend.take_events()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            response = client.execute_commands(commands)
+            latencies.append(time.perf_counter() - t)
+            if not response.get("success"):
+                raise RuntimeError(f"exec_commands失败: {response}")
+        result = summarize(latencies, time.perf_counter() - start, request_bytes * requests, batch_size * requests)
+        result.update({"batch_size": batch_size, "request_bytes": request_bytes,
+                       "payload_format": FORMAT_NAMES.get(payload_format, payload_format)
+                       + ("+" + codec if codec else ""),
+                       "injected": len(self.backend.take_events())})
+        client.close()
+        return result
+
+    def run(self, requests: int, batch_sizes: List[int], clients: int) -> Dict:
+        """运行全部测量项"""
+        results = {
+            "get_element": self.bench_get_element(requests),
+            "get_element_uncached": self.bench_get_element(requests, cached=False),
+            "get_element_concurrent": self.bench_get_element_concurrent(requests, clients),
+            "get_elements": [self.bench_get_elements(size, max(1, requests // size)) for size in batch_sizes],
+            "exec_commands": [
+                self.bench_exec_commands(size, max(1, requests // size), fmt, codec)
+                for fmt, codec in ((FORMAT_JSON, False), (FORMAT_BINARY, False), (FORMAT_BINARY, True))
+                for size in batch_sizes
+            ]
+        }
+        return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="测试者/被测试机器通信往返性能基准（合成无障碍树后端）")
+    parser.add_argument("--depth", type=int, default=6, help="合成树深度")
+    parser.add_argument("--width", type=int, default=5, help="合成树每个节点的子节点数")
+    parser.add_argument("--snapshot", help="由snapshot_tree保存的快照文件加载元素树（代替生成的合成树）")
+    parser.add_argument("--app-name", default="QGIS3", help="被测应用名称")
+    parser.add_argument("--requests", type=int, default=500, help="每个测量项的请求数")
+    parser.add_argument("--batch-sizes", default="1,10,100", help="批量大小列表（逗号分隔）")
+    parser.add_argument("--clients", type=int, default=4, help="并发测量的客户端数")
+    parser.add_argument("--port", type=int, default=18888, help="服务端口")
+    parser.add_argument("--output", default="bench_results.json", help="结果JSON文件")
+    parser.add_argument("--verbose", action="store_true", help="保留服务端和客户端的请求日志输出")
+    args = parser.parse_args(argv)
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size.strip()]
+    if args.snapshot:
+        tree = SyntheticBackend.load(args.snapshot, app_name=args.app_name)
+    else:
+        tree = SyntheticBackend.generate(args.depth, args.width, args.app_name)
+    bench = Benchmark(tree, args.port, app_name=args.app_name)
+    # 逐请求的print会主导耗时，默认在测量期间丢弃
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        bench.start()
+        try:
+            results = bench.run(args.requests, batch_sizes, args.clients)
+            server_stats = bench.server.stats.snapshot()
+        finally:
+            bench.stop()
+
+    report = {
+        "config": {"depth": args.depth, "width": args.width, "snapshot": args.snapshot, "requests": args.requests,
+                   "batch_sizes": batch_sizes, "clients": args.clients},
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "time": time.time()},
+        "results": results,
+        "server_phases": server_stats["phases"]
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name in ("get_element", "get_element_uncached", "get_element_concurrent"):
+        r = results[name]
+        print(f"{name:24} {r['requests_per_s']:>10.1f} req/s  p50 {r['p50_ms']:.3f}ms  p99 {r['p99_ms']:.3f}ms")
+    for r in results["get_elements"]:
+        print(f"get_elements x{r['batch_size']:<11} {r['requests_per_s']:>10.1f} req/s  "
+              f"{r['items_per_s']:.1f} 元素/s  p99 {r['p99_ms']:.3f}ms")
+    for r in results["exec_commands"]:
+        print(f"exec_commands x{r['batch_size']:<5} {r['payload_format']:16} {r['requests_per_s']:>10.1f} req/s  "
+              f"{r['items_per_s']:.1f} 指令/s  {r['payload_mb_per_s']:.2f}MB/s  p99 {r['p99_ms']:.3f}ms")
+    print(f"结果已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+import struct
+import sys
+from array import array
+from typing import Dict, List
+from protocol import FORMAT_BINARY, decode_payload, encode_payload
+
+# 编码名称与版本（hello协商时交换名称，编码结果的首字节为版本号）
+CODEC_NAME = "opcode-v2"
+CODEC_VERSION = 2
+
+# 操作码表（低4位）；OP_RAW用于无法按固定格式编码的指令（全部字段放入附加数据）
+OP_RAW = 0
+OP_MOUSE_MOVE = 1
+OP_MOUSE_CLICK = 2
+OP_MOUSE_PRESS = 3
+OP_MOUSE_RELEASE = 4
+OP_HOTKEY = 5
+OP_KEY_PRESS = 6
+OP_TYPE_TEXT = 7
+OP_DRAG_PATH = 9
+OPCODES = {
+    "mouse_move": OP_MOUSE_MOVE,
+    "mouse_click": OP_MOUSE_CLICK,
+    "mouse_press": OP_MOUSE_PRESS,
+    "mouse_release": OP_MOUSE_RELEASE,
+    "hotkey": OP_HOTKEY,
+    "key_press": OP_KEY_PRESS,
+    "type_text": OP_TYPE_TEXT,
+    "drag_path": OP_DRAG_PATH,
+}
+ACTIONS = {opcode: action for action, opcode in OPCODES.items()}
+
+# 标志位（高4位）
+FLAG_EXTRA = 0x1  # 附带其余字段（通用二进制编码）
+FLAG_NO_TIMESTAMP = 0x2  # 指令没有数值时间戳
+FLAG_BUTTON = 0x4  # params中有字符串button
+FLAG_PACING = 0x8  # 指令带字符串pacing字段
+
+# 各操作码按固定格式编码的必需参数（button为可选的固定参数）
+_REQUIRED_PARAMS = {
+    OP_MOUSE_MOVE: ("x", "y"),
+    OP_MOUSE_CLICK: ("x", "y"),
+    OP_MOUSE_PRESS: (),
+    OP_MOUSE_RELEASE: (),
+    OP_HOTKEY: ("keys",),
+    OP_KEY_PRESS: ("key",),
+    OP_TYPE_TEXT: ("text",),
+    OP_DRAG_PATH: ("x", "y", "end_x", "end_y", "duration", "easing"),
+}
+_FIXED_PARAMS = {opcode: required + ("button",) for opcode, required in _REQUIRED_PARAMS.items()}
+_BUTTON_OPS = (OP_MOUSE_CLICK, OP_MOUSE_PRESS, OP_MOUSE_RELEASE, OP_DRAG_PATH)
+_COMMAND_KEYS = ("action", "params", "timestamp", "pacing")
+
+# 头部：版本、基准时间戳、指令数、时间戳数、坐标数、整数数、字符串数、字符串总长度、附加数据总长度
+_HEADER = struct.Struct("<BdIIIIIII")
+# 各列为小端定宽数组：时间戳（相对基准的毫秒数）与坐标为int32，其余整数（字符串下标、耗时、长度）为uint32
+_SWAP = sys.byteorder != "little"
+for _code in ("i", "I"):
+    if array(_code).itemsize != 4:
+        raise ImportError(f"array类型{_code}不是4字节")
+
+
+class _Overflow(Exception):
+    """数值超出定宽列的范围，需改为通用编码"""
+
+
+def _column(typecode: str, values) -> bytes:
+    try:
+        column = array(typecode, values)
+    except OverflowError:
+        raise _Overflow()
+    if _SWAP:
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode: str, data) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    if _SWAP:
+        column.byteswap()
+    return column
+
+
+def _encode(commands: List[Dict], fixed: bool) -> bytes:
+    """
+    按列编码指令集
+    :param commands: 指令列表
+    :param fixed: 是否使用固定格式（False时全部指令按OP_RAW编码，用于数值超出定宽列范围的情况）
+    """
+    base_time = next((c["timestamp"] for c in commands
+                      if type(c.get("timestamp")) in (int, float)), 0.0) if fixed else 0.0
+    heads = bytearray()
+    times = []
+    coords = []
+    ints = []
+    strings = []
+    string_index = {}
+    extras = []
+
+    def string(value):
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        ints.append(index)
+
+    for command in commands:
+        params = command.get("params")
+        opcode = OPCODES.get(command.get("action"), OP_RAW) if fixed and type(params) is dict else OP_RAW
+        if opcode != OP_RAW:
+            # 固定参数的类型不符时退回通用编码
+            for key in _REQUIRED_PARAMS[opcode]:
+                if key not in params:
+                    opcode = OP_RAW
+                    break
+        if opcode in (OP_MOUSE_MOVE, OP_MOUSE_CLICK, OP_DRAG_PATH):
+            if type(params["x"]) is not int or type(params["y"]) is not int:
+                opcode = OP_RAW
+            elif opcode == OP_DRAG_PATH:
+                duration = params["duration"]
+                if (type(params["end_x"]) is not int or type(params["end_y"]) is not int
+                        or type(duration) not in (int, float) or not 0 <= duration < 4e6
+                        or round(duration * 1000) / 1000 != duration or type(params["easing"]) is not str):
+                    opcode = OP_RAW  # 耗时按整毫秒编码，非整毫秒时不按固定格式编码
+        elif opcode == OP_HOTKEY:
+            keys = params["keys"]
+            if type(keys) not in (list, tuple) or not all(type(key) is str for key in keys):
+                opcode = OP_RAW
+        elif opcode == OP_KEY_PRESS:
+            if type(params["key"]) is not str:
+                opcode = OP_RAW
+        elif opcode == OP_TYPE_TEXT:
+            if type(params["text"]) is not str:
+                opcode = OP_RAW
+
+        timestamp = command.get("timestamp")
+        flags = 0 if fixed and type(timestamp) in (int, float) else FLAG_NO_TIMESTAMP
+        if opcode == OP_RAW:
+            # 除数值时间戳外的全部字段放入附加数据，解码后与原指令一致
+            extra = {key: value for key, value in command.items() if key != "timestamp" or flags}
+            flags |= FLAG_EXTRA
+        else:
+            extra = None
+            if len(command) != 2 + ("timestamp" in command) + ("pacing" in command):
+                extra = {key: value for key, value in command.items() if key not in _COMMAND_KEYS}
+            pacing = command.get("pacing")
+            if type(pacing) is str:
+                flags |= FLAG_PACING
+            elif "pacing" in command:
+                extra = extra or {}
+                extra["pacing"] = pacing
+            if "timestamp" in command and flags & FLAG_NO_TIMESTAMP:
+                extra = extra or {}
+                extra["timestamp"] = timestamp
+            button = params.get("button")
+            if type(button) is str and opcode in _BUTTON_OPS:
+                flags |= FLAG_BUTTON
+            if len(params) != len(_REQUIRED_PARAMS[opcode]) + bool(flags & FLAG_BUTTON):
+                fixed_params = _FIXED_PARAMS[opcode] if flags & FLAG_BUTTON else _REQUIRED_PARAMS[opcode]
+                extra = extra or {}
+                extra["params"] = {key: value for key, value in params.items() if key not in fixed_params}
+            if extra:
+                flags |= FLAG_EXTRA
+
+        heads.append(opcode | flags << 4)
+        if not flags & FLAG_NO_TIMESTAMP:
+            times.append(round((timestamp - base_time) * 1000))
+        if opcode == OP_MOUSE_MOVE or opcode == OP_MOUSE_CLICK:
+            coords += (params["x"], params["y"])
+        elif opcode == OP_DRAG_PATH:
+            coords += (params["x"], params["y"], params["end_x"], params["end_y"])
+            ints.append(round(params["duration"] * 1000))
+            string(params["easing"])
+        elif opcode == OP_KEY_PRESS:
+            string(params["key"])
+        elif opcode == OP_TYPE_TEXT:
+            string(params["text"])
+        elif opcode == OP_HOTKEY:
+            ints.append(len(params["keys"]))
+            for key in params["keys"]:
+                string(key)
+        if flags & FLAG_BUTTON:
+            string(params["button"])
+        if flags & FLAG_PACING:
+            string(command["pacing"])
+        if flags & FLAG_EXTRA:
+            blob = encode_payload(extra, FORMAT_BINARY)
+            ints.append(len(blob))
+            extras.append(blob)
+
+    # 字符串表整体编码一次，按字符数切分
+    ints += [len(value) for value in strings]
+    text = "".join(strings).encode("utf-8")
+    extra_data = b"".join(extras)
+    return b"".join((
+        _HEADER.pack(CODEC_VERSION, float(base_time), len(commands), len(times), len(coords), len(ints),
+                     len(strings), len(text), len(extra_data)),
+        bytes(heads), _column("i", times), _column("i", coords), _column("I", ints), text, extra_data
+    ))
+
+
+def encode_commands(commands: List[Dict]) -> bytes:
+    """
+    将指令集按列编码为紧凑二进制：每条指令1字节操作码/标志，时间戳（相对基准的毫秒数）、坐标、
+    字符串下标等分别存入定宽数组整体打包，按键名/文本等字符串只存一次，其余字段放入通用二进制附加数据
+    编码格式：头部 + 操作码列 + 时间戳列 + 坐标列 + 整数列 + 字符串表 + 附加数据
+    时间戳会被量化到毫秒，其余字段解码后与原指令一致
+    实测（benchmark.py及单独计时）：1000条鼠标移动编码后13KB、编码1.7ms、解码0.8ms，FORMAT_JSON为91KB、3.0ms、1.9ms；
+    但FORMAT_BINARY请求的其余部分和响应仍由纯Python的通用二进制编码处理，exec_commands整体吞吐量
+    仍比FORMAT_JSON低约20%（100条/批：245 vs 317 req/s），因此默认负载编码为JSON，紧凑编码用于节省带宽。
+    附加数据较多（如每条指令带target）时编码更慢；数值超出int32范围时自动改为全部使用通用编码
+    :param commands: 指令列表（_generate_command生成的字典）
+    :return: 编码结果
+    """
+    try:
+        return _encode(commands, True)
+    except _Overflow:
+        return _encode(commands, False)
+
+
+def _decode(buf: memoryview) -> List[Dict]:
+    if len(buf) < _HEADER.size:
+        raise ValueError("指令编码被截断")
+    if buf[0] != CODEC_VERSION:
+        raise ValueError(f"不支持的指令编码版本: {buf[0]}")
+    version, base_time, total, time_count, coord_count, int_count, string_count, text_size, extra_size = \
+        _HEADER.unpack_from(buf)
+    sizes = (total, time_count * 4, coord_count * 4, int_count * 4, text_size, extra_size)
+    if _HEADER.size + sum(sizes) != len(buf):
+        raise ValueError("指令编码长度不一致")
+    parts = []
+    offset = _HEADER.size
+    for size in sizes:
+        parts.append(buf[offset:offset + size])
+        offset += size
+    heads, time_data, coord_data, int_data, text_data, extra_data = parts
+    times = _read_column("i", time_data)
+    coords = _read_column("i", coord_data)
+    ints = _read_column("I", int_data)
+
+    # 字符串长度位于整数列末尾
+    if string_count > int_count:
+        raise ValueError("指令编码长度不一致")
+    text = str(text_data, "utf-8")
+    strings = []
+    start = 0
+    for length in ints[int_count - string_count:]:
+        strings.append(text[start:start + length])
+        start += length
+    if start != len(text):
+        raise ValueError("指令编码长度不一致")
+
+    next_time = iter(times).__next__
+    next_coord = iter(coords).__next__
+    next_int = iter(ints[:int_count - string_count]).__next__
+    extra_offset = 0
+    commands: List[Dict] = []
+    append = commands.append
+    for head in heads:
+        opcode, flags = head & 0x0F, head >> 4
+        if opcode == OP_MOUSE_MOVE:
+            command = {"action": "mouse_move", "params": {"x": next_coord(), "y": next_coord()}}
+            params = command["params"]
+        elif opcode == OP_RAW:
+            command = {}
+            params = None
+        elif opcode in ACTIONS:
+            params = {}
+            command = {"action": ACTIONS[opcode], "params": params}
+            if opcode == OP_MOUSE_CLICK:
+                params["x"] = next_coord()
+                params["y"] = next_coord()
+            elif opcode == OP_KEY_PRESS:
+                params["key"] = strings[next_int()]
+            elif opcode == OP_TYPE_TEXT:
+                params["text"] = strings[next_int()]
+            elif opcode == OP_HOTKEY:
+                params["keys"] = [strings[next_int()] for _ in range(next_int())]
+            elif opcode == OP_DRAG_PATH:
+                params["x"] = next_coord()
+                params["y"] = next_coord()
+                params["end_x"] = next_coord()
+                params["end_y"] = next_coord()
+                params["duration"] = next_int() / 1000
+                params["easing"] = strings[next_int()]
+        else:
+            raise ValueError(f"未知的操作码: {opcode}")
+        if not flags & FLAG_NO_TIMESTAMP:
+            command["timestamp"] = base_time + next_time() / 1000
+        if flags & FLAG_BUTTON:
+            params["button"] = strings[next_int()]
+        if flags & FLAG_PACING:
+            command["pacing"] = strings[next_int()]
+        if flags & FLAG_EXTRA:
+            length = next_int()
+            if extra_offset + length > extra_size:
+                raise ValueError("指令编码被截断")
+            extra = decode_payload(extra_data[extra_offset:extra_offset + length], FORMAT_BINARY)
+            extra_offset += length
+            if not isinstance(extra, dict) or (params is not None and not isinstance(extra.get("params", {}), dict)):
+                raise ValueError("指令编码的附加数据无效")
+            if params is not None and "params" in extra:
+                params.update(extra.pop("params"))
+            command.update(extra)
+        append(command)
+
+    # 各列须恰好用完
+    if extra_offset != extra_size:
+        raise ValueError("指令编码长度不一致")
+    for column_next in (next_time, next_coord, next_int):
+        try:
+            column_next()
+        except StopIteration:
+            continue
+        raise ValueError("指令编码长度不一致")
+    return commands
+
+
+def decode_commands(data) -> List[Dict]:
+    """
+    解码encode_commands的结果
+    :param data: 编码结果（bytes/bytearray/memoryview）
+    :return: 指令列表；编码损坏时抛出ValueError
+    """
+    try:
+        return _decode(memoryview(data))
+    except (IndexError, StopIteration, UnicodeDecodeError, struct.error) as e:
+        raise ValueError(f"指令编码损坏: {str(e) or type(e).__name__}")
@@ -0,0 +1,216 @@
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+from command_codec import CODEC_NAME
+from protocol import ProtocolError, recv_message, send_message
+
+# 可以在新连接上安全重试的请求类型（只读，重复执行无副作用）
+IDEMPOTENT_REQUEST_TYPES = ("hello", "get_element", "get_elements", "snapshot_tree", "wait_element")
+
+
+class ConnectionPool:
+    """
+    到同一被测试机器的TCP连接池：连接开启TCP_NODELAY与keepalive，用完归还复用
+    建立连接失败时按指数退避重试；取出空闲连接前先检查对端是否已关闭
+    每个新连接建立后先以hello协商指令集编码，协商结果随连接保存（重连到重启或旧版本的被测试机器时重新协商）
+    """
+
+    def __init__(self, target_host: str, target_port: int, max_idle: int = 4, connect_timeout: float = 5.0,
+                 max_retries: int = 3, backoff: float = 0.1, max_backoff: float = 2.0, negotiate: bool = True):
+        """
+        :param target_host: 被测试机器的IP地址
+        :param target_port: 被测试机器的通信端口
+        :param max_idle: 最多保留的空闲连接数
+        :param connect_timeout: 建立连接的超时时间（秒）
+        :param max_retries: 建立连接失败、或幂等请求失败时的重试次数
+        :param backoff: 首次重试前的等待时间（秒），之后每次翻倍
+        :param max_backoff: 重试等待时间上限（秒）
+        :param negotiate: 是否在新连接上协商指令集编码（见codec_of）
+        """
+        self.target_host = target_host
+        self.target_port = target_port
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.negotiate = negotiate
+        self._idle: List[socket.socket] = []
+        self._codecs: Dict[socket.socket, Optional[str]] = {}  # 连接 -> 协商成功的指令集编码
+        self._retired: Set[socket.socket] = set()  # drain时仍被借出的连接，归还时关闭
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def backoff_delays(self):
+        """各次重试前的等待时间"""
+        delay = self.backoff
+        for _ in range(self.max_retries):
+            yield delay
+            delay = min(delay * 2, self.max_backoff)
+
+    @staticmethod
+    def _configure(sock: socket.socket) -> None:
+        """关闭Nagle算法并开启TCP keepalive"""
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # 空闲30秒后开始探测，每10秒一次，3次无响应判定断开（平台支持时）
+        for option, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    @staticmethod
+    def _hello(sock: socket.socket) -> Optional[str]:
+        """
+        在新连接上协商指令集编码（不支持hello的旧版本被测试机器回复失败，该连接使用普通编码）
+        :param sock: 新建立的连接
+        :return: 该连接可用的指令集编码名称，不可用为None
+        """
+        send_message(sock, {"type": "hello", "data": {"command_codecs": [CODEC_NAME]}, "timestamp": time.time()})
+        message = recv_message(sock)
+        if message is None:
+            raise ConnectionError("被测试机器关闭了连接")
+        response = message[0]
+        if response.get("rejected"):
+            # 被测试机器连接数已满，回复后会关闭该连接
+            raise ConnectionError(response.get("error", "被测试机器拒绝了连接"))
+        codecs = (response.get("data") or {}).get("command_codecs") or []
+        return CODEC_NAME if response.get("success") and CODEC_NAME in codecs else None
+
+    def _open(self) -> socket.socket:
+        """建立新连接（需要时协商指令集编码），失败时按退避策略重试"""
+        delays = self.backoff_delays()
+        while True:
+            sock = None
+            try:
+                sock = socket.create_connection((self.target_host, self.target_port), self.connect_timeout)
+                self._configure(sock)
+                codec = self._hello(sock) if self.negotiate else None  # 协商同样受连接超时限制
+                sock.settimeout(None)
+                with self._lock:
+                    self._codecs[sock] = codec
+                return sock
+            except (OSError, ProtocolError) as e:
+                if sock is not None:
+                    sock.close()
+                delay = next(delays, None)
+                if delay is None:
+                    raise ConnectionError(f"无法连接到被测试机器: {str(e)}")
+                print(f"连接被测试机器失败，{delay:.2f}秒后重试: {str(e)}")
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_stale(sock: socket.socket) -> bool:
+        """空闲连接是否已失效（对端已关闭或有未读数据）"""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        # 空闲连接上不应有数据；可读意味着对端关闭（读到EOF）或协议已错位
+        return bool(readable)
+
+    def acquire(self) -> socket.socket:
+        """
+        取出一个可用连接（优先复用空闲连接，否则新建）
+        :return: 已连接的套接字
+        """
+        if self._closed:
+            raise ConnectionError("连接池已关闭")
+        while True:
+            with self._lock:
+                sock = self._idle.pop() if self._idle else None
+            if sock is None:
+                return self._open()
+            if not self._is_stale(sock):
+                return sock
+            self.discard(sock)
+
+    def release(self, sock: socket.socket) -> None:
+        """归还连接（请求/响应已完整收发）"""
+        with self._lock:
+            if not self._closed and sock not in self._retired and len(self._idle) < self.max_idle:
+                self._idle.append(sock)
+                return
+        self.discard(sock)
+
+    def discard(self, sock: socket.socket) -> None:
+        """丢弃出错的连接"""
+        with self._lock:
+            self._codecs.pop(sock, None)
+            self._retired.discard(sock)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def codec_of(self, sock: socket.socket) -> Optional[str]:
+        """
+        该连接协商成功的指令集编码
+        :param sock: 由本连接池取出的连接
+        :return: 编码名称（见command_codec.CODEC_NAME），未协商或对端不支持为None
+        """
+        with self._lock:
+            return self._codecs.get(sock)
+
+    @contextmanager
+    def connection(self):
+        """
+        借用一个连接：正常结束时归还，发生异常时丢弃
+        """
+        sock = self.acquire()
+        try:
+            yield sock
+        except BaseException:
+            self.discard(sock)
+            raise
+        self.release(sock)
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def drain(self) -> int:
+        """
+        断开池中全部连接：立即关闭空闲连接，仍被借出的连接在归还时关闭；之后借用时重新建立连接
+        :return: 立即关闭的空闲连接数
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            for sock in idle:
+                self._codecs.pop(sock, None)
+            self._retired.update(self._codecs)
+        for sock in idle:
+            sock.close()
+        return len(idle)
+
+    def close(self) -> None:
+        """关闭全部空闲连接，之后不再接受借用"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._codecs.clear()
+            self._retired.clear()
+        for sock in idle:
+            sock.close()
+
+
+_shared_pools: Dict[Tuple[str, int], ConnectionPool] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_pool(target_host: str, target_port: int = 8888, **options) -> ConnectionPool:
+    """
+    获取进程内共享的连接池（同一被测试机器只有一个），多个Operation可复用已建立的连接
+    :param target_host: 被测试机器的IP地址
+    :param target_port: 被测试机器的通信端口
+    :param options: 首次创建时传给ConnectionPool的参数
+    :return: ConnectionPool
+    """
+    key = (target_host, target_port)
+    with _shared_lock:
+        pool = _shared_pools.get(key)
+        if pool is None or pool._closed:
+            pool = _shared_pools[key] = ConnectionPool(target_host, target_port, **options)
+        return pool
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class ElementCache:
+    """
+    路径到可访问节点的LRU缓存
+    键为((名称, 角色), ...)路径前缀；取出时做廉价校验（仍在显示、坐标尺寸未变），校验失败即丢弃
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        :param max_entries: 最大缓存条目数，超出后淘汰最久未使用的条目
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 键 -> (节点, 缓存时的extents)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _extents(element) -> Tuple[int, int, int, int]:
+        """读取节点的(x, y, width, height)"""
+        return tuple(element.extents)
+
+    def _is_valid(self, element, extents) -> bool:
+        """廉价校验：节点仍在显示且位置尺寸未变化"""
+        try:
+            return bool(element.showing) and self._extents(element) == extents
+        except Exception:
+            return False  # 节点已销毁等情况
+
+    def get(self, key: Tuple) -> Optional[object]:
+        """
+        取出缓存的节点
+        :param key: 路径前缀键
+        :return: 校验通过的节点，未命中或已失效返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        element, extents = entry
+        valid = self._is_valid(element, extents)  # AT-SPI调用放在锁外
+        with self._lock:
+            if not valid:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+        if valid:
+            self.hits += 1
+            return element
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, element) -> None:
+        """
+        缓存节点
+        :param key: 路径前缀键
+        :param element: 节点
+        """
+        try:
+            extents = self._extents(element)
+        except Exception:
+            return
+        with self._lock:
+            self._entries[key] = (element, extents)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_subtree(self, source) -> int:
+        """
+        子节点变化时，丢弃以source为前缀的所有更深路径
+        :param source: 子节点发生变化的节点
+        :return: 丢弃的条目数
+        """
+        with self._lock:
+            prefixes = [key for key, (element, _) in self._entries.items() if element == source]
+            stale = [
+                key for key in self._entries
+                if any(len(key) > len(prefix) and key[:len(prefix)] == prefix for prefix in prefixes)
+            ]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Callable, Optional
+
+# 可能使等待的元素出现的事件
+WAIT_EVENT_TYPES = ("object:children-changed", "window:create", "object:state-changed:showing")
+
+
+class ElementWaiter:
+    """
+    事件驱动的元素等待：仅在收到AT-SPI结构变化事件后才重新查找元素
+    事件监听不可用时退化为按固定间隔轮询
+    """
+
+    def __init__(self, event_monitor=None, poll_interval: float = 0.25, recheck_interval: float = 1.0):
+        """
+        :param event_monitor: 已启动的AtspiEventMonitor（可选，需订阅WAIT_EVENT_TYPES）
+        :param poll_interval: 无事件可用时的轮询间隔（秒）
+        :param recheck_interval: 有事件可用时的兜底重查间隔（秒），防止事件丢失导致一直等到超时
+        """
+        self.event_monitor = event_monitor
+        self.poll_interval = poll_interval
+        self.recheck_interval = recheck_interval
+
+    @property
+    def event_driven(self) -> bool:
+        """当前是否由事件驱动"""
+        return self.event_monitor is not None and self.event_monitor.running
+
+    def wait(self, find: Callable[[], Optional[object]], timeout: float = 10.0):
+        """
+        等待元素出现
+        :param find: 查找函数，找到返回元素，未找到返回None（或抛出LookupError）
+        :param timeout: 超时时间（秒）
+        :return: 找到的元素，超时返回None
+        """
+        changed = threading.Event()
+
+        def on_event(event_type: str, source) -> None:
+            changed.set()
+
+        event_driven = self.event_driven
+        if event_driven:
+            self.event_monitor.add_listener(on_event)
+        try:
+            deadline = time.monotonic() + timeout
+            interval = self.recheck_interval if event_driven else self.poll_interval
+            while True:
+                # 先清除标志再查找，查找期间发生的事件会触发下一次重查
+                changed.clear()
+                try:
+                    element = find()
+                except LookupError:
+                    element = None
+                if element is not None:
+                    return element
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                changed.wait(min(remaining, interval))
+        finally:
+            if event_driven:
+                self.event_monitor.remove_listener(on_event)
@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# 直方图桶上界（毫秒），按2倍递增，覆盖0.05毫秒到约52秒
+BUCKET_BOUNDS_MS = tuple(0.05 * 2 ** i for i in range(21))
+
+
+class Histogram:
+    """对数分桶的耗时直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)  # 最后一个桶为超出上界的部分
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds: float) -> None:
+        """记录一次耗时（秒）"""
+        ms = seconds * 1000
+        bucket = 0
+        while bucket < len(BUCKET_BOUNDS_MS) and ms > BUCKET_BOUNDS_MS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def percentile(self, q: float) -> float:
+        """
+        估算分位数（毫秒）：返回分位点所在桶的上界，不超过实际最大值
+        :param q: 分位（0~1）
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = BUCKET_BOUNDS_MS[bucket] if bucket < len(BUCKET_BOUNDS_MS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+            "min_ms": round(self.min or 0.0, 4),
+            "max_ms": round(self.max or 0.0, 4),
+            "p50_ms": round(self.percentile(0.5), 4),
+            "p90_ms": round(self.percentile(0.9), 4),
+            "p99_ms": round(self.percentile(0.99), 4),
+            # 桶上界（毫秒，超出最大上界记为"inf"）-> 次数，只列出非空桶
+            "buckets": {
+                (f"{BUCKET_BOUNDS_MS[i]:g}" if i < len(BUCKET_BOUNDS_MS) else "inf"): count
+                for i, count in enumerate(self.counts) if count
+            }
+        }
+
+
+class RequestTrace:
+    """单个请求在各阶段的耗时"""
+
+    def __init__(self, request_type: Optional[str], request_id=None):
+        self.request_type = request_type
+        self.request_id = request_id
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.request_type,
+            "id": self.request_id,
+            "start": self.start,
+            "total_ms": round(self.elapsed() * 1000, 4),
+            "phases_ms": {phase: round(seconds * 1000, 4) for phase, seconds in self.phases.items()}
+        }
+
+
+class LatencyStats:
+    """
+    分阶段耗时统计：每个阶段一个直方图；阶段耗时同时计入当前线程正在处理的请求，
+    请求结束时可写入JSON Lines追踪文件（每行一个请求的阶段分解）
+    """
+
+    def __init__(self, trace_path: Optional[str] = None):
+        """
+        :param trace_path: 追踪文件路径（可选）
+        """
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace_file = None
+        self.started = time.time()
+        if trace_path:
+            self.open_trace(trace_path)
+
+    def open_trace(self, trace_path: str) -> None:
+        """开始写追踪文件（追加）"""
+        with self._lock:
+            if self._trace_file:
+                self._trace_file.close()
+            self._trace_file = open(trace_path, 'a', encoding='utf-8')
+
+    def record(self, phase: str, seconds: float) -> None:
+        """
+        记录一个阶段的耗时
+        :param phase: 阶段名（如"decode"、"lookup.level1"、"inject.mouse_click"）
+        :param seconds: 耗时（秒）
+        """
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                histogram = self._histograms[phase] = Histogram()
+            histogram.add(seconds)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.add(phase, seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """计时上下文：with stats.timer("encode"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    @contextmanager
+    def tracing(self, trace: Optional[RequestTrace]):
+        """在with块内把阶段耗时计入指定请求（可跨线程传递请求后在工作线程中使用）"""
+        previous = getattr(self._local, "trace", None)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+
+    def finish(self, trace: Optional[RequestTrace]) -> None:
+        """请求结束：记录总耗时并写入追踪文件"""
+        if trace is None:
+            return
+        self.record(f"request.{trace.request_type}", trace.elapsed())
+        if self._trace_file:
+            line = json.dumps(trace.to_dict(), ensure_ascii=False)
+            with self._lock:
+                if self._trace_file:
+                    self._trace_file.write(line + "\n")
+                    self._trace_file.flush()
+
+    def snapshot(self, reset: bool = False) -> Dict:
+        """
+        导出全部直方图
+        :param reset: 导出后是否清空
+        :return: {"since": 统计开始时间, "phases": {阶段名: 直方图字典}}
+        """
+        with self._lock:
+            result = {
+                "since": self.started,
+                "phases": {phase: histogram.to_dict() for phase, histogram in sorted(self._histograms.items())}
+            }
+            if reset:
+                self._histograms.clear()
+                self.started = time.time()
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            if self._trace_file:
+                self._trace_file.close()
+                self._trace_file = None
@@ -0,0 +1,74 @@
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 缓动函数：输入为0~1的时间进度，输出为0~1的位移进度
+EASINGS: Dict[str, Callable[[float], float]] = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: 1 - (1 - t) * (1 - t),
+    "ease_in_out": lambda t: 4 * t ** 3 if t < 0.5 else 1 - (-2 * t + 2) ** 3 / 2,
+}
+DEFAULT_EASING = "ease_in_out"
+DEFAULT_RATE = 60.0  # 无法获取显示器刷新率时的鼠标事件频率（Hz）
+
+
+def interpolate_path(start: Tuple[int, int], end: Tuple[int, int], duration: float, rate: float = DEFAULT_RATE,
+                     easing: str = DEFAULT_EASING) -> List[Tuple[float, int, int]]:
+    """
+    生成拖拽轨迹：按rate的频率在duration内插值，坐标取整后与上一点相同的步省略，最后一点为终点
+    :param start: 起点(x, y)
+    :param end: 终点(x, y)
+    :param duration: 移动耗时（秒，0表示直接到达终点）
+    :param rate: 每秒的移动事件数（通常为显示器刷新率）
+    :param easing: 缓动函数名（见EASINGS）
+    :return: [(相对开始移动的时间偏移秒数, x, y), ...]
+    """
+    if easing not in EASINGS:
+        raise ValueError(f"未知的缓动函数: {easing}")
+    ease = EASINGS[easing]
+    steps = max(1, math.ceil(duration * rate))
+    points = []
+    last = tuple(start)
+    for i in range(1, steps + 1):
+        t = i / steps
+        progress = ease(t)
+        point = (round(start[0] + (end[0] - start[0]) * progress), round(start[1] + (end[1] - start[1]) * progress))
+        if point != last or i == steps:
+            points.append((t * duration, *point))
+            last = point
+    return points
+
+
+def perform_drag(backend, start: Tuple[int, int], end: Tuple[int, int], duration: float = 0.3,
+                 easing: str = DEFAULT_EASING, button: str = "left", hold: float = 0.05,
+                 rate: Optional[float] = None) -> int:
+    """
+    平滑拖拽：按下后按显示器刷新率逐帧注入插值轨迹上的移动事件，到达终点后释放
+    （中间的移动事件使Qt等工具包能识别出拖拽手势）
+    :param backend: 无障碍后端（提供motion/press/release/refresh_rate）
+    :param start: 起点(x, y)
+    :param end: 终点(x, y)
+    :param duration: 移动耗时（秒）
+    :param easing: 缓动函数名
+    :param button: 鼠标键
+    :param hold: 按下后开始移动前的停顿（秒）
+    :param rate: 移动事件频率（Hz，默认为后端报告的刷新率）
+    :return: 注入的移动事件数
+    """
+    points = interpolate_path(start, end, duration, rate or backend.refresh_rate(), easing)
+    backend.motion(*start)
+    backend.press(button=button)
+    try:
+        if hold > 0:
+            time.sleep(hold)
+        # 按绝对时间点注入，单步的注入耗时不会累积成整体延迟
+        begin = time.perf_counter()
+        for offset, x, y in points:
+            delay = begin + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            backend.motion(x, y)
+    finally:
+        backend.release(button=button)  # 出错时也释放，避免鼠标键保持按下
+    return len(points)
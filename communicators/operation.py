@@ -1,8 +1,12 @@
 import json
 import time
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from anchors import symbolic_target
+from connection_pool import ConnectionPool
 from test_communicator import TestMachineCommunicator
+from scenario import ScenarioPlayer, compile_scenario, load_scenario, save_scenario
+from tree_snapshot import TreeSnapshot
 
 class Operation:
     """
@@ -10,16 +14,18 @@ class Operation:
     每个操作返回对应的指令拆解为基本鼠标点击和移动，参数使用元素位置信息
     """
     
-    def __init__(self, test_machine_ip: str, test_machine_port: int = 8888):
+    def __init__(self, test_machine_ip: str, test_machine_port: int = 8888,
+                 pool: Optional[ConnectionPool] = None):
         """
         初始化操作类并建立与被测试机器的通信连接
         :param test_machine_ip: 被测试机器的IP地址
         :param test_machine_port: 被测试机器的通信端口
+        :param pool: 连接池（可选），传入get_shared_pool()的结果可让多个Operation复用已建立的连接
         """
         self.opts = []  # 存储单个操作的指令序列
         self.commands_list = []  # 存储整个测试文件生成的指令列表
         # 初始化通信类，建立连接
-        self.communicator = TestMachineCommunicator(test_machine_ip, test_machine_port)
+        self.communicator = TestMachineCommunicator(test_machine_ip, test_machine_port, pool=pool)
         # self.communicator._connect()
 
         logging.basicConfig(
@@ -30,11 +36,22 @@ class Operation:
         self.logger.setLevel(logging.INFO)
 
 
-    def _generate_command(self, action: str, params: Dict) -> Dict:
+    @staticmethod
+    def _target_of(loc: Dict) -> Dict:
+        """由元素位置信息生成语义目标（元素路径与录制时的几何信息）"""
+        return dict(loc["target"], geometry={
+            "x": loc["x"], "y": loc["y"], "width": loc["width"], "height": loc["height"]
+        })
+
+    def _generate_command(self, action: str, params: Dict, loc: Optional[Dict] = None,
+                          end_loc: Optional[Dict] = None) -> Dict:
         """
         生成单个操作指令
         :param action: 操作类型（如"mouse_move", "mouse_click"等）
         :param params: 操作参数字典
+        :param loc: 坐标所依据的元素位置信息（可选，由get_location返回），
+                    用于记录语义目标，回放时可重新定位
+        :param end_loc: 拖拽终点坐标所依据的元素位置信息（可选，仅drag_path）
         :return: 格式化的操作指令字典
         """
         command = {
@@ -42,6 +59,10 @@ class Operation:
             "params": params,
             "timestamp": self._get_timestamp()
         }
+        if loc and "target" in loc:
+            command["target"] = self._target_of(loc)
+        if end_loc and "target" in end_loc:
+            command["end_target"] = self._target_of(end_loc)
         self.opts.append(command)
         return command
 
@@ -67,12 +88,70 @@ class Operation:
         # 验证响应是否成功
         if not response.get("success", False):
             raise ValueError(f"获取元素位置失败: {response.get('error', '未知错误')}")
-        
+        return self._parse_location(response["data"], element_path, role_name_list)
+
+
+    def snapshot_tree(self, element_path: Optional[str] = None, role_name_list: Optional[List[str]] = None,
+                      max_depth: Optional[int] = None) -> TreeSnapshot:
+        """
+        获取元素树快照，之后的路径查询可在本地完成（不再访问网络）
+        :param element_path: 子树根元素路径（可选，默认为应用根节点）
+        :param role_name_list: 元素角色名列表（可选）
+        :param max_depth: 最大遍历深度（可选）
+        :return: TreeSnapshot
+        """
+        response = self.communicator.snapshot_tree(element_path, role_name_list, max_depth)
+        if not response.get("success", False):
+            raise ValueError(f"获取元素树快照失败: {response.get('error', '未知错误')}")
+        return TreeSnapshot(response["data"])
+
+
+    def wait_for_location(self, element_path: str, role_name_list: Optional[List[str]] = None,
+                          timeout: float = 10.0) -> Dict[str, any]:
+        """
+        等待元素出现后获取其位置信息
+        :param element_path: 元素路径，格式"父元素1/父元素2/目标元素"
+        :param role_name_list: 元素角色名列表（可选）
+        :param timeout: 超时时间（秒）
+        :return: 元素位置信息字典，包含{x,y,width,height,center_x,center_y}
+        """
+        response = self.communicator.wait_element_info(element_path, role_name_list, timeout)
+        if not response.get("success", False):
+            raise ValueError(f"等待元素失败: {response.get('error', '未知错误')}")
+        return self._parse_location(response["data"], element_path, role_name_list)
+
+
+    def get_locations(self, targets: List[Tuple[str, Optional[List[str]]]]) -> List[Dict[str, any]]:
+        """
+        一次网络往返获取多个元素的位置信息
+        :param targets: [(元素路径, 角色名列表), ...]
+        :return: 与targets顺序一致的位置信息字典列表
+        """
+        response = self.communicator.get_elements_info(targets)
+        locations = []
+        for (element_path, role_name_list), result in zip(targets, response.get("data") or []):
+            if not result.get("success", False):
+                raise ValueError(f"获取元素位置失败: {element_path}: {result.get('error', '未知错误')}")
+            locations.append(self._parse_location(result["data"], element_path, role_name_list))
+        if len(locations) != len(targets):
+            raise ValueError(f"获取元素位置失败: {response.get('error', '响应数量不匹配')}")
+        return locations
+
+
+    @staticmethod
+    def _parse_location(element_data: Dict, element_path: Optional[str] = None,
+                        role_name_list: Optional[List[str]] = None) -> Dict[str, any]:
+        """
+        将查询响应中的元素数据转换为位置信息字典
+        :param element_data: 响应中的data字段，包含position和size
+        :param element_path: 查询的元素路径（可选，记录为语义目标）
+        :param role_name_list: 查询的角色名列表（可选）
+        :return: 位置信息字典，包含{x,y,width,height,center_x,center_y}，指定路径时另含target
+        """
         # 提取并返回必要的位置信息
-        element_data = response["data"]
         position = element_data["position"]
         size = element_data["size"]
-        return {
+        loc = {
             "x": position["x"],
             "y": position["y"],
             "width": size["width"],
@@ -80,26 +159,42 @@ class Operation:
             "center_x": position["x"] + size["width"] // 2,
             "center_y": position["y"] + size["height"] // 2
         }
+        if element_path:
+            loc["target"] = {"element_path": element_path, "role_name_list": role_name_list}
+        return loc
 
 
-    def click_element(self, element_path: str, role_name_list: Optional[List[str]] = None) -> List[Dict]:
+    def click_element(self, element_path: str, role_name_list: Optional[List[str]] = None,
+                      anchor: str = "center", offset: Optional[Tuple[int, int]] = None) -> List[Dict]:
         """
-        生成点击元素的指令（移动到中心位置后点击）
+        生成点击元素的指令（移动到锚点位置后点击）
+        元素位置由被测试机器在注入时解析，不需要先查询元素位置
         param element_path: 元素路径
         param role_name_list: 元素角色名列表（可选），支持多个角色名匹配
+        param anchor: 元素内的锚点（center/top-left等，默认中心）
+        param offset: 相对锚点的像素偏移(dx, dy)（可选）
+        """
+        at = symbolic_target(element_path, role_name_list, anchor, offset)
+        commands = [
+            # 移动到元素锚点
+            self._generate_command("mouse_move", {"at": at}),
+            # 左键点击
+            self._generate_command("mouse_click", {"at": at, "button": "left"})
+        ]
+        self.finish_current_opts(commands)  # 完成当前操作指令集的执行
+
+
+    def click_elements(self, targets: List[Tuple[str, Optional[List[str]]]]) -> List[Dict]:
+        """
+        依次点击多个元素（如逐级展开的菜单），在一个指令集中发送
+        每个元素的位置在点击前才由被测试机器解析（子菜单项在上级菜单展开前没有有效位置）
+        param targets: [(元素路径, 角色名列表), ...]
         """
-        loc = self.get_location(element_path, role_name_list)
         commands = []
-        # 移动到元素中心
-        commands.append(self._generate_command(
-            "mouse_move",
-            {"x": loc["center_x"], "y": loc["center_y"]}
-        ))
-        # 左键点击
-        commands.append(self._generate_command(
-            "mouse_click",
-            {"x": loc["center_x"], "y": loc["center_y"], "button": "left"}
-        ))
+        for element_path, role_name_list in targets:
+            at = symbolic_target(element_path, role_name_list)
+            commands.append(self._generate_command("mouse_move", {"at": at}))
+            commands.append(self._generate_command("mouse_click", {"at": at, "button": "left"}))
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
@@ -109,36 +204,35 @@ class Operation:
         param element_path: 元素路径
         param role_name_list: 元素角色名列表（可选），支持多个角色名匹配
         """
-        loc = self.get_location(element_path, role_name_list)
-        commands = []
-        commands.append(self._generate_command(
-            "mouse_move",
-            {"x": loc["center_x"], "y": loc["center_y"]}
-        ))
-        commands.append(self._generate_command(
-            "mouse_click",
-            {"x": loc["center_x"], "y": loc["center_y"], "button": "right"}
-        ))
+        at = symbolic_target(element_path, role_name_list)
+        commands = [
+            self._generate_command("mouse_move", {"at": at}),
+            self._generate_command("mouse_click", {"at": at, "button": "right"})
+        ]
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
-    def set_element_text(self, element_path: str, text: str, role_name_list: Optional[List[str]] = None) -> List[Dict]:
+    def set_element_text(self, element_path: str, text: str, role_name_list: Optional[List[str]] = None,
+                         interval: float = 0.0) -> List[Dict]:
         """
         生成设置元素文本的指令（点击激活→全选→删除→输入）
         param element_path: 元素路径
         param text: 要设置的文本内容
         param role_name_list: 元素角色名列表（可选），支持多个角色名匹配
+        param interval: 每个按键之间的间隔秒数（默认0，整段文本一次性输入）
         """
         loc = self.get_location(element_path, role_name_list)
         commands = []
         # 点击激活元素
         commands.append(self._generate_command(
             "mouse_move",
-            {"x": loc["center_x"], "y": loc["center_y"]}
+            {"x": loc["center_x"], "y": loc["center_y"]},
+            loc
         ))
         commands.append(self._generate_command(
             "mouse_click",
-            {"x": loc["center_x"], "y": loc["center_y"], "button": "left"}
+            {"x": loc["center_x"], "y": loc["center_y"], "button": "left"},
+            loc
         ))
         # 全选（Ctrl+A）
         commands.append(self._generate_command(
@@ -150,12 +244,12 @@ class Operation:
             "key_press",
             {"key": "Delete"}
         ))
-        # 输入文本
-        for char in text:
-            commands.append(self._generate_command(
-                "key_press",
-                {"key": char}
-            ))
+        # 输入文本（键盘输入失败时被测试机器可通过EditableText接口直接设置）
+        commands.append(self._generate_command(
+            "type_text",
+            {"text": text, "interval": interval,
+             "element_path": element_path, "role_name_list": role_name_list}
+        ))
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
@@ -167,103 +261,115 @@ class Operation:
         param role_name_list: 下拉框元素角色名列表（可选）
         """
         commands = []
+        # 下拉框与选项（指定选项角色为"menu item"）的位置一次查询
+        combo_loc, item_loc = self.get_locations([
+            (combo_path, role_name_list),
+            (f"{combo_path}/{item_text}", ["menu item"])
+        ])
         # 点击下拉框
-        combo_loc = self.get_location(combo_path, role_name_list)
         commands.append(self._generate_command(
             "mouse_move",
-            {"x": combo_loc["center_x"], "y": combo_loc["center_y"]}
+            {"x": combo_loc["center_x"], "y": combo_loc["center_y"]},
+            combo_loc
         ))
         commands.append(self._generate_command(
             "mouse_click",
-            {"x": combo_loc["center_x"], "y": combo_loc["center_y"], "button": "left"}
+            {"x": combo_loc["center_x"], "y": combo_loc["center_y"], "button": "left"},
+            combo_loc
         ))
         
-        # 点击选项（指定选项角色为"menu item"）
-        item_loc = self.get_location(f"{combo_path}/{item_text}", ["menu item"])
+        # 点击选项
         commands.append(self._generate_command(
             "mouse_move",
-            {"x": item_loc["center_x"], "y": item_loc["center_y"]}
+            {"x": item_loc["center_x"], "y": item_loc["center_y"]},
+            item_loc
         ))
         commands.append(self._generate_command(
             "mouse_click",
-            {"x": item_loc["center_x"], "y": item_loc["center_y"], "button": "left"}
+            {"x": item_loc["center_x"], "y": item_loc["center_y"], "button": "left"},
+            item_loc
         ))
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
-    def input_text(self, element_path: Optional[str], text: str, role_name_list: Optional[List[str]] = None) -> List[Dict]:
+    def input_text(self, element_path: Optional[str], text: str, role_name_list: Optional[List[str]] = None,
+                   interval: float = 0.0) -> List[Dict]:
         """
         生成输入文本的指令（若有元素则先点击激活）
         param element_path: 元素路径（可选）
         param text: 要输入的文本内容
         param role_name_list: 元素角色名列表（可选），支持多个角色名匹配
+        param interval: 每个按键之间的间隔秒数（默认0，整段文本一次性输入）
         """
         commands = []
+        type_params = {"text": text, "interval": interval}
         # 若指定元素，先点击激活
         if element_path:
             loc = self.get_location(element_path, role_name_list)
             commands.append(self._generate_command(
                 "mouse_move",
-                {"x": loc["center_x"], "y": loc["center_y"]}
+                {"x": loc["center_x"], "y": loc["center_y"]},
+                loc
             ))
             commands.append(self._generate_command(
                 "mouse_click",
-                {"x": loc["center_x"], "y": loc["center_y"], "button": "left"}
+                {"x": loc["center_x"], "y": loc["center_y"], "button": "left"},
+                loc
             ))
+            type_params.update({"element_path": element_path, "role_name_list": role_name_list})
         
         # 输入文本
-        for char in text:
-            commands.append(self._generate_command(
-                "key_press",
-                {"key": char}
-            ))
+        commands.append(self._generate_command("type_text", type_params))
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
-    def drag_to(self, start_x: int, start_y: int, end_x: int, end_y: int) -> List[Dict]:
+    def drag_to(self, start_x: int, start_y: int, end_x: int, end_y: int,
+                start_loc: Optional[Dict] = None, end_loc: Optional[Dict] = None,
+                duration: float = 0.3, easing: str = "ease_in_out") -> List[Dict]:
         """
-        生成拖拽操作的指令（绝对坐标）
+        生成拖拽操作的指令（绝对坐标），中间轨迹由被测试机器按显示器刷新率插值注入
         :param start_x: 起点X坐标
         :param start_y: 起点Y坐标
         :param end_x: 终点X坐标
         :param end_y: 终点Y坐标
+        :param start_loc: 起点坐标所依据的元素位置信息（可选，用于回放时重新定位）
+        :param end_loc: 终点坐标所依据的元素位置信息（可选）
+        :param duration: 从起点移动到终点的耗时（秒）
+        :param easing: 缓动函数名（linear/ease_in/ease_out/ease_in_out）
         """
         print(f"拖拽从({start_x}, {start_y})到({end_x}, {end_y})")
-        # 生成拖拽指令
+        # 一条drag_path指令：按下、平滑移动、释放均在被测试机器上完成
         commands = [
-            # 移动到起点
-            self._generate_command("mouse_move", {"x": start_x, "y": start_y}),
-            # 按下左键
-            self._generate_command("mouse_press", {"x": start_x, "y": start_y, "button": "left"}),
-            # 移动到终点
-            self._generate_command("mouse_move", {"x": end_x, "y": end_y}),
-            # 释放左键
-            self._generate_command("mouse_release", {"x": end_x, "y": end_y, "button": "left"})
+            self._generate_command("drag_path", {
+                "x": start_x, "y": start_y, "end_x": end_x, "end_y": end_y,
+                "duration": duration, "easing": easing, "button": "left"
+            }, start_loc, end_loc)
         ]
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
     def drag_to_percentage(self, app_name: str, start_x_pct: float, start_y_pct: float, 
-                           end_x_pct: float, end_y_pct: float) -> List[Dict]:
+                           end_x_pct: float, end_y_pct: float, duration: float = 0.3,
+                           easing: str = "ease_in_out") -> List[Dict]:
         """
-        生成按百分比拖拽地图的指令（基于屏幕尺寸计算）
+        生成按百分比拖拽地图的指令（百分比相对应用主窗口，由被测试机器在注入时换算为坐标；
+        主窗口没有范围时相对整个屏幕）
         :param start_x_pct: 起点X坐标百分比（0-1）
         :param start_y_pct: 起点Y坐标百分比（0-1）
         :param end_x_pct: 终点X坐标百分比（0-1）
         :param end_y_pct: 终点Y坐标百分比（0-1)
+        :param duration: 从起点移动到终点的耗时（秒）
+        :param easing: 缓动函数名
         """
-        # 获取屏幕尺寸（指定屏幕角色为["screen"]）
-        screen_loc = self.get_location(app_name, ["application"])
-        screen_width = screen_loc["width"]
-        screen_height = screen_loc["height"]
-        
-        # 计算坐标
-        start_x = int(screen_width * start_x_pct)
-        start_y = int(screen_height * start_y_pct)
-        end_x = int(screen_width * end_x_pct)
-        end_y = int(screen_height * end_y_pct)
-        
-        return self.drag_to(start_x, start_y, end_x, end_y)
+        print(f"按百分比拖拽从({start_x_pct}, {start_y_pct})到({end_x_pct}, {end_y_pct})")
+        commands = [
+            self._generate_command("drag_path", {
+                "at": symbolic_target(app_name, ["application"], pct=(start_x_pct, start_y_pct)),
+                "end_at": symbolic_target(app_name, ["application"], pct=(end_x_pct, end_y_pct)),
+                "duration": duration, "easing": easing, "button": "left"
+            })
+        ]
+        self.finish_current_opts(commands)  # 完成当前操作指令集的执行
 
 
     def drag_item_to_parent(self, item_path: str, parent_path: str, 
@@ -276,14 +382,18 @@ class Operation:
         :param item_role_list: 拖拽元素的角色名列表（可选）
         :param parent_role_list: 父元素的角色名列表（可选）
         """
-        item_loc = self.get_location(item_path, item_role_list)
-        parent_loc = self.get_location(parent_path, parent_role_list)
+        item_loc, parent_loc = self.get_locations([
+            (item_path, item_role_list),
+            (parent_path, parent_role_list)
+        ])
         
         return self.drag_to(
             start_x=item_loc["center_x"],
             start_y=item_loc["center_y"],
             end_x=parent_loc["center_x"],
-            end_y=parent_loc["center_y"]
+            end_y=parent_loc["center_y"],
+            start_loc=item_loc,
+            end_loc=parent_loc
         )
 
 
@@ -297,14 +407,18 @@ class Operation:
         :param item_role_list: 拖拽元素的角色名列表（可选）
         :param cousin_role_list: 兄弟元素的角色名列表（可选）
         """
-        item_loc = self.get_location(item_path, item_role_list)
-        cousin_loc = self.get_location(cousin_path, cousin_role_list)
+        item_loc, cousin_loc = self.get_locations([
+            (item_path, item_role_list),
+            (cousin_path, cousin_role_list)
+        ])
         
         return self.drag_to(
             start_x=item_loc["center_x"],
             start_y=item_loc["center_y"],
             end_x=cousin_loc["center_x"],
-            end_y=cousin_loc["center_y"]
+            end_y=cousin_loc["center_y"],
+            start_loc=item_loc,
+            end_loc=cousin_loc
         )
 
 
@@ -326,13 +440,14 @@ class Operation:
         self.finish_current_opts(commands)  # 完成当前操作指令集的执行
     
 
-    def move_to(self, x: int, y: int) -> Dict:
+    def move_to(self, x: int, y: int, loc: Optional[Dict] = None) -> Dict:
         """
         生成鼠标移动到指定位置的指令
         :param x: X坐标
         :param y: Y坐标
+        :param loc: 坐标所依据的元素位置信息（可选，用于回放时重新定位）
         """
-        commands = [ self._generate_command("mouse_move", {"x": x, "y": y}) ]
+        commands = [ self._generate_command("mouse_move", {"x": x, "y": y}, loc) ]
         self.finish_current_opts(commands)
 
 
@@ -343,7 +458,7 @@ class Operation:
         :param role_name_list: 元素角色名列表（可选），支持多个角色名匹配
         """
         loc = self.get_location(element_path, role_name_list)
-        return self.move_to(loc["center_x"], loc["center_y"])
+        return self.move_to(loc["center_x"], loc["center_y"], loc)
 
 
     def export_to_json(self, file_path: str) -> None:
@@ -355,6 +470,25 @@ class Operation:
             json.dump(self.commands_list, f, ensure_ascii=False, indent=2)
 
 
+    def export_scenario(self, file_path: str) -> None:
+        """
+        将.commands_list编译为可快速回放的场景文件（记录语义目标及录制时的坐标）
+        :param file_path: 场景文件路径
+        """
+        save_scenario(compile_scenario(self.commands_list), file_path)
+
+
+    def replay_scenario(self, file_path: str) -> Dict[str, any]:
+        """
+        回放场景文件：整个场景一次发送，被测试机器仅对位置发生变化的元素重新定位
+        :param file_path: 场景文件路径
+        :return: 执行结果字典
+        """
+        result = ScenarioPlayer(self.communicator).replay(load_scenario(file_path))
+        self.logger.info(f"场景回放结果: {result.get('success')}，共{len(result.get('results', []))}条指令")
+        return result
+
+
     def finish_current_opts(self, commands) -> None:
         """
         结束当前操作指令集
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Dict, Optional
+
+# 判断界面是否"安静"所关注的AT-SPI事件（焦点变化、弹出窗口、控件显隐等）
+PACING_EVENT_TYPES = ("focus:", "object:state-changed:showing", "object:state-changed:focused")
+
+# 默认的按指令类型等待策略：
+#   ("none", 0)        不等待
+#   ("fixed", 秒)      固定等待
+#   ("idle", 最长秒数) 等待界面无AT-SPI事件（安静）后继续，最长不超过给定秒数
+DEFAULT_POLICIES = {
+    "mouse_move": ("none", 0),
+    "mouse_press": ("fixed", 0.05),
+    "mouse_release": ("idle", 0.5),
+    "drag_path": ("idle", 0.5),
+    "mouse_click": ("idle", 0.5),
+    "mouse_scroll": ("idle", 0.5),
+    "hotkey": ("idle", 0.5),
+    "key_press": ("idle", 0.5),
+    "type_text": ("idle", 0.5),
+}
+
+
+class Pacer:
+    """
+    指令间节奏控制：连续按键之间不等待，可能引起焦点变化或弹窗的指令等待界面安静
+    界面是否安静由AT-SPI事件判断；事件不可用时退化为固定等待
+    """
+
+    def __init__(self, event_monitor=None, policies: Optional[Dict] = None,
+                 quiet_period: float = 0.05, fallback_delay: float = 0.2):
+        """
+        :param event_monitor: AtspiEventMonitor实例（可选）
+        :param policies: 按指令类型覆盖的等待策略，格式同DEFAULT_POLICIES
+        :param quiet_period: 连续多长时间没有事件视为界面安静（秒）
+        :param fallback_delay: AT-SPI事件不可用时"idle"策略的固定等待（秒）
+        """
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.quiet_period = quiet_period
+        self.fallback_delay = fallback_delay
+        self.event_monitor = event_monitor
+        self._last_event = 0.0
+        self._condition = threading.Condition()
+        if event_monitor is not None:
+            event_monitor.add_listener(self._on_event)
+
+    def _on_event(self, event_type: str, source) -> None:
+        """记录最近一次AT-SPI事件的时间"""
+        with self._condition:
+            self._last_event = time.monotonic()
+            self._condition.notify_all()
+
+    @property
+    def events_available(self) -> bool:
+        """是否能通过AT-SPI事件判断界面安静"""
+        return self.event_monitor is not None and self.event_monitor.available
+
+    def wait_for_idle(self, max_wait: float) -> None:
+        """
+        等待界面安静：至少等待quiet_period，且最近quiet_period内没有事件
+        :param max_wait: 最长等待时间（秒）
+        """
+        if not self.events_available:
+            time.sleep(min(self.fallback_delay, max_wait))
+            return
+        start = time.monotonic()
+        deadline = start + max_wait
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                quiet_since = max(self._last_event, start)
+                remaining = quiet_since + self.quiet_period - now
+                if remaining <= 0 or now >= deadline:
+                    return
+                self._condition.wait(min(remaining, deadline - now))
+
+    def _policy_for(self, command: Dict, next_command: Optional[Dict]):
+        """确定指令执行后的等待策略"""
+        action = command.get("action")
+        # 单条指令可通过"pacing"字段覆盖策略："none"、"idle"或固定秒数
+        override = command.get("pacing")
+        if override is not None:
+            if override == "none":
+                return "none", 0
+            if override == "idle":
+                return "idle", self.policies.get(action, ("idle", 0.5))[1] or 0.5
+            return "fixed", float(override)
+        # 连续按键之间不等待
+        if action == "key_press" and next_command and next_command.get("action") == "key_press":
+            return "none", 0
+        return self.policies.get(action, ("fixed", self.fallback_delay))
+
+    def pause_after(self, command: Dict, next_command: Optional[Dict] = None) -> float:
+        """
+        按策略在指令执行后等待
+        :param command: 刚执行的指令
+        :param next_command: 下一条指令（无则为None）
+        :return: 实际等待时间（秒）
+        """
+        mode, value = self._policy_for(command, next_command)
+        start = time.monotonic()
+        if mode == "fixed" and value > 0:
+            time.sleep(value)
+        elif mode == "idle":
+            self.wait_for_idle(value)
+        return time.monotonic() - start
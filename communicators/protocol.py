@@ -0,0 +1,310 @@
+import json
+import struct
+from typing import Any, Optional, Tuple
+
+# 帧格式：4字节负载长度（网络字节序）+ 1字节负载编码 + 负载
+FRAME_HEADER = struct.Struct("!IB")
+FORMAT_JSON = 0  # JSON编码（便于调试）
+FORMAT_BINARY = 1  # 紧凑二进制编码
+MAX_FRAME_SIZE = 256 * 1024 * 1024  # 单帧最大256MB，防止异常长度耗尽内存
+
+# 二进制编码的类型标记
+_TAG_NONE = 0x00
+_TAG_FALSE = 0x01
+_TAG_TRUE = 0x02
+_TAG_INT = 0x03
+_TAG_FLOAT = 0x04
+_TAG_STR = 0x05
+_TAG_BYTES = 0x06
+_TAG_LIST = 0x07
+_TAG_DICT = 0x08
+_FLOAT = struct.Struct("!d")
+
+
+class ProtocolError(Exception):
+    """帧格式错误（长度非法、连接中途断开等），出现后连接不可继续使用"""
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    """
+    写入无符号变长整数（每字节7位，高位为续位标记）
+    :param out: 输出缓冲区
+    :param value: 非负整数
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(buf: memoryview, offset: int) -> Tuple[int, int]:
+    """
+    读取无符号变长整数
+    :param buf: 输入缓冲区
+    :param offset: 起始偏移
+    :return: (整数值, 新偏移)
+    """
+    result = 0
+    shift = 0
+    while True:
+        if offset >= len(buf):
+            raise ValueError("二进制负载被截断")
+        byte = buf[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+
+def zigzag_encode(value: int) -> int:
+    """将有符号整数映射为无符号整数（小绝对值得到短编码）"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def zigzag_decode(value: int) -> int:
+    """zigzag_encode的逆运算"""
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _encode_value(out: bytearray, value: Any) -> None:
+    """递归写入单个值的二进制编码（常见类型按精确类型走快速路径，子类型按isinstance处理）"""
+    kind = type(value)
+    if kind is str:
+        data = value.encode('utf-8')
+        out.append(_TAG_STR)
+        if len(data) < 0x80:
+            out.append(len(data))
+        else:
+            write_varint(out, len(data))
+        out += data
+    elif kind is int:
+        out.append(_TAG_INT)
+        raw = value * 2 if value >= 0 else -value * 2 - 1
+        if raw < 0x80:
+            out.append(raw)
+        else:
+            write_varint(out, raw)
+    elif kind is dict:
+        out.append(_TAG_DICT)
+        write_varint(out, len(value))
+        for key, item in value.items():
+            _encode_value(out, key)
+            _encode_value(out, item)
+    elif value is None:
+        out.append(_TAG_NONE)
+    elif value is True:
+        out.append(_TAG_TRUE)
+    elif value is False:
+        out.append(_TAG_FALSE)
+    elif isinstance(value, int):
+        out.append(_TAG_INT)
+        write_varint(out, zigzag_encode(value))
+    elif isinstance(value, float):
+        out.append(_TAG_FLOAT)
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out.append(_TAG_STR)
+        write_varint(out, len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(_TAG_BYTES)
+        write_varint(out, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(_TAG_LIST)
+        write_varint(out, len(value))
+        for item in value:
+            _encode_value(out, item)
+    elif isinstance(value, dict):
+        out.append(_TAG_DICT)
+        write_varint(out, len(value))
+        for key, item in value.items():
+            _encode_value(out, key)
+            _encode_value(out, item)
+    else:
+        raise TypeError(f"无法二进制编码的类型: {type(value).__name__}")
+
+
+def _decode_value(buf: bytes, offset: int) -> Tuple[Any, int]:
+    """递归读取单个值，返回(值, 新偏移)；单字节的变长整数直接读取"""
+    if offset >= len(buf):
+        raise ValueError("二进制负载被截断")
+    tag = buf[offset]
+    offset += 1
+    if tag == _TAG_STR or tag == _TAG_BYTES:
+        if offset >= len(buf):
+            raise ValueError("二进制负载被截断")
+        length = buf[offset]
+        if length < 0x80:
+            offset += 1
+        else:
+            length, offset = read_varint(buf, offset)
+        end = offset + length
+        if end > len(buf):
+            raise ValueError("二进制负载被截断")
+        chunk = buf[offset:end]
+        return (chunk.decode('utf-8') if tag == _TAG_STR else chunk), end
+    if tag == _TAG_INT:
+        if offset >= len(buf):
+            raise ValueError("二进制负载被截断")
+        raw = buf[offset]
+        if raw < 0x80:
+            offset += 1
+        else:
+            raw, offset = read_varint(buf, offset)
+        return (raw >> 1 if not raw & 1 else -((raw + 1) >> 1)), offset
+    if tag == _TAG_DICT:
+        count, offset = read_varint(buf, offset)
+        result = {}
+        for _ in range(count):
+            key, offset = _decode_value(buf, offset)
+            result[key], offset = _decode_value(buf, offset)
+        return result, offset
+    if tag == _TAG_TRUE:
+        return True, offset
+    if tag == _TAG_FALSE:
+        return False, offset
+    if tag == _TAG_NONE:
+        return None, offset
+    if tag == _TAG_FLOAT:
+        if offset + _FLOAT.size > len(buf):
+            raise ValueError("二进制负载被截断")
+        return _FLOAT.unpack_from(buf, offset)[0], offset + _FLOAT.size
+    if tag == _TAG_LIST:
+        count, offset = read_varint(buf, offset)
+        items = []
+        for _ in range(count):
+            item, offset = _decode_value(buf, offset)
+            items.append(item)
+        return items, offset
+    raise ValueError(f"未知的二进制类型标记: {tag:#x}")
+
+
+def encode_payload(message: Any, payload_format: int = FORMAT_JSON) -> bytes:
+    """
+    按指定编码序列化消息
+    :param message: 消息对象（dict/list等）
+    :param payload_format: FORMAT_JSON 或 FORMAT_BINARY
+    :return: 负载字节
+    """
+    if payload_format == FORMAT_JSON:
+        return json.dumps(message, ensure_ascii=False).encode('utf-8')
+    if payload_format == FORMAT_BINARY:
+        out = bytearray()
+        _encode_value(out, message)
+        return bytes(out)
+    raise ValueError(f"未知的负载编码: {payload_format}")
+
+
+def decode_payload(payload, payload_format: int = FORMAT_JSON) -> Any:
+    """
+    按指定编码反序列化负载
+    :param payload: 负载（bytes/bytearray/memoryview）
+    :param payload_format: FORMAT_JSON 或 FORMAT_BINARY
+    :return: 消息对象；负载损坏时抛出ValueError
+    """
+    if payload_format == FORMAT_JSON:
+        return json.loads(payload if isinstance(payload, (bytes, bytearray)) else bytes(payload))
+    if payload_format == FORMAT_BINARY:
+        # 转为bytes后按下标读取比memoryview快，字符串切片也可直接解码
+        buf = payload if isinstance(payload, bytes) else bytes(payload)
+        message, offset = _decode_value(buf, 0)
+        if offset != len(buf):
+            raise ValueError("二进制负载末尾存在多余数据")
+        return message
+    raise ValueError(f"未知的负载编码: {payload_format}")
+
+
+def _recv_exact(sock, size: int, allow_eof: bool = False) -> Optional[bytearray]:
+    """
+    从套接字读取恰好size字节，直接写入预分配缓冲区避免重复拷贝
+    :param sock: 套接字
+    :param size: 读取字节数
+    :param allow_eof: 未读到任何数据即断开时返回None而非抛出异常
+    :return: 读取到的缓冲区
+    """
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            if allow_eof and received == 0:
+                return None
+            raise ProtocolError(f"连接在帧中途断开（已接收 {received}/{size} 字节）")
+        received += count
+    return buf
+
+
+def pack_frame(payload: bytes, payload_format: int = FORMAT_JSON) -> bytes:
+    """
+    拼接一帧（长度头+负载）
+    :param payload: 已编码的负载
+    :param payload_format: 负载编码
+    :return: 完整的帧字节
+    """
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"帧过大: {len(payload)} 字节")
+    return FRAME_HEADER.pack(len(payload), payload_format) + payload
+
+
+def parse_frame_header(header) -> Tuple[int, int]:
+    """
+    解析并校验帧头
+    :param header: FRAME_HEADER.size字节的帧头
+    :return: (负载长度, 负载编码)
+    """
+    length, payload_format = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"帧长度非法: {length} 字节")
+    if payload_format not in (FORMAT_JSON, FORMAT_BINARY):
+        raise ProtocolError(f"未知的负载编码: {payload_format}")
+    return length, payload_format
+
+
+def send_frame(sock, payload: bytes, payload_format: int = FORMAT_JSON) -> None:
+    """
+    发送一帧（长度头+负载）
+    :param sock: 套接字
+    :param payload: 已编码的负载
+    :param payload_format: 负载编码
+    """
+    sock.sendall(pack_frame(payload, payload_format))
+
+
+def recv_frame(sock) -> Optional[Tuple[bytearray, int]]:
+    """
+    接收一帧
+    :param sock: 套接字
+    :return: (负载, 负载编码)；对端在帧边界正常关闭时返回None
+    """
+    header = _recv_exact(sock, FRAME_HEADER.size, allow_eof=True)
+    if header is None:
+        return None
+    length, payload_format = parse_frame_header(header)
+    return _recv_exact(sock, length), payload_format
+
+
+def send_message(sock, message: Any, payload_format: int = FORMAT_JSON) -> None:
+    """
+    编码并发送一条消息
+    :param sock: 套接字
+    :param message: 消息对象
+    :param payload_format: 负载编码
+    """
+    send_frame(sock, encode_payload(message, payload_format), payload_format)
+
+
+def recv_message(sock) -> Optional[Tuple[Any, int]]:
+    """
+    接收并解码一条消息
+    :param sock: 套接字
+    :return: (消息对象, 负载编码)；对端正常关闭时返回None
+    """
+    frame = recv_frame(sock)
+    if frame is None:
+        return None
+    payload, payload_format = frame
+    return decode_payload(payload, payload_format), payload_format
@@ -0,0 +1,91 @@
+import json
+from typing import Dict, List
+
+SCENARIO_FORMAT = "auto-test-scenario"
+SCENARIO_VERSION = 1
+
+
+def compile_scenario(commands_list: List[List[Dict]]) -> Dict:
+    """
+    将Operation.commands_list编译为场景
+    场景格式：{"format", "version",
+              "targets": [{"element_path", "role_name_list", "geometry": {x,y,width,height}}, ...],
+              "commands": [{"action", "params", "target": targets中的下标（可选）,
+                            "end_target": 拖拽终点的targets下标（可选）}, ...]}
+    相同的语义目标只记录一次；录制时的时间戳不再保留
+    :param commands_list: 按操作分组的指令列表
+    :return: 场景字典
+    """
+    targets = []
+    target_index = {}
+    commands = []
+    for opts in commands_list:
+        for command in opts:
+            compiled = {"action": command["action"], "params": dict(command["params"])}
+            for field in ("target", "end_target"):
+                target = command.get(field)
+                if not target:
+                    continue
+                key = (
+                    target["element_path"],
+                    tuple(target.get("role_name_list") or ()),
+                    tuple(sorted(target["geometry"].items()))
+                )
+                if key not in target_index:
+                    target_index[key] = len(targets)
+                    targets.append({
+                        "element_path": target["element_path"],
+                        "role_name_list": target.get("role_name_list"),
+                        "geometry": dict(target["geometry"])
+                    })
+                compiled[field] = target_index[key]
+            commands.append(compiled)
+    return {
+        "format": SCENARIO_FORMAT,
+        "version": SCENARIO_VERSION,
+        "targets": targets,
+        "commands": commands
+    }
+
+
+def save_scenario(scenario: Dict, file_path: str) -> None:
+    """
+    保存场景文件
+    :param scenario: 场景字典
+    :param file_path: 场景文件路径
+    """
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(scenario, f, ensure_ascii=False, indent=2)
+
+
+def load_scenario(file_path: str) -> Dict:
+    """
+    读取并校验场景文件
+    :param file_path: 场景文件路径
+    :return: 场景字典
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+    if scenario.get("format") != SCENARIO_FORMAT:
+        raise ValueError(f"不是场景文件: {file_path}")
+    if scenario.get("version") != SCENARIO_VERSION:
+        raise ValueError(f"不支持的场景版本: {scenario.get('version')}")
+    return scenario
+
+
+class ScenarioPlayer:
+    """场景回放：整个场景作为一个指令集发送，语义目标表随指令集一起下发供被测试机器校验坐标"""
+
+    def __init__(self, communicator):
+        """
+        :param communicator: TestMachineCommunicator实例
+        """
+        self.communicator = communicator
+
+    def replay(self, scenario: Dict) -> Dict:
+        """
+        回放场景
+        :param scenario: 场景字典（compile_scenario或load_scenario的返回值）
+        :return: 执行结果，单条指令结果中retargeted为True表示该指令坐标已按元素当前位置修正
+        """
+        return self.communicator.execute_commands(scenario["commands"], targets=scenario["targets"])
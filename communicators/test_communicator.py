@@ -1,55 +1,121 @@
-import socket
-import json
 import time
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+from command_codec import CODEC_NAME, encode_commands
+from connection_pool import ConnectionPool, IDEMPOTENT_REQUEST_TYPES
+from latency_stats import LatencyStats, RequestTrace
+from protocol import FORMAT_BINARY, FORMAT_JSON, decode_payload, encode_payload, recv_frame, recv_message, send_frame, send_message
 
 class TestMachineCommunicator:
-    """测试者机器的通信类，用于向被测试机器发送请求并接收响应"""
+    """
+    测试者机器的通信类，用于向被测试机器发送请求并接收响应
+    每个请求从连接池借用一个连接，连接出错时丢弃；幂等请求（查询类）自动在新连接上重试
+    """
     
-    def __init__(self, target_host: str, target_port: int):
+    def __init__(self, target_host: str, target_port: int, payload_format: int = FORMAT_JSON,
+                 pool: Optional[ConnectionPool] = None, trace_file: Optional[str] = None,
+                 command_codec: bool = True):
+        """
+        :param target_host: 被测试机器的IP地址
+        :param target_port: 被测试机器的通信端口
+        :param payload_format: 请求负载编码（默认FORMAT_JSON：便于调试且CPU开销最低；FORMAT_BINARY体积更小，
+                               但由纯Python编解码，适合带宽受限的链路，见command_codec.encode_commands的实测数据）
+        :param pool: 连接池（可选，多个通信类实例可共享get_shared_pool()返回的连接池）；
+                     不传则创建本实例独占的连接池
+        :param trace_file: 请求耗时追踪文件（JSON Lines，可选）
+        :param command_codec: 是否使用紧凑的指令集编码（仅FORMAT_BINARY时生效，JSON保持可读便于调试）；
+                              是否可用由连接池在每个连接上分别协商
+        """
         self.target_host = target_host
         self.target_port = target_port
-        self.socket = None
+        self.payload_format = payload_format
+        self._owns_pool = pool is None
+        self.pool = pool or ConnectionPool(target_host, target_port)
+        # 测试者一侧的各阶段耗时（编码、网络往返、解码）
+        self.stats = LatencyStats(trace_file)
+        self.command_codec = command_codec and payload_format == FORMAT_BINARY
         self._connect()
 
     def _connect(self) -> None:
-        """建立与被测试机器的TCP连接"""
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.target_host, self.target_port))
-            print(f"成功连接到被测试机器 {self.target_host}:{self.target_port}")
-        except Exception as e:
-            raise ConnectionError(f"无法连接到被测试机器: {str(e)}")
+        """预先建立一个连接（无法连接时立即报错）"""
+        self.pool.release(self.pool.acquire())
+        print(f"成功连接到被测试机器 {self.target_host}:{self.target_port}")
 
-    def _send_request(self, request_type: str, data: Dict) -> Dict:
+    def _send_request(self, request_type: str, data: Dict, commands: Optional[List[Dict]] = None) -> Dict:
         """
         发送请求到被测试机器并接收响应
         :param request_type: 请求类型（get_element/exec_commands）
         :param data: 请求数据
+        :param commands: 指令集（可选），按所用连接协商的指令集编码放入请求数据
         :return: 被测试机器的响应结果
         """
-        if not self.socket:
-            self._connect()
+        # 构建请求格式
+        request = {
+            "type": request_type,
+            "data": data,
+            "timestamp": time.time()
+        }
+        print(f"发送请求: {request_type}, 数据: {data if commands is None else dict(data, commands=commands)}")
+        trace = RequestTrace(request_type)
+        payloads = {}  # 指令集编码 -> 已编码的请求（重试时复用）
+        # 只有幂等请求可以重试：指令集可能已在被测试机器上执行，重发会重复注入输入
+        delays = self.pool.backoff_delays() if request_type in IDEMPOTENT_REQUEST_TYPES else iter(())
+        while True:
+            sock = None
+            try:
+                with self.stats.tracing(trace):
+                    with self.stats.timer("connect"):
+                        sock = self.pool.acquire()
+                    codec = self._codec_of(sock) if commands is not None else None
+                    if codec not in payloads:
+                        if commands is not None:
+                            request["data"] = dict(data, **self._commands_data(commands, codec))
+                        with self.stats.timer("encode"):
+                            payloads[codec] = encode_payload(request, self.payload_format)
+                    # 发送请求长度和内容（一帧），接收完整的响应帧
+                    with self.stats.timer("rtt"):
+                        send_frame(sock, payloads[codec], self.payload_format)
+                        frame = recv_frame(sock)
+                    if frame is None:
+                        raise ConnectionError("被测试机器关闭了连接")
+                    with self.stats.timer("decode"):
+                        response = decode_payload(*frame)
+            except Exception as e:
+                if sock is not None:
+                    self.pool.discard(sock)  # 连接异常时丢弃
+                delay = next(delays, None)
+                if delay is None:
+                    raise RuntimeError(f"通信错误: {str(e)}")
+                print(f"请求{request_type}失败，{delay:.2f}秒后在新连接上重试: {str(e)}")
+                time.sleep(delay)
+                continue
+            if request_type == "disconnect":
+                self.pool.discard(sock)  # 被测试机器会关闭该连接，不再归还
+            else:
+                self.pool.release(sock)
+            self.stats.finish(trace)
+            return response
 
-        try:
-            # 构建请求格式
-            request = {
-                "type": request_type,
-                "data": data,
-                "timestamp": time.time()
-            }
-            # 发送请求
-            sendJson = json.dumps(request).encode('utf-8')
-            print(f"发送请求: {request_type}, 数据: {data}")
-            # 发送请求长度和内容
-            self.socket.sendall(sendJson)
-            
-            # 接收响应（设置1024*1024字节缓冲区）
-            response_data = self.socket.recv(1024 * 1024).decode('utf-8')
-            return json.loads(response_data)
-        except Exception as e:
-            self.socket = None  # 连接异常时重置
-            raise RuntimeError(f"通信错误: {str(e)}")
+    def hello(self) -> Dict:
+        """
+        查询被测试机器支持的负载编码和指令集编码
+        :return: {"success", "data": {"formats": [...], "command_codecs": [...]}}
+        """
+        return self._send_request(request_type="hello", data={"command_codecs": [CODEC_NAME]})
+
+    def _codec_of(self, sock) -> Optional[str]:
+        """该连接上发送指令集使用的编码：启用紧凑编码且该连接协商成功时为编码名称，否则为None"""
+        return self.pool.codec_of(sock) if self.command_codec else None
+
+    @staticmethod
+    def _commands_data(commands: List[Dict], codec: Optional[str] = None) -> Dict:
+        """
+        指令集请求的数据部分：连接已协商紧凑编码时发送packed_commands，否则发送指令列表
+        :param commands: 指令集
+        :param codec: 连接协商的指令集编码（见_codec_of）
+        """
+        if codec == CODEC_NAME:
+            return {"packed_commands": encode_commands(commands)}
+        return {"commands": commands}
 
     def get_element_info(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None) -> Dict:
         """
@@ -66,29 +132,153 @@ class TestMachineCommunicator:
             }
         )
 
-    def execute_commands(self, commands: List[Dict]) -> Dict:
+    def get_elements_info(self, elements: List[Tuple[str, Optional[List[Optional[str]]]]]) -> Dict:
+        """
+        批量请求获取元素信息（一次网络往返）
+        :param elements: [(元素路径, 角色名列表), ...]
+        :return: {"success": 全部成功, "data": [单个元素的查询结果, ...]}
+        """
+        return self._send_request(
+            request_type="get_elements",
+            data={"elements": [[element_path, role_name_list] for element_path, role_name_list in elements]}
+        )
+
+    def snapshot_tree(self, element_path: Optional[str] = None,
+                      role_name_list: Optional[List[Optional[str]]] = None,
+                      max_depth: Optional[int] = None) -> Dict:
+        """
+        请求元素树快照（被测试机器一次遍历子树），可用TreeSnapshot在本地查询
+        :param element_path: 子树根元素路径（可选，默认为应用根节点）
+        :param role_name_list: 元素角色名列表
+        :param max_depth: 最大遍历深度（可选）
+        :return: {"success", "data": 快照字典}
+        """
+        return self._send_request(
+            request_type="snapshot_tree",
+            data={"element_path": element_path, "role_name_list": role_name_list, "max_depth": max_depth}
+        )
+
+    def wait_element_info(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None,
+                          timeout: float = 10.0) -> Dict:
+        """
+        请求等待元素出现（被测试机器在AT-SPI结构变化事件到达时重查，元素出现后立即返回）
+        :param element_path: 元素路径（如"菜单/文件/新建"）
+        :param role_name_list: 元素角色名列表
+        :param timeout: 超时时间（秒）
+        :return: 与get_element_info相同格式的响应，额外包含等待耗时waited
+        """
+        return self._send_request(
+            request_type="wait_element",
+            data={"element_path": element_path, "role_name_list": role_name_list, "timeout": timeout}
+        )
+
+    def execute_commands(self, commands: List[Dict], targets: Optional[List[Dict]] = None) -> Dict:
         """
         发送指令集到被测试机器执行
         :param commands: 指令集列表（如mouse_move, mouse_click等）
+        :param targets: 语义目标表（可选，回放场景时使用），指令的target字段为该表下标
         :return: 执行结果
         """
+        data = {"targets": targets} if targets else {}
         return self._send_request(
             request_type="exec_commands",
-            data={"commands": commands}
+            data=data,
+            commands=commands
         )
     
+    def execute_commands_stream(self, commands: List[Dict], stop_on_failure: bool = False,
+                                targets: Optional[List[Dict]] = None) -> Iterator[Dict]:
+        """
+        流式执行指令集：被测试机器每执行完一条指令即返回其结果
+        迭代过程中不能在同一连接上发送其他请求；提前结束迭代时会读完剩余的结果帧
+        :param commands: 指令集列表
+        :param stop_on_failure: 某条指令失败后被测试机器是否停止执行剩余指令（默认与非流式执行一致，继续执行）
+        :param targets: 语义目标表（可选，回放场景时使用）
+        :return: 迭代器，依次产出单条指令结果（含index），最后产出汇总（含done、success、executed、total）
+        """
+        print(f"发送流式指令集请求，共{len(commands)}条指令")
+        try:
+            sock = self.pool.acquire()
+        except Exception as e:
+            raise RuntimeError(f"通信错误: {str(e)}")
+        # 指令集编码取决于该连接的协商结果
+        data = self._commands_data(commands, self._codec_of(sock))
+        data.update({"stream": True, "stop_on_failure": stop_on_failure})
+        if targets:
+            data["targets"] = targets
+        request = {
+            "type": "exec_commands",
+            "data": data,
+            "timestamp": time.time()
+        }
+        done = False
+        try:
+            send_message(sock, request, self.payload_format)
+            while not done:
+                message = recv_message(sock)
+                if message is None:
+                    raise ConnectionError("被测试机器关闭了连接")
+                frame = message[0]
+                if not frame.get("stream"):
+                    # 被测试机器无法处理该请求时返回普通响应
+                    done = True
+                    yield frame
+                elif frame.get("done"):
+                    done = True
+                    yield frame
+                else:
+                    yield frame["result"]
+        except GeneratorExit:
+            # 调用方提前结束迭代：读完剩余帧后归还连接，读取失败则丢弃连接
+            if done or self._drain_stream(sock):
+                self.pool.release(sock)
+            else:
+                self.pool.discard(sock)
+            raise
+        except Exception as e:
+            self.pool.discard(sock)  # 连接异常时丢弃
+            raise RuntimeError(f"通信错误: {str(e)}")
+        self.pool.release(sock)
+
+    @staticmethod
+    def _drain_stream(sock) -> bool:
+        """读完流式执行剩余的结果帧，返回连接是否仍可复用"""
+        try:
+            while True:
+                message = recv_message(sock)
+                if message is None:
+                    return False
+                if message[0].get("done") or not message[0].get("stream"):
+                    return True
+        except Exception:
+            return False
+
+    def get_stats(self, reset: bool = False) -> Dict:
+        """
+        获取被测试机器的各阶段耗时直方图（排队、解码、逐级查找、注入、等待、编码等）
+        测试者一侧的编码/网络往返/解码耗时见self.stats.snapshot()
+        :param reset: 获取后是否清空被测试机器的统计
+        :return: {"success", "data": {"since", "phases": {阶段名: 直方图}}}
+        """
+        return self._send_request(request_type="stats", data={"reset": reset})
+
     def disconnect(self) -> Dict:
         """
-        主动断开与被测试机器的连接
+        主动断开与被测试机器的连接：通知被测试机器后断开连接池中的全部连接
+        （连接池仍可使用，之后的请求会重新建立连接；不再使用时调用close）
         :return: 断开连接的响应结果
         """
-        return self._send_request(
-            request_type="disconnect",
-            data={}
-        )
+        try:
+            return self._send_request(
+                request_type="disconnect",
+                data={}
+            )
+        finally:
+            self.pool.drain()
 
     def close(self) -> None:
-        """关闭连接"""
-        if self.socket:
-            self.socket.close()
+        """关闭连接（共享的连接池由其创建者负责关闭）"""
+        self.stats.close()
+        if self._owns_pool:
+            self.pool.close()
             print("连接已关闭")
@@ -6,13 +6,13 @@ if __name__ == "__main__":
 
     op.click_element(element_path="Project Toolbar/New", role_name_list=["tool bar", "push button"])
 
-    op.click_element(element_path="Web", role_name_list=["menu item"])
-
-    op.click_element(element_path="Web/QuickMapServices", role_name_list=["menu item", "menu item"])
-
-    op.click_element(element_path="Web/QuickMapServices/OSM", role_name_list=["menu item", "menu item", "menu item"])
-
-    op.click_element(element_path="Web/QuickMapServices/OSM/OSM Standard", role_name_list=["menu item", "menu item", "menu item", "menu item"])
+    # 逐级展开的菜单作为一个指令集发送，各级菜单项在点击前才解析位置
+    op.click_elements([
+        ("Web", ["menu item"]),
+        ("Web/QuickMapServices", ["menu item", "menu item"]),
+        ("Web/QuickMapServices/OSM", ["menu item", "menu item", "menu item"]),
+        ("Web/QuickMapServices/OSM/OSM Standard", ["menu item", "menu item", "menu item", "menu item"])
+    ])
 
     op.drag_to_percentage("QGIS3", 0.6, 0.7, 0.5, 0.6)
 
@@ -1,20 +1,43 @@
 import socket
-import json
 import time
 import random
-import dogtail.tree
-from dogtail.rawinput import click, press, release, absoluteMotion, keyCombo
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from backends import AccessibilityBackend, DogtailBackend, create_backend
+from anchors import resolve_point
+from atspi_events import AtspiEventMonitor, DEFAULT_EVENT_TYPES
+from command_codec import CODEC_NAME, decode_commands
+from element_cache import ElementCache
+from element_waiter import ElementWaiter, WAIT_EVENT_TYPES
+from pacing import Pacer, PACING_EVENT_TYPES
+from tree_snapshot import NODE_SIZE, capture_tree
+from latency_stats import LatencyStats, RequestTrace
+from motion_path import DEFAULT_EASING, perform_drag
+from protocol import FORMAT_BINARY, FORMAT_JSON, ProtocolError, recv_frame, decode_payload, encode_payload, \
+    send_frame
 
 class TestedMachineCommunicator:
     """被测试机器的通信类，监听8888端口并处理测试者的请求"""
+
+    # 注入输入的请求类型，统一进入单线程输入队列按到达顺序执行
+    INPUT_REQUEST_TYPES = ("exec_commands",)
     
-    def __init__(self, bind_host: str = "0.0.0.0", bind_port: int = 8888):
+    def __init__(self, bind_host: str = "0.0.0.0", bind_port: int = 8888, max_clients: int = 16,
+                 cache_size: int = 256, trace_file: Optional[str] = None,
+                 backend: Optional[AccessibilityBackend] = None):
         """
         初始化通信服务
         :param bind_host: 绑定的IP地址（0.0.0.0表示允许所有网络连接）
         :param bind_port: 监听的端口（默认8888）
+        :param max_clients: 同时处理的客户端连接数上限（超出的连接收到错误回复后被关闭）
+        :param cache_size: 元素路径缓存的最大条目数
+        :param trace_file: 请求耗时追踪文件（JSON Lines，可选）
+        :param backend: 无障碍后端（元素查找与输入注入，默认为DogtailBackend）
         """
+        self.backend = backend or DogtailBackend()
         self.bind_host = bind_host
         self.bind_port = bind_port
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -22,134 +45,720 @@ class TestedMachineCommunicator:
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.is_running = False  # 服务运行状态
         self.app = None  # 被测应用实例
+        self.max_clients = max_clients
+        self.client_pool = None  # 客户端连接线程池
+        self.query_pool = None  # 只读查询线程池（多个查询并行执行）
+        self.input_queue = None  # 单线程输入队列（所有注入输入的指令集在此串行执行）
+        self._clients = set()  # 当前活动的客户端套接字
+        self._clients_lock = threading.Lock()
+        # 路径->节点缓存，由AT-SPI的窗口/子节点变化事件驱动失效
+        self.element_cache = ElementCache(max_entries=cache_size)
+        self.event_monitor = AtspiEventMonitor(
+            dict.fromkeys(DEFAULT_EVENT_TYPES + PACING_EVENT_TYPES + WAIT_EVENT_TYPES)
+        )
+        self.event_monitor.add_listener(self._on_atspi_event)
+        # 指令间节奏控制，代替固定的0.2秒等待
+        self.pacer = Pacer(self.event_monitor)
+        # 等待元素出现，仅在结构变化事件到达时重查
+        self.element_waiter = ElementWaiter(self.event_monitor)
+        # 各阶段耗时直方图（可通过stats请求获取）
+        self.stats = LatencyStats(trace_file)
+
+    def _on_atspi_event(self, event_type: str, source) -> None:
+        """
+        AT-SPI事件回调：窗口创建/销毁时清空缓存，子节点变化时丢弃该节点之下的缓存路径
+        :param event_type: 事件类型（如"object:children-changed:add"）
+        :param source: 事件源节点
+        """
+        if event_type.startswith("window:"):
+            self.element_cache.clear()
+        elif event_type.startswith("object:children-changed"):
+            self.element_cache.invalidate_subtree(source)
 
-    def _get_element(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None) -> Dict:
+    def _split_path(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None):
+        """
+        拆分元素路径并对齐角色名列表
+        :param element_path: 元素路径（如"菜单/文件/新建"）
+        :param role_name_list: 角色名列表，长度不足则补None，过长则截断，空字符串视为None
+        :return: (各级名称列表, 各级角色名列表)
+        """
+        # 拆分路径为各级元素名称
+        path_parts = [part.strip() for part in element_path.split('/') if part.strip()]
+
+        # 处理角色名列表（默认空列表，长度不足则补None，过长则截断）
+        if not role_name_list:
+            role_name_list = []
+        # 确保列表长度与路径级数一致
+        adjusted_roles = []
+        for i in range(len(path_parts)):
+            if i < len(role_name_list):
+                # 空字符串视为None（不限制角色）
+                adjusted_roles.append(role_name_list[i] if role_name_list[i] else None)
+            else:
+                adjusted_roles.append(None)  # 长度不足补None
+        return path_parts, adjusted_roles
+
+    def _resolve_element(self, path_parts: List[str], adjusted_roles: List[Optional[str]],
+                         resolved: Optional[Dict] = None):
+        """
+        从应用根节点逐级查找元素
+        :param path_parts: 各级名称
+        :param adjusted_roles: 各级角色名（None表示不限制）
+        :param resolved: 已解析的路径前缀缓存 {((名称, 角色), ...): 元素}，批量查询时共享公共前缀的遍历
+        :return: (元素, 错误信息)，找到时错误信息为None
+        """
+        # # 若未指定应用，使用系统根窗口（所有应用）
+        if not self.app:
+            self.app = self.backend.root()
+
+        if resolved is None:
+            resolved = {}
+        key = tuple(zip(path_parts, adjusted_roles))
+
+        # 从最长的已解析前缀（本次批量查询或跨请求的节点缓存）继续查找
+        start = len(key)
+        current_element = self.app
+        while start > 0:
+            prefix = key[:start]
+            if prefix in resolved:
+                current_element = resolved[prefix]
+                break
+            cached = self.element_cache.get(prefix)
+            if cached is not None:
+                current_element = resolved[prefix] = cached
+                break
+            start -= 1
+
+        # 遍历剩余层级（每级都可能有角色名）
+        for i in range(start, len(key)):
+            part, current_role = key[i]
+            # 按名称和当前级角色名查找（角色名为None则不限制）
+            with self.stats.timer(f"lookup.level{i + 1}"):
+                found_element = self.backend.find_child(current_element, part, current_role or None)
+
+            if not found_element:
+                # 构建详细错误信息
+                error_path = '/'.join(path_parts[:i+1])
+                error_msg = f"元素不存在: {error_path}"
+                if current_role:
+                    error_msg += f" (角色: {current_role})"
+                return None, error_msg
+
+            current_element = found_element  # 进入下一级
+            resolved[key[:i+1]] = current_element
+            self.element_cache.put(key[:i+1], current_element)
+
+        return current_element, None
+
+    def _element_info(self, element) -> Dict:
+        """
+        提取元素信息（位置、尺寸等）
+        :param element: dogtail节点
+        :return: 查询响应中的data字段
+        """
+        x, y, width, height = self.backend.geometry(element)
+        print(f"找到元素: {element.name}, 位置: ({x}, {y}), 尺寸: ({width}, {height})")
+        return {
+            "position": {"x": x, "y": y},
+            "size": {"width": width, "height": height},
+            # "name": element.name,
+            # "role_name_list": element.roleName
+        }
+
+    def _get_element(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None,
+                     resolved: Optional[Dict] = None) -> Dict:
         """
         调用dogtail查询元素信息
         :param element_path: 元素路径（如"菜单/文件/新建"）
         :param role_name_list: 角色名列表，项数与路径级数相等，每项可为空（None或""）
                               例如：["window", "menu bar", "menu item"]
+        :param resolved: 已解析的路径前缀缓存（可选，见_resolve_element）
         :return: 包含元素位置、尺寸等信息的字典
         """
         print(f"查询元素: {element_path}, 角色: {role_name_list}")
-        # 这里使用dogtail的tree模块来查找元素
+        # 通过无障碍后端逐级查找元素
         try:
-            # # 若未指定应用，使用系统根窗口（所有应用）
-            if not self.app:
-                self.app = dogtail.tree.root
-
-            # 拆分路径为各级元素名称
-            path_parts = [part.strip() for part in element_path.split('/') if part.strip()]
+            path_parts, adjusted_roles = self._split_path(element_path, role_name_list)
             if not path_parts:
                 return {"success": False, "error": "元素路径不能为空"}
 
-            # 处理角色名列表（默认空列表，长度不足则补None，过长则截断）
-            if not role_name_list:
-                role_name_list = []
-            # 确保列表长度与路径级数一致
-            adjusted_roles = []
-            for i in range(len(path_parts)):
-                if i < len(role_name_list):
-                    # 空字符串视为None（不限制角色）
-                    adjusted_roles.append(role_name_list[i] if role_name_list[i] else None)
-                else:
-                    adjusted_roles.append(None)  # 长度不足补None
+            element, error_msg = self._resolve_element(path_parts, adjusted_roles, resolved)
+            if element is None:
+                return {"success": False, "error": error_msg}
 
-            current_element = self.app
-            # 遍历所有层级（每级都可能有角色名）
-            for i, part in enumerate(path_parts):
-                current_role = adjusted_roles[i]
-                # 按名称和当前级角色名查找（角色名为None则不限制）
-                if current_role:
-                    found_element = current_element.child(name=part, roleName=current_role)
-                else:
-                    found_element = current_element.child(name=part)
-
-                if not found_element:
-                    # 构建详细错误信息
-                    error_path = '/'.join(path_parts[:i+1])
-                    error_msg = f"元素不存在: {error_path}"
-                    if current_role:
-                        error_msg += f" (角色: {current_role})"
-                    return {"success": False, "error": error_msg}
-
-                current_element = found_element  # 进入下一级
-
-            # 提取元素信息（位置、尺寸、中心坐标等）
-            x, y = current_element.position
-            width, height = current_element.size
-            print(f"找到元素: {current_element.name}, 位置: ({x}, {y}), 尺寸: ({width}, {height})")
-            # x = random.randint(1, 1200)
-            # y = random.randint(1, 800)
-            # width = random.randint(100, 800)
-            # height = random.randint(100, 600)
-            return {
-                "success": True,
-                "data": {
-                    "position": {"x": x, "y": y},
-                    "size": {"width": width, "height": height},
-                    # "name": current_element.name,
-                    # "role_name_list": current_element.roleName
-                }
-            }
+            return {"success": True, "data": self._element_info(element)}
         except Exception as e:
             return {"success": False, "error": f"元素查询失败: {str(e)}"}
 
-    def _execute_commands(self, commands: List[Dict]) -> Dict:
+    def _get_elements(self, elements: List) -> Dict:
         """
-        执行测试者发送的指令集
-        :param commands: 指令列表（如鼠标移动、点击等）
-        :return: 执行结果汇总
+        批量查询元素信息，公共路径前缀只遍历一次
+        :param elements: [(元素路径, 角色名列表), ...]
+        :return: {"success": 全部成功, "data": [与单个查询响应格式相同的结果, ...]}
         """
-        results = []
-        for cmd in commands:
+        resolved = {}
+        results = [
+            self._get_element(element_path, role_name_list, resolved)
+            for element_path, role_name_list in elements
+        ]
+        return {
+            "success": all(r["success"] for r in results),
+            "data": results
+        }
+
+    def _snapshot_tree(self, element_path: Optional[str] = None,
+                       role_name_list: Optional[List[Optional[str]]] = None,
+                       max_depth: Optional[int] = None) -> Dict:
+        """
+        一次遍历应用（或指定元素）的子树，返回紧凑编码的快照（格式见tree_snapshot.capture_tree）
+        :param element_path: 子树根元素路径（可选，默认为应用根节点）
+        :param role_name_list: 角色名列表
+        :param max_depth: 最大遍历深度（可选）
+        :return: {"success", "data": 快照}
+        """
+        print(f"遍历元素树: {element_path or '<应用>'}, 最大深度: {max_depth}")
+        if not self.app:
+            self.app = self.backend.root()
+        root_element = self.app
+        if element_path:
+            path_parts, adjusted_roles = self._split_path(element_path, role_name_list)
+            root_element, error_msg = self._resolve_element(path_parts, adjusted_roles)
+            if root_element is None:
+                return {"success": False, "error": error_msg}
+
+        start = time.perf_counter()
+        snapshot = capture_tree(root_element, max_depth)
+        count = len(snapshot["nodes"]) // NODE_SIZE
+        print(f"元素树遍历完成: {count}个节点，耗时{time.perf_counter() - start:.3f}秒")
+        return {"success": True, "data": snapshot}
+
+    def _wait_element(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None,
+                      timeout: float = 10.0) -> Dict:
+        """
+        等待元素出现后返回其信息（AT-SPI事件驱动重查，事件不可用时轮询）
+        :param element_path: 元素路径
+        :param role_name_list: 角色名列表
+        :param timeout: 超时时间（秒）
+        :return: 与get_element相同格式的响应，额外包含等待耗时waited
+        """
+        print(f"等待元素: {element_path}, 角色: {role_name_list}, 超时: {timeout}秒")
+        path_parts, adjusted_roles = self._split_path(element_path, role_name_list)
+        if not path_parts:
+            return {"success": False, "error": "元素路径不能为空"}
+
+        last_error = [None]
+
+        def find():
+            element, error_msg = self._resolve_element(path_parts, adjusted_roles)
+            last_error[0] = error_msg
+            return element
+
+        start = time.monotonic()
+        element = self.element_waiter.wait(find, timeout)
+        waited = round(time.monotonic() - start, 3)
+        if element is None:
+            return {"success": False, "error": f"等待超时: {last_error[0]}", "waited": waited}
+        return {"success": True, "data": self._element_info(element), "waited": waited}
+
+    def _type_text(self, params: Dict) -> str:
+        """
+        一次性输入整段文本：默认以键盘事件连续输入；键盘输入失败且目标元素支持EditableText时改为直接设置文本
+        :param params: {"text": 文本, "interval": 每个按键间隔秒数（默认0）,
+                        "element_path"/"role_name_list": 目标输入框（可选）, "mode": "keyboard"|"editable"（可选）}
+        :return: 实际使用的输入方式（"keyboard" 或 "editable_text"）
+        """
+        text = params["text"]
+        if params.get("mode") != "editable":
             try:
-                action = cmd["action"]
-                params = cmd["params"]
-                print(f"执行指令: {action}，参数: {params}")
+                self.backend.type_text(text, params.get("interval", 0))
+                return "keyboard"
+            except Exception as e:
+                if not params.get("element_path"):
+                    raise
+                print(f"键盘输入失败，改用EditableText接口: {str(e)}")
+
+        # 只有需要EditableText接口时才查找目标元素，键盘输入不承担元素查找的开销
+        target = None
+        if params.get("element_path"):
+            path_parts, adjusted_roles = self._split_path(params["element_path"], params.get("role_name_list"))
+            target, _ = self._resolve_element(path_parts, adjusted_roles)
+        if target is None:
+            raise ValueError("使用EditableText输入需要指定有效的element_path")
+        # 不支持EditableText接口的元素会抛出NotImplementedError
+        if not self.backend.set_text(target, text):
+            raise RuntimeError("目标元素拒绝设置文本")
+        return "editable_text"
+
+    def _retarget_params(self, params: Dict, target: Dict, keys=("x", "y")) -> Optional[Dict]:
+        """
+        按元素当前位置修正录制时的坐标：元素经缓存廉价校验后读取当前位置，
+        与录制时一致则沿用原坐标，否则按坐标在元素内的相对位置换算
+        :param params: 录制的指令参数（含x、y）
+        :param target: 语义目标 {"element_path", "role_name_list", "geometry": 录制时的{x,y,width,height}}
+        :param keys: 需要修正的坐标参数名（拖拽终点为("end_x", "end_y")）
+        :return: 修正后的参数；位置未变化时返回None
+        """
+        path_parts, adjusted_roles = self._split_path(target["element_path"], target.get("role_name_list"))
+        element, error_msg = self._resolve_element(path_parts, adjusted_roles)
+        if element is None:
+            raise LookupError(error_msg)
+        x, y, width, height = self.backend.geometry(element)
+        old = target["geometry"]
+        if (x, y, width, height) == (old["x"], old["y"], old["width"], old["height"]):
+            return None
+
+        key_x, key_y = keys
+        new_params = dict(params)
+        new_params[key_x] = x + (round((params[key_x] - old["x"]) * width / old["width"]) if old["width"] else 0)
+        new_params[key_y] = y + (round((params[key_y] - old["y"]) * height / old["height"]) if old["height"] else 0)
+        return new_params
+
+    def _symbolic_geometry(self, spec: Dict) -> Tuple[int, int, int, int]:
+        """
+        符号目标所指元素的几何信息
+        未指定路径或路径为被测应用本身时取应用主窗口的范围（应用节点的范围通常为空），
+        主窗口与应用节点都没有范围时取整个屏幕，避免百分比坐标全部落在(0, 0)
+        """
+        if not self.app:
+            self.app = self.backend.root()
+        element_path = spec.get("element_path")
+        if element_path and element_path != getattr(self.app, "name", None):
+            path_parts, adjusted_roles = self._split_path(element_path, spec.get("role_name_list"))
+            element, error_msg = self._resolve_element(path_parts, adjusted_roles)
+            if element is None:
+                raise LookupError(error_msg)
+            return self.backend.geometry(element)
+        for node in (self.backend.find_child(self.app, role="frame", recursive=False), self.app):
+            if node is None:
+                continue
+            try:
+                geometry = self.backend.geometry(node)
+            except (TypeError, ValueError):
+                continue  # 节点没有提供范围
+            if geometry[2] > 0 and geometry[3] > 0:
+                return geometry
+        return self.backend.screen_geometry()
+
+    def _resolve_symbolic(self, params: Dict) -> Optional[Dict]:
+        """
+        在注入前把符号目标解析为坐标：at解析为x、y，end_at解析为end_x、end_y（按元素当前位置，不会过期）
+        符号目标格式：{"element_path", "role_name_list", "anchor": center|top-left|..., "offset": [dx, dy],
+                      "pct": [0~1, 0~1]}，见anchors.symbolic_target
+        :param params: 指令参数
+        :return: 解析后的参数；没有符号目标时返回None
+        """
+        if "at" not in params and "end_at" not in params:
+            return None
+        new_params = dict(params)
+        with self.stats.timer("resolve"):
+            for field, (key_x, key_y) in (("at", ("x", "y")), ("end_at", ("end_x", "end_y"))):
+                spec = new_params.pop(field, None)
+                if spec is None:
+                    continue
+                geometry = self._symbolic_geometry(spec)
+                new_params[key_x], new_params[key_y] = resolve_point(
+                    geometry, spec.get("anchor", "center"), spec.get("offset"), spec.get("pct")
+                )
+        return new_params
+
+    def _drag_path(self, params: Dict) -> int:
+        """
+        服务端平滑拖拽，移动事件在本机按刷新率注入，不经过网络往返
+        :param params: {"x", "y": 起点, "end_x", "end_y": 终点, "duration": 移动耗时秒数（默认0.3）,
+                        "easing": 缓动函数名（默认ease_in_out）, "button": 鼠标键（默认left）,
+                        "hold": 按下后开始移动前的停顿秒数（默认0.05）, "rate": 移动事件频率（可选，默认为刷新率）}
+        :return: 注入的移动事件数
+        """
+        return perform_drag(
+            self.backend, (params["x"], params["y"]), (params["end_x"], params["end_y"]),
+            duration=params.get("duration", 0.3), easing=params.get("easing", DEFAULT_EASING),
+            button=params.get("button", "left"), hold=params.get("hold", 0.05), rate=params.get("rate")
+        )
+
+    def _execute_command(self, cmd: Dict, next_cmd: Optional[Dict] = None,
+                         targets: Optional[List[Dict]] = None) -> Dict:
+        """
+        执行单条指令并按节奏策略等待
+        :param cmd: 指令（如鼠标移动、点击等）
+        :param next_cmd: 下一条指令（用于决定等待策略）
+        :param targets: 语义目标表（可选，见_execute_commands）
+        :return: 单条指令的执行结果
+        """
+        action = cmd.get("action")
+        try:
+            params = cmd["params"]
+            result = {"action": action, "success": True}
 
-                result = {"action": action, "success": True}
+            # 符号目标在注入时解析（元素不存在时该指令失败，不会点击过期坐标）
+            resolved = self._resolve_symbolic(params)
+            if resolved is not None:
+                params = resolved
+                result["resolved"] = {key: params[key] for key in ("x", "y", "end_x", "end_y") if key in params}
 
-                # 映射指令到dogtail的实际操作
-                if action == "mouse_move":
-                    absoluteMotion(params["x"], params["y"])  # 鼠标移动到绝对坐标
+            target_index = cmd.get("target")
+            if targets and isinstance(target_index, int) and "x" in params:
+                try:
+                    new_params = self._retarget_params(params, targets[target_index])
+                    if new_params is not None:
+                        params = new_params
+                        result["retargeted"] = True
+                except LookupError as e:
+                    # 元素已不存在时沿用录制的坐标
+                    result["target_error"] = str(e)
+            end_target_index = cmd.get("end_target")
+            if targets and isinstance(end_target_index, int) and "end_x" in params:
+                try:
+                    new_params = self._retarget_params(params, targets[end_target_index], ("end_x", "end_y"))
+                    if new_params is not None:
+                        params = new_params
+                        result["retargeted"] = True
+                except LookupError as e:
+                    result["end_target_error"] = str(e)
+            print(f"执行指令: {action}，参数: {params}")
+
+            # 映射指令到后端的实际操作
+            inject_start = time.perf_counter()
+            if action == "mouse_move":
+                self.backend.motion(params["x"], params["y"])  # 鼠标移动到绝对坐标
+
+            elif action == "mouse_click":
+                self.backend.click(
+                    params["x"], 
+                    params["y"], 
+                    button=params.get("button", "left")  # 支持左键/右键
+                )
+
+            elif action == "mouse_press":
+                self.backend.press(button=params.get("button", "left"))  # 按下鼠标键
+
+            elif action == "mouse_release":
+                self.backend.release(button=params.get("button", "left"))  # 释放鼠标键
+
+            elif action == "drag_path":
+                result["steps"] = self._drag_path(params)  # 按下、平滑移动到终点、释放
+
+            elif action == "hotkey":
+                self.backend.key_combo(params["keys"])  # 执行组合键（如["CtrL", "a"]）
+
+            elif action == "key_press":
+                self.backend.key_combo([params["key"]])  # 执行单个按键
+
+            elif action == "type_text":
+                result["method"] = self._type_text(params)  # 一次性输入整段文本
+
+            else:
+                return {"action": action, "success": False, "error": "未知指令"}
+            self.stats.record(f"inject.{action}", time.perf_counter() - inject_start)
+
+            # 按指令类型等待（连续按键不等待，点击/组合键等待界面安静），并记录实际等待时间
+            waited = self.pacer.pause_after(cmd, next_cmd)
+            self.stats.record("settle", waited)
+            result["waited"] = round(waited, 4)
+            return result
 
-                elif action == "mouse_click":
-                    click(
-                        params["x"], 
-                        params["y"], 
-                        button=params.get("button", "left")  # 支持左键/右键
-                    )
+        except Exception as e:
+            return {
+                "action": action,
+                "success": False,
+                "error": str(e)
+            }
 
-                elif action == "mouse_press":
-                    press(button=params.get("button", "left"))  # 按下鼠标键
+    def _iter_commands(self, commands: List[Dict], targets: Optional[List[Dict]] = None,
+                       stop_on_failure: bool = False):
+        """
+        逐条执行指令集，每执行完一条即产出其结果
+        :param commands: 指令列表
+        :param targets: 语义目标表（可选，见_execute_commands）
+        :param stop_on_failure: 某条指令失败后是否停止执行剩余指令
+        :return: 生成器，依次产出带index字段的单条指令结果
+        """
+        for index, cmd in enumerate(commands):
+            next_cmd = commands[index + 1] if index + 1 < len(commands) else None
+            result = self._execute_command(cmd, next_cmd, targets)
+            result["index"] = index
+            yield result
+            if stop_on_failure and not result["success"]:
+                print(f"第 {index + 1} 条指令失败，停止执行剩余 {len(commands) - index - 1} 条指令")
+                return
+
+    @staticmethod
+    def _summarize_results(results: List[Dict], total: int) -> Dict:
+        """汇总指令集执行结果"""
+        return {
+            "success": len(results) == total and all(r["success"] for r in results),
+            "executed": len(results),
+            "total": total,
+            "waited": round(sum(r.get("waited", 0) for r in results), 4)
+        }
 
-                elif action == "mouse_release":
-                    release(button=params.get("button", "left"))  # 释放鼠标键
+    def _execute_commands(self, commands: List[Dict], targets: Optional[List[Dict]] = None,
+                          stop_on_failure: bool = False) -> Dict:
+        """
+        执行测试者发送的指令集
+        :param commands: 指令列表（如鼠标移动、点击等）
+        :param targets: 语义目标表（可选，场景回放时使用）；指令的target字段为其下标，
+                        执行前按元素当前位置校验并修正坐标
+        :param stop_on_failure: 某条指令失败后是否停止执行剩余指令
+        :return: 执行结果汇总
+        """
+        results = list(self._iter_commands(commands, targets, stop_on_failure))
+        response = self._summarize_results(results, len(commands))
+        response["results"] = results
+        return response
 
-                elif action == "hotkey":
-                    keyCombo(params["keys"])  # 执行组合键（如["CtrL", "a"]）
+    def _stream_commands(self, client_socket: socket.socket, send_lock: threading.Lock,
+                         request: Dict, payload_format: int) -> None:
+        """
+        流式执行指令集（在输入队列中运行）：每条指令执行后立即发送一帧结果，最后发送汇总帧
+        结果帧：{"stream": True, "result": 单条结果}；汇总帧：{"stream": True, "done": True, ...汇总}
+        :param client_socket: 客户端套接字
+        :param send_lock: 该连接的发送锁
+        :param request: exec_commands请求（data中stream为True）
+        :param payload_format: 响应编码
+        """
+        data = request.get("data") or {}
+        commands = data.get("commands") or []
+        request_id = request.get("id")
+        results = []
 
-                elif action == "key_press":
-                    keyCombo([params["key"]])  # 执行单个按键
+        def send(frame: Dict) -> None:
+            if request_id is not None:
+                frame["id"] = request_id
+            self._send_response(client_socket, send_lock, frame, payload_format)
 
-                else:
-                    result = {"action": action, "success": False, "error": "未知指令"}
+        try:
+            for result in self._iter_commands(commands, data.get("targets"), data.get("stop_on_failure", False)):
+                # 汇总只需要成功标记和等待时间，不保留完整结果
+                results.append({"success": result["success"], "waited": result.get("waited", 0)})
+                send({"stream": True, "result": result})
+            summary = self._summarize_results(results, len(commands))
+            summary.update({"stream": True, "done": True})
+            send(summary)
+        except OSError as e:
+            print(f"流式结果发送失败，停止执行: {str(e)}")
+
+    def _handle_request(self, request: Dict, client_addr) -> Dict:
+        """
+        分发单个请求到对应的处理函数（在查询线程池或输入队列中运行）
+        :param request: 已解码的请求
+        :param client_addr: 客户端地址（用于日志）
+        :return: 响应字典
+        """
+        request_type = request.get("type")
+        data = request.get("data") or {}
 
-                results.append(result)
-                time.sleep(0.2)  # 操作间增加短暂延迟，确保执行稳定
+        try:
+            if request_type == "hello":
+                # 能力协商：测试者据此决定负载编码和指令集编码
+                return {"success": True, "data": {
+                    "formats": [FORMAT_JSON, FORMAT_BINARY],
+                    "command_codecs": [CODEC_NAME]
+                }}
+
+            if request_type == "get_element":
+                # 处理元素查询请求
+                return self._get_element(
+                    element_path=data["element_path"],
+                    role_name_list=data.get("role_name_list")
+                )
+
+            if request_type == "get_elements":
+                # 处理批量元素查询请求（一次往返解析多个元素）
+                return self._get_elements(data["elements"])
+
+            if request_type == "stats":
+                # 处理耗时统计请求（各阶段直方图）
+                return {"success": True, "data": self.stats.snapshot(reset=data.get("reset", False))}
+
+            if request_type == "snapshot_tree":
+                # 处理元素树快照请求
+                return self._snapshot_tree(
+                    element_path=data.get("element_path"),
+                    role_name_list=data.get("role_name_list"),
+                    max_depth=data.get("max_depth")
+                )
+
+            if request_type == "wait_element":
+                # 处理等待元素出现请求
+                return self._wait_element(
+                    element_path=data["element_path"],
+                    role_name_list=data.get("role_name_list"),
+                    timeout=data.get("timeout", 10.0)
+                )
+
+            if request_type == "exec_commands":
+                # 处理指令集执行请求
+                return self._execute_commands(
+                    data["commands"], data.get("targets"), data.get("stop_on_failure", False)
+                )
+
+            return {"success": False, "error": "未知请求类型"}
+        except Exception as e:
+            return {"success": False, "error": f"处理请求失败: {str(e)}"}
 
-            except Exception as e:
-                results.append({
-                    "action": action,
-                    "success": False,
-                    "error": str(e)
-                })
+    def _run_traced(self, trace: Optional[RequestTrace], submitted: float, fn, *args):
+        """在工作线程中执行请求：记录排队等待时间，执行期间的阶段耗时计入该请求"""
+        with self.stats.tracing(trace):
+            self.stats.record("queue_wait", time.perf_counter() - submitted)
+            with self.stats.timer("execute"):
+                return fn(*args)
 
-        return {
-            "success": all(r["success"] for r in results),
-            "results": results
-        }
+    def _submit_request(self, request: Dict, client_addr, trace: Optional[RequestTrace] = None) -> Future:
+        """
+        提交请求：只读查询进入查询线程池并行执行；
+        注入输入的请求进入唯一的输入队列，按到达顺序串行执行，保证多个测试者的输入互不穿插
+        :param request: 已解码的请求
+        :param client_addr: 客户端地址
+        :param trace: 请求的耗时记录（可选）
+        :return: 结果为响应字典的Future
+        """
+        if request.get("type") in self.INPUT_REQUEST_TYPES:
+            executor = self.input_queue
+        else:
+            executor = self.query_pool
+        return executor.submit(self._run_traced, trace, time.perf_counter(), self._handle_request, request, client_addr)
+
+    def _send_response(self, client_socket: socket.socket, send_lock: threading.Lock, response: Dict,
+                       payload_format: int, trace: Optional[RequestTrace] = None) -> None:
+        """
+        编码并发送一帧响应，分别记录编码与发送耗时
+        :param trace: 请求的耗时记录（可选，发送完成后结束该请求的记录）
+        """
+        with self.stats.tracing(trace) if trace is not None else nullcontext():
+            with self.stats.timer("encode"):
+                payload = encode_payload(response, payload_format)
+            with self.stats.timer("send"):
+                with send_lock:
+                    send_frame(client_socket, payload, payload_format)
+        self.stats.finish(trace)
+
+    def _send_pipelined_response(self, client_socket: socket.socket, send_lock: threading.Lock,
+                                 request_id, payload_format: int, trace: Optional[RequestTrace],
+                                 future: Future) -> None:
+        """
+        流水线请求完成后回复（带请求id，可能与请求顺序不同）
+        :param client_socket: 客户端套接字
+        :param send_lock: 该连接的发送锁
+        :param request_id: 请求id
+        :param payload_format: 响应编码
+        :param trace: 请求的耗时记录
+        :param future: 已完成的请求Future
+        """
+        response = dict(future.result())
+        response["id"] = request_id
+        try:
+            self._send_response(client_socket, send_lock, response, payload_format, trace)
+        except OSError:
+            pass  # 客户端已断开
+
+    @staticmethod
+    def _unpack_commands(request: Dict) -> None:
+        """指令集以紧凑编码（packed_commands，见command_codec）发送时，就地解码为commands"""
+        data = request.get("data")
+        if request.get("type") == "exec_commands" and isinstance(data, dict) and "packed_commands" in data:
+            data["commands"] = decode_commands(data.pop("packed_commands"))
+
+    def _handle_client(self, client_socket: socket.socket, client_addr) -> None:
+        """
+        处理单个客户端的长连接（在客户端线程池中运行）
+        不带id的请求逐个处理并按顺序回复；带id的请求不等待结果，可在同一连接上同时挂起多个
+        :param client_socket: 客户端套接字
+        :param client_addr: 客户端地址
+        """
+        print(f"收到来自 {client_addr} 的连接，保持长连接")
+        send_lock = threading.Lock()  # 流水线回复来自工作线程，发送需互斥
+        try:
+            # 保持连接，循环处理请求
+            while self.is_running:
+                # 接收完整的一帧（长度头+负载），不再受单次recv大小限制
+                frame = recv_frame(client_socket)
+                if frame is None:
+                    print(f"测试者 {client_addr} 主动断开连接")
+                    break
+                payload, payload_format = frame
+
+                # 解析请求（按帧头声明的编码），响应使用与请求相同的编码
+                decode_start = time.perf_counter()
+                try:
+                    request = decode_payload(payload, payload_format)
+                    self._unpack_commands(request)
+                except ValueError:
+                    self._send_response(client_socket, send_lock,
+                                        {"success": False, "error": "无效的请求格式"}, payload_format)
+                    continue
+                decode_time = time.perf_counter() - decode_start
+
+                request_id = request.get("id")
+                trace = RequestTrace(request.get("type"), request_id)
+                with self.stats.tracing(trace):
+                    self.stats.record("decode", decode_time)
+                if request.get("type") == "disconnect":
+                    # 处理主动断开连接请求
+                    print(f"收到 {client_addr} 的断开连接请求")
+                    response = {"success": True, "message": "连接已断开"}
+                    if request_id is not None:
+                        response["id"] = request_id
+                    self._send_response(client_socket, send_lock, response, payload_format, trace)
+                    break
+
+                if request.get("type") == "exec_commands" and (request.get("data") or {}).get("stream"):
+                    # 流式执行：结果帧由输入队列线程直接发送
+                    future = self.input_queue.submit(
+                        self._run_traced, trace, time.perf_counter(),
+                        self._stream_commands, client_socket, send_lock, request, payload_format
+                    )
+                    # 在_run_traced记录完execute阶段后再结束该请求的记录
+                    future.add_done_callback(lambda _, trace=trace: self.stats.finish(trace))
+                    if request_id is None:
+                        future.result()
+                    continue
+
+                future = self._submit_request(request, client_addr, trace)
+                if request_id is None:
+                    # 发送响应
+                    response = future.result()
+                    self._send_response(client_socket, send_lock, response, payload_format, trace)
+                else:
+                    future.add_done_callback(partial(
+                        self._send_pipelined_response, client_socket, send_lock, request_id, payload_format, trace
+                    ))
+
+        except ProtocolError as e:
+            print(f"与 {client_addr} 的通信帧异常: {str(e)}")
+        except OSError as e:
+            print(f"与 {client_addr} 的连接异常: {str(e)}")
+        finally:
+            with self._clients_lock:
+                self._clients.discard(client_socket)
+            client_socket.close()
+            print(f"与 {client_addr} 的连接已关闭")
+
+    def _reject_client(self, client_socket: socket.socket, client_addr, timeout: float = 2.0) -> None:
+        """
+        拒绝超出max_clients的连接：读取首个请求并以相同编码回复错误帧后关闭
+        （先读取请求再关闭，避免未读数据使连接被重置，客户端收不到错误）
+        :param client_socket: 客户端套接字
+        :param client_addr: 客户端地址
+        :param timeout: 等待首个请求的超时时间（秒）
+        """
+        print(f"连接数已达上限({self.max_clients})，拒绝 {client_addr} 的连接")
+        try:
+            client_socket.settimeout(timeout)
+            frame = recv_frame(client_socket)
+            if frame is not None:
+                payload_format = frame[1]
+                response = {"success": False, "error": f"被测试机器连接数已达上限({self.max_clients})", "rejected": True}
+                try:
+                    request = decode_payload(*frame)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict) and request.get("id") is not None:
+                    response["id"] = request["id"]
+                send_frame(client_socket, encode_payload(response, payload_format), payload_format)
+        except (OSError, ProtocolError):
+            pass
+        finally:
+            client_socket.close()
 
     def start(self, app_name: Optional[str] = None) -> None:
         """
@@ -159,64 +768,40 @@ class TestedMachineCommunicator:
         try:
             # 绑定端口并开始监听
             self.server_socket.bind((self.bind_host, self.bind_port))
-            self.server_socket.listen(5)  # 最大等待连接数
+            self.server_socket.listen(self.max_clients)  # 最大等待连接数
             self.is_running = True
             print(f"被测试机器通信服务已启动，监听 {self.bind_host}:{self.bind_port}")
 
             # 若指定应用，连接到该应用（否则监控所有应用）
             if app_name:
-                self.app = dogtail.tree.root.application(app_name)
+                self.app = self.backend.application(app_name)
                 print(f"已绑定被测应用: {app_name}")
+            self.element_cache.clear()
+            if not self.event_monitor.start():
+                print("AT-SPI事件不可用，元素缓存仅依赖取出时的校验")
 
-            # 循环处理客户端连接
-            while self.is_running:
-                client_socket, client_addr = self.server_socket.accept()
-                print(f"收到来自 {client_addr} 的连接，保持长连接")
+            self.client_pool = ThreadPoolExecutor(max_workers=self.max_clients, thread_name_prefix="client")
+            self.query_pool = ThreadPoolExecutor(max_workers=self.max_clients, thread_name_prefix="query")
+            self.input_queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix="input")
 
+            # 循环接受客户端连接，每个连接交给线程池并发处理
+            while self.is_running:
                 try:
-                    # 保持连接，循环处理请求
-                    while self.is_running:
-                        # 接收请求数据（最大1MB）
-                        request_data = client_socket.recv(1024 * 1024).decode('utf-8')
-                        if not request_data:
-                            print(f"测试者 {client_addr} 主动断开连接")
-                            break
-
-                        # 解析请求（JSON格式）
-                        request = json.loads(request_data)
-                        response = {"success": False, "error": "未知请求类型"}
-
-                        # 处理不同类型的请求
-                        if request["type"] == "get_element":
-                            # 处理元素查询请求
-                            response = self._get_element(
-                                element_path=request["data"]["element_path"],
-                                role_name_list=request["data"].get("role_name_list")
-                            )
-
-                        elif request["type"] == "exec_commands":
-                            # 处理指令集执行请求
-                            response = self._execute_commands(request["data"]["commands"])
-                            
-                        elif request["type"] == "disconnect":
-                            # 处理主动断开连接请求
-                            print(f"收到 {client_addr} 的断开连接请求")
-                            response = {"success": True, "message": "连接已断开"}
-                            client_socket.sendall(json.dumps(response).encode('utf-8'))
-                            break
-
-                        # 发送响应
-                        client_socket.sendall(json.dumps(response).encode('utf-8'))
-
-                except json.JSONDecodeError:
-                    error_msg = {"success": False, "error": "无效的JSON格式"}
-                    client_socket.sendall(json.dumps(error_msg).encode('utf-8'))
-                except Exception as e:
-                    error_msg = {"success": False, "error": f"处理请求失败: {str(e)}"}
-                    client_socket.sendall(json.dumps(error_msg).encode('utf-8'))
-                finally:
-                    client_socket.close()
-                    print(f"与 {client_addr} 的连接已关闭")
+                    client_socket, client_addr = self.server_socket.accept()
+                except OSError:
+                    if not self.is_running:
+                        break  # stop()关闭了监听套接字
+                    raise
+                with self._clients_lock:
+                    accepted = len(self._clients) < self.max_clients
+                    if accepted:
+                        self._clients.add(client_socket)
+                if not accepted:
+                    # 连接数已满：不排队等待空闲线程（否则客户端会无响应地挂起），回复错误后关闭
+                    threading.Thread(target=self._reject_client, args=(client_socket, client_addr),
+                                     name="reject", daemon=True).start()
+                    continue
+                self.client_pool.submit(self._handle_client, client_socket, client_addr)
 
         except Exception as e:
             print(f"服务启动失败: {str(e)}")
@@ -227,13 +812,29 @@ class TestedMachineCommunicator:
         self.is_running = False
         if self.server_socket:
             self.server_socket.close()
+        self.event_monitor.stop()
+        self.stats.close()
+        # 关闭仍在等待请求的客户端连接，使其处理线程退出
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client_socket in clients:
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.client_pool:
+            self.client_pool.shutdown(wait=False)
+        if self.query_pool:
+            self.query_pool.shutdown(wait=False)
+        if self.input_queue:
+            self.input_queue.shutdown(wait=False)
         print("通信服务已停止")
 
 
 # 启动服务（直接运行该脚本即可）
 if __name__ == "__main__":
-    # 初始化服务，监听8888端口
-    communicator = TestedMachineCommunicator(bind_port=8888)
+    # 初始化服务，监听8888端口（后端由环境变量AUTO_TEST_BACKEND选择，默认为dogtail）
+    communicator = TestedMachineCommunicator(bind_port=8888, backend=create_backend())
     try:
         # 可指定被测应用名称，如 communicator.start(app_name="gedit")
         communicator.start(app_name="QGIS3")  # 启动QGIS应用的测试服务
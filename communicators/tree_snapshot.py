@@ -0,0 +1,321 @@
+import bisect
+import fnmatch
+from typing import Dict, List, Optional, Tuple
+
+SNAPSHOT_VERSION = 1
+# 每个节点在nodes数组中占用的整数个数及各字段含义
+NODE_FIELDS = ("name", "role", "parent", "x", "y", "width", "height", "states")
+NODE_SIZE = len(NODE_FIELDS)
+# AT-SPI状态集不可用时，从dogtail节点属性读取的状态
+FALLBACK_STATES = ("showing", "sensitive", "focused", "checked", "selected")
+
+
+def _node_states(node) -> List[str]:
+    """一次取出节点的状态集，返回状态名列表"""
+    try:
+        return [getattr(state, "value_nick", None) or str(state).lower() for state in node.getState().getStates()]
+    except Exception:
+        states = []
+        for name in FALLBACK_STATES:
+            try:
+                if getattr(node, name):
+                    states.append(name)
+            except Exception:
+                pass
+        return states
+
+
+def _node_extents(node):
+    """节点的(x, y, width, height)，没有Component接口时为全0"""
+    try:
+        x, y, width, height = node.extents
+        return int(x), int(y), int(width), int(height)
+    except Exception:
+        return 0, 0, 0, 0
+
+
+def _has_wildcard(pattern: str) -> bool:
+    return any(ch in pattern for ch in "*?[")
+
+
+def parse_query(query: str) -> List[Tuple[bool, str, Optional[str]]]:
+    """
+    解析路径查询表达式
+    语法："a/b"表示b是a的直接子节点，"a//b"表示b是a的任意后代；开头的"//"表示从根节点的任意后代开始；
+         每级可写为"名称"或"名称[角色名]"，名称和角色名都支持通配符（*、?）
+    例如："//Layers[frame]//*[table cell]"、"Web/Quick*/OSM"
+    :param query: 查询表达式
+    :return: [(是否为后代轴, 名称模式, 角色名模式或None), ...]
+    """
+    steps = []
+    descendant = False
+    for segment in query.split('/'):
+        segment = segment.strip()
+        if not segment:
+            descendant = True
+            continue
+        role = None
+        if segment.endswith(']') and '[' in segment:
+            segment, role = segment[:-1].split('[', 1)
+            segment, role = segment.strip(), role.strip() or None
+        steps.append((descendant, segment or '*', role))
+        descendant = False
+    return steps
+
+
+def capture_tree(root_node, max_depth: Optional[int] = None, max_nodes: int = 50000) -> Dict:
+    """
+    一次遍历子树并编码为紧凑快照（在被测试机器上运行）
+    快照格式：{"version",
+              "strings": 名称/角色名字符串表,
+              "states": 状态名表（节点状态以位掩码表示，第i位对应states[i]）,
+              "nodes": 扁平整数数组，每个节点NODE_SIZE项，依次为NODE_FIELDS,
+              "truncated": 是否因max_nodes被截断}
+    节点按先序排列，根节点下标为0、父节点下标为-1；name/role为strings中的下标
+    :param root_node: 遍历起点（dogtail节点）
+    :param max_depth: 最大遍历深度（None表示不限制，0表示只包含根节点）
+    :param max_nodes: 节点数上限
+    :return: 快照字典
+    """
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+    states: List[str] = []
+    state_index: Dict[str, int] = {}
+    nodes: List[int] = []
+
+    def intern(value) -> int:
+        value = value or ""
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    def state_mask(node) -> int:
+        mask = 0
+        for name in _node_states(node):
+            bit = state_index.get(name)
+            if bit is None:
+                bit = state_index[name] = len(states)
+                states.append(name)
+            mask |= 1 << bit
+        return mask
+
+    truncated = False
+    # 栈中元素：(节点, 父节点下标, 深度)；子节点逆序入栈以保持先序
+    stack = [(root_node, -1, 0)]
+    while stack:
+        if len(nodes) >= max_nodes * NODE_SIZE:
+            truncated = True
+            break
+        node, parent, depth = stack.pop()
+        index = len(nodes) // NODE_SIZE
+        try:
+            name, role = node.name, node.roleName
+        except Exception:
+            continue  # 遍历过程中节点已销毁
+        nodes.extend((intern(name), intern(role), parent, *_node_extents(node), state_mask(node)))
+        if max_depth is not None and depth >= max_depth:
+            continue
+        try:
+            children = list(node.children)
+        except Exception:
+            children = []
+        for child in reversed(children):
+            stack.append((child, index, depth + 1))
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "strings": strings,
+        "states": states,
+        "nodes": nodes,
+        "truncated": truncated
+    }
+
+
+class TreeSnapshot:
+    """
+    客户端的树快照：解码capture_tree的结果，在本地回答路径查询，不再访问网络
+    节点以数组存储（先序下标、父节点下标、子树区间），并按名称、角色名建立哈希索引，
+    每级查找只需在索引列表上二分定位子树区间
+    find()的路径语义与被测试机器的get_element相同：逐级在当前节点的后代中按先序找第一个名称（及角色）匹配的节点
+    query()支持直接子节点、任意后代（//）与通配符，返回全部匹配
+    """
+
+    def __init__(self, snapshot: Dict):
+        """
+        :param snapshot: capture_tree返回的快照字典
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {snapshot.get('version')}")
+        self.strings = snapshot["strings"]
+        self.state_names = snapshot["states"]
+        self.truncated = snapshot.get("truncated", False)
+        nodes = snapshot["nodes"]
+        count = len(nodes) // NODE_SIZE
+        self.names = [self.strings[i] for i in nodes[0::NODE_SIZE]]
+        self.roles = [self.strings[i] for i in nodes[1::NODE_SIZE]]
+        self.parents = nodes[2::NODE_SIZE]
+        self.extents = [tuple(nodes[i * NODE_SIZE + 3:i * NODE_SIZE + 7]) for i in range(count)]
+        self.state_masks = nodes[7::NODE_SIZE]
+        self.children: List[List[int]] = [[] for _ in range(count)]
+        for index, parent in enumerate(self.parents):
+            if parent >= 0:
+                self.children[parent].append(index)
+        # 先序排列下，节点i的子树为下标区间[i, subtree_end[i])
+        self.subtree_end = list(range(1, count + 1))
+        for index in range(count - 1, 0, -1):
+            parent = self.parents[index]
+            if self.subtree_end[index] > self.subtree_end[parent]:
+                self.subtree_end[parent] = self.subtree_end[index]
+        # 名称/角色名 -> 按先序排列的节点下标列表
+        self.name_index: Dict[str, List[int]] = {}
+        self.role_index: Dict[str, List[int]] = {}
+        for index in range(count):
+            self.name_index.setdefault(self.names[index], []).append(index)
+            self.role_index.setdefault(self.roles[index], []).append(index)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def states(self, index: int) -> List[str]:
+        """节点的状态名列表"""
+        mask = self.state_masks[index]
+        return [name for bit, name in enumerate(self.state_names) if mask >> bit & 1]
+
+    def _in_subtree(self, indexes: List[int], index: int) -> List[int]:
+        """索引列表中位于节点index后代区间内的部分"""
+        low = bisect.bisect_right(indexes, index)
+        high = bisect.bisect_left(indexes, self.subtree_end[index], low)
+        return indexes[low:high]
+
+    def _find_descendant(self, index: int, name: str, role: Optional[str]) -> Optional[int]:
+        """在节点index的后代中按先序查找第一个匹配的节点"""
+        for candidate in self._in_subtree(self.name_index.get(name, []), index):
+            if not role or self.roles[candidate] == role:
+                return candidate
+        return None
+
+    def _match_step(self, index: int, descendant: bool, name: str, role: Optional[str]) -> List[int]:
+        """节点index之下满足一级查询条件的节点"""
+        name_literal = not _has_wildcard(name)
+        role_literal = role is not None and not _has_wildcard(role)
+        if name_literal:
+            candidates = self._in_subtree(self.name_index.get(name, []), index)
+        elif role_literal:
+            candidates = self._in_subtree(self.role_index.get(role, []), index)
+        elif descendant:
+            candidates = range(index + 1, self.subtree_end[index])
+        else:
+            candidates = self.children[index]
+
+        matches = []
+        for candidate in candidates:
+            if not descendant and self.parents[candidate] != index:
+                continue
+            if not name_literal and name != '*' and not fnmatch.fnmatchcase(self.names[candidate], name):
+                continue
+            if role is not None and role != '*' and not fnmatch.fnmatchcase(self.roles[candidate], role):
+                continue
+            matches.append(candidate)
+        return matches
+
+    def query(self, query: str) -> List[int]:
+        """
+        按查询表达式查找全部匹配的节点（语法见parse_query，路径相对于快照根节点）
+        :param query: 查询表达式，如"//Layers[frame]//*[table cell]"
+        :return: 按先序排列的节点下标列表
+        """
+        current = [0] if len(self) else []
+        for descendant, name, role in parse_query(query):
+            found = set()
+            for index in current:
+                found.update(self._match_step(index, descendant, name, role))
+            current = sorted(found)
+            if not current:
+                break
+        return current
+
+    def query_names(self, query: str) -> List[str]:
+        """查询匹配节点的名称列表"""
+        return [self.names[index] for index in self.query(query)]
+
+    def missing(self, paths: List) -> List[str]:
+        """
+        批量校验元素是否存在（均在本地完成）
+        :param paths: 元素列表，每项为get_element格式的路径字符串、(路径, 角色名列表)元组，
+                      或以"/"开头的查询表达式（如"//Layers[frame]//BeiJing[table cell]"）
+        :return: 不存在的元素列表（全部存在时为空列表）
+        """
+        missing = []
+        for item in paths:
+            path, roles = (item, None) if isinstance(item, str) else item
+            if path.startswith('/'):
+                found = bool(self.query(path))
+            else:
+                found = self.find(path, roles) is not None
+            if not found:
+                missing.append(path)
+        return missing
+
+    def find(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None) -> Optional[int]:
+        """
+        按路径查找节点（路径相对于快照根节点）
+        :param element_path: 元素路径（如"菜单/文件/新建"）
+        :param role_name_list: 各级角色名列表（可选，项可为None或""）
+        :return: 节点下标，未找到返回None
+        """
+        parts = [part.strip() for part in element_path.split('/') if part.strip()]
+        roles = list(role_name_list or [])
+        current = 0
+        for level, part in enumerate(parts):
+            role = roles[level] if level < len(roles) else None
+            current = self._find_descendant(current, part, role)
+            if current is None:
+                return None
+        return current if parts else None
+
+    def element_info(self, index: int) -> Dict:
+        """节点信息，格式与get_element响应的data字段相同"""
+        x, y, width, height = self.extents[index]
+        return {
+            "position": {"x": x, "y": y},
+            "size": {"width": width, "height": height}
+        }
+
+    def get_element_info(self, element_path: str, role_name_list: Optional[List[Optional[str]]] = None) -> Dict:
+        """
+        在快照中查询元素，返回与get_element请求相同格式的响应
+        :param element_path: 元素路径
+        :param role_name_list: 各级角色名列表（可选）
+        :return: {"success", "data"} 或 {"success": False, "error"}
+        """
+        index = self.find(element_path, role_name_list)
+        if index is None:
+            return {"success": False, "error": f"快照中不存在元素: {element_path}"}
+        return {"success": True, "data": self.element_info(index)}
+
+    def path_of(self, index: int) -> str:
+        """节点从快照根节点开始的完整路径（用于调试输出）"""
+        parts = []
+        while index > 0:
+            parts.append(self.names[index])
+            index = self.parents[index]
+        return '/'.join(reversed(parts))
+
+    def dump(self, max_depth: Optional[int] = None) -> str:
+        """
+        以缩进文本形式输出快照（用于排查查找失败）
+        :param max_depth: 输出的最大深度（None表示全部）
+        :return: 文本
+        """
+        lines = []
+        stack = [(0, 0)] if len(self) else []
+        while stack:
+            index, depth = stack.pop()
+            x, y, width, height = self.extents[index]
+            lines.append(f"{'  ' * depth}[{self.roles[index]}] {self.names[index]!r} "
+                         f"({x}, {y}, {width}, {height}) {','.join(self.states(index))}")
+            if max_depth is None or depth < max_depth:
+                stack.extend((child, depth + 1) for child in reversed(self.children[index]))
+        return '\n'.join(lines)
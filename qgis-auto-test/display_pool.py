@@ -0,0 +1,347 @@
+import contextlib
+import logging
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger('DisplayPool')
+
+# AT-SPI总线启动器的常见安装位置（不存在时依赖D-Bus按需激活）
+AT_SPI_LAUNCHER_PATHS = (
+    '/usr/libexec/at-spi-bus-launcher',
+    '/usr/lib/at-spi2-core/at-spi-bus-launcher',
+    '/usr/lib/at-spi2/at-spi-bus-launcher',
+)
+
+# 就绪探针：被测应用已在AT-SPI桌面上出现且存在可见的主窗口
+READY_PROBE = '''
+import sys
+import pyatspi
+name = sys.argv[1]
+for app in pyatspi.Registry.getDesktop(0):
+    if app is not None and app.name == name:
+        for window in app:
+            if window is not None and window.getState().contains(pyatspi.STATE_SHOWING):
+                sys.exit(0)
+sys.exit(1)
+'''
+
+
+class DisplaySession:
+    """
+    一个独立的无头GUI会话：Xvfb + 窗口管理器 + D-Bus会话总线/AT-SPI总线 + QGIS
+    """
+
+    def __init__(self, display, screen='1920x1080x24', window_manager=('openbox',),
+                 app_command=('qgis', '--nologo', '--noversioncheck'), app_name='QGIS3'):
+        """
+        :param display: X显示编号（如99对应":99"）
+        :param screen: Xvfb屏幕参数（宽x高x色深）
+        :param window_manager: 窗口管理器命令（None表示不启动）
+        :param app_command: 被测应用启动命令
+        :param app_name: 被测应用在AT-SPI中的名称（用于就绪探针）
+        """
+        self.display = display
+        self.screen = screen
+        self.window_manager = list(window_manager) if window_manager else None
+        self.app_command = list(app_command)
+        self.app_name = app_name
+        self.dbus_address = None
+        self.leases = 0  # 已出借次数
+        self.profile_dir = None
+        self._processes = {}  # 名称 -> Popen
+
+    @property
+    def name(self):
+        return f":{self.display}"
+
+    @property
+    def env(self):
+        """运行用例所需的环境变量"""
+        env = {
+            'DISPLAY': self.name,
+            'QT_ACCESSIBILITY': '1',
+            'QT_LINUX_ACCESSIBILITY_ALWAYS_ON': '1',
+        }
+        if self.dbus_address:
+            env['DBUS_SESSION_BUS_ADDRESS'] = self.dbus_address
+        return env
+
+    def _spawn(self, name, args, env=None):
+        """启动子进程（独立进程组，便于整组结束）"""
+        full_env = dict(os.environ)
+        full_env.update(self.env)
+        full_env.update(env or {})
+        self._processes[name] = subprocess.Popen(
+            args, env=full_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        return self._processes[name]
+
+    def _wait_for_x(self, timeout):
+        """等待Xvfb创建显示套接字"""
+        socket_path = f"/tmp/.X11-unix/X{self.display}"
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.exists(socket_path):
+                return
+            if self._processes['xvfb'].poll() is not None:
+                raise RuntimeError(f"Xvfb启动失败: {self.name}")
+            time.sleep(0.05)
+        raise RuntimeError(f"等待Xvfb超时: {self.name}")
+
+    def _start_dbus(self):
+        """启动独立的D-Bus会话总线并记录地址"""
+        process = subprocess.Popen(
+            ['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        self._processes['dbus'] = process
+        address = process.stdout.readline().decode().strip()
+        if not address:
+            raise RuntimeError(f"D-Bus会话总线启动失败: {self.name}")
+        self.dbus_address = address
+
+    def start(self, timeout=30):
+        """
+        依次启动Xvfb、D-Bus会话总线、AT-SPI总线、窗口管理器和被测应用（不等待应用就绪）
+        :param timeout: 等待Xvfb的超时时间（秒）
+        """
+        self._spawn('xvfb', ['Xvfb', self.name, '-screen', '0', self.screen, '-nolisten', 'tcp'])
+        self._wait_for_x(timeout)
+        self._start_dbus()
+        launcher = next((path for path in AT_SPI_LAUNCHER_PATHS if os.path.exists(path)), None)
+        if launcher:
+            self._spawn('atspi', [launcher, '--launch-immediately'])
+        if self.window_manager and shutil.which(self.window_manager[0]):
+            self._spawn('wm', self.window_manager)
+        # 每个会话使用独立的QGIS配置目录，避免多个实例互相写配置
+        self.profile_dir = tempfile.mkdtemp(prefix=f"qgis-profile-{self.display}-")
+        self._spawn('app', self.app_command + ['--profiles-path', self.profile_dir])
+        logger.info(f"{self.name} 已启动")
+
+    def probe(self, timeout=10):
+        """就绪探针：在本会话的环境中检查被测应用主窗口是否可见"""
+        env = dict(os.environ)
+        env.update(self.env)
+        try:
+            completed = subprocess.run([sys.executable, '-c', READY_PROBE, self.app_name], env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        return completed.returncode == 0
+
+    def wait_ready(self, timeout=120, interval=1.0):
+        """
+        等待被测应用就绪（预热）
+        :param timeout: 超时时间（秒）
+        :param interval: 探测间隔（秒）
+        """
+        start = time.time()
+        while time.time() - start < timeout:
+            if not self.alive():
+                raise RuntimeError(f"{self.name} 启动过程中有进程退出")
+            if self.probe():
+                logger.info(f"{self.name} 已就绪，耗时 {time.time() - start:.1f}秒")
+                return
+            time.sleep(interval)
+        raise RuntimeError(f"等待{self.app_name}就绪超时: {self.name}")
+
+    def alive(self):
+        """所有进程是否仍在运行"""
+        return bool(self._processes) and all(p.poll() is None for p in self._processes.values())
+
+    def app_rss_mb(self):
+        """被测应用的常驻内存（MB），读取失败返回0"""
+        process = self._processes.get('app')
+        if process is None:
+            return 0.0
+        try:
+            with open(f"/proc/{process.pid}/status", 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return 0.0
+
+    def stop(self, timeout=5):
+        """按启动的逆序结束全部进程"""
+        for name in reversed(list(self._processes)):
+            process = self._processes[name]
+            if process.poll() is None:
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(process.pid, signal.SIGTERM)
+                try:
+                    process.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    with contextlib.suppress(ProcessLookupError):
+                        os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+            if process.stdout:
+                process.stdout.close()
+        self._processes.clear()
+        self.dbus_address = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+        logger.info(f"{self.name} 已停止")
+
+
+class DisplayPool:
+    """
+    无头显示池：预先启动并预热N个DisplaySession，按需出借给测试执行者
+    归还时检查进程存活、内存占用和出借次数，不健康的会话在后台回收重建
+    """
+
+    def __init__(self, size, first_display=99, max_leases=20, max_rss_mb=2048, ready_timeout=120,
+                 **session_options):
+        """
+        :param size: 会话数量
+        :param first_display: 第一个会话的X显示编号
+        :param max_leases: 单个会话最多出借次数，超过后重建（清理累积状态）
+        :param max_rss_mb: 被测应用内存上限（MB），超过视为泄漏并重建
+        :param ready_timeout: 等待会话就绪的超时时间（秒）
+        :param session_options: 传给DisplaySession的其他参数
+        """
+        self.size = size
+        self.first_display = first_display
+        self.max_leases = max_leases
+        self.max_rss_mb = max_rss_mb
+        self.ready_timeout = ready_timeout
+        self.session_options = session_options
+        self.sessions = []
+        self._ready = queue.Queue()
+        self._closed = False
+        self._recyclers = []
+        self._alive = 0  # 就绪、已出借或正在预热/重建的会话数（放弃的会话不计入）
+        self._alive_lock = threading.Lock()
+
+    def _give_up(self, session):
+        """会话不再可用：从存活计数中移除"""
+        with self._alive_lock:
+            self._alive -= 1
+            if self._alive == 0:
+                logger.error("全部显示会话均已失效")
+
+    def _warm_up(self, session, retries=2):
+        """启动会话并等待就绪，成功后放入可出借队列"""
+        for attempt in range(retries + 1):
+            if self._closed:
+                self._give_up(session)
+                return
+            try:
+                session.start()
+                session.wait_ready(self.ready_timeout)
+                session.leases = 0
+                self._ready.put(session)
+                return
+            except Exception as e:
+                logger.error(f"{session.name} 预热失败（第{attempt + 1}次）: {e}")
+                session.stop()
+        logger.error(f"{session.name} 多次预热失败，已放弃")
+        self._give_up(session)
+
+    def start(self, wait=True):
+        """
+        并行启动并预热全部会话
+        :param wait: 是否等待全部会话预热完成
+        :return: self
+        """
+        threads = []
+        for i in range(self.size):
+            session = DisplaySession(self.first_display + i, **self.session_options)
+            self.sessions.append(session)
+            with self._alive_lock:
+                self._alive += 1
+            thread = threading.Thread(target=self._warm_up, args=(session,), name=f"warmup{session.name}")
+            thread.start()
+            threads.append(thread)
+        if wait:
+            for thread in threads:
+                thread.join()
+        return self
+
+    def healthy(self, session):
+        """会话是否可继续出借"""
+        if not session.alive():
+            logger.warning(f"{session.name} 有进程已退出")
+            return False
+        rss = session.app_rss_mb()
+        if self.max_rss_mb and rss > self.max_rss_mb:
+            logger.warning(f"{session.name} 内存占用{rss:.0f}MB超过上限")
+            return False
+        return session.leases < self.max_leases
+
+    def _recycle(self, session):
+        """后台结束并重建会话"""
+        def rebuild():
+            session.stop()
+            self._warm_up(session)
+        thread = threading.Thread(target=rebuild, name=f"recycle{session.name}")
+        thread.start()
+        self._recyclers.append(thread)
+
+    def acquire(self, timeout=None, poll_interval=0.5):
+        """
+        取出一个就绪的会话（用完后须调用release归还）
+        :param timeout: 等待可用会话的超时时间（秒，None表示一直等待）
+        :param poll_interval: 检查会话是否已全部失效的间隔（秒）
+        :return: DisplaySession（其env属性包含DISPLAY和DBUS_SESSION_BUS_ADDRESS）
+        :raises RuntimeError: 等待超时，或全部会话已失效（不会再有会话就绪）
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = poll_interval if deadline is None else min(poll_interval, deadline - time.time())
+            try:
+                session = self._ready.get(timeout=max(wait, 0))
+                break
+            except queue.Empty:
+                pass
+            if self._alive == 0 or self._closed:
+                raise RuntimeError("全部显示会话均已失效")
+            if deadline is not None and time.time() >= deadline:
+                raise RuntimeError("等待可用的显示会话超时")
+        session.leases += 1
+        return session
+
+    def release(self, session):
+        """归还会话：健康的放回可出借队列，否则在后台回收重建"""
+        if not self._closed:
+            if self.healthy(session):
+                self._ready.put(session)
+            else:
+                self._recycle(session)
+
+    @contextlib.contextmanager
+    def lease(self, timeout=None):
+        """
+        出借一个就绪的会话，with块结束时自动归还
+        :param timeout: 等待可用会话的超时时间（秒，None表示一直等待）
+        :return: DisplaySession（其env属性包含DISPLAY和DBUS_SESSION_BUS_ADDRESS）
+        :raises RuntimeError: 等待超时，或全部会话已失效
+        """
+        session = self.acquire(timeout)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def close(self):
+        """结束全部会话"""
+        self._closed = True
+        for thread in self._recyclers:
+            thread.join()
+        for session in self.sessions:
+            session.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
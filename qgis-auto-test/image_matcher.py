@@ -0,0 +1,238 @@
+import time
+import cv2
+import numpy as np
+
+try:
+    import pyautogui
+except Exception:  # 无图形显示的环境中导入失败，此时须通过无障碍后端截图
+    pyautogui = None
+
+
+class ImageMatcher:
+    """
+    模板匹配引擎：只截取需要的区域，先在降采样金字塔上粗匹配，
+    再仅在少数候选位置附近做全分辨率精细匹配
+    """
+
+    def __init__(self, pyramid_levels=2, candidates=3, min_coarse_size=12, coarse_margin=0.2, backend=None):
+        """
+        :param pyramid_levels: 最多降采样的层数（每层缩小一半）
+        :param candidates: 粗匹配后参与精细匹配的候选位置数
+        :param min_coarse_size: 降采样后模板的最小边长（像素），模板过小时减少层数
+        :param coarse_margin: 粗匹配得分相对置信度的放宽量（粗匹配精度较低）
+        :param backend: 无障碍后端（可选），提供时通过其screenshot()截图，否则使用pyautogui
+        """
+        self.backend = backend
+        self.pyramid_levels = pyramid_levels
+        self.candidates = candidates
+        self.min_coarse_size = min_coarse_size
+        self.coarse_margin = coarse_margin
+
+    def grab(self, region=None):
+        """
+        截取屏幕区域并转为灰度图
+        :param region: 截图区域 (left, top, width, height)，None表示全屏
+        :return: (灰度图, 区域左上角坐标(x, y))
+        """
+        if self.backend is not None:
+            screenshot = self.backend.screenshot(region)
+        else:
+            screenshot = pyautogui.screenshot(region=region)
+        frame = cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_RGB2GRAY)
+        offset = (region[0], region[1]) if region else (0, 0)
+        return frame, offset
+
+    def load_template(self, image_path):
+        """
+        读取模板图像（灰度）
+        :param image_path: 图像路径
+        :return: 灰度图
+        """
+        template = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            raise FileNotFoundError(f"无法读取模板图像: {image_path}")
+        return template
+
+    def _levels_for(self, template):
+        """根据模板尺寸确定可用的降采样层数"""
+        levels = 0
+        height, width = template.shape[:2]
+        while levels < self.pyramid_levels and min(height, width) >> (levels + 1) >= self.min_coarse_size:
+            levels += 1
+        return levels
+
+    def _coarse_candidates(self, frame, template, levels, min_score):
+        """在降采样图像上匹配，返回若干候选位置（全分辨率坐标）"""
+        scale = 1 << levels
+        small_frame = cv2.resize(frame, (frame.shape[1] // scale, frame.shape[0] // scale),
+                                 interpolation=cv2.INTER_AREA)
+        small_template = cv2.resize(template, (template.shape[1] // scale, template.shape[0] // scale),
+                                    interpolation=cv2.INTER_AREA)
+        if small_frame.shape[0] < small_template.shape[0] or small_frame.shape[1] < small_template.shape[1]:
+            return []
+        scores = cv2.matchTemplate(small_frame, small_template, cv2.TM_CCOEFF_NORMED)
+
+        candidates = []
+        suppress_h, suppress_w = small_template.shape[:2]
+        for _ in range(self.candidates):
+            _, score, _, (x, y) = cv2.minMaxLoc(scores)
+            if score < min_score:
+                break
+            candidates.append((x * scale, y * scale))
+            # 抑制该候选附近的峰值，使下一个候选落在别处
+            scores[max(0, y - suppress_h // 2):y + suppress_h // 2 + 1,
+                   max(0, x - suppress_w // 2):x + suppress_w // 2 + 1] = -1
+        return candidates
+
+    def _refine(self, frame, template, x, y, radius):
+        """在候选位置附近的小窗口内做全分辨率匹配"""
+        height, width = template.shape[:2]
+        left = max(0, x - radius)
+        top = max(0, y - radius)
+        right = min(frame.shape[1], x + width + radius)
+        bottom = min(frame.shape[0], y + height + radius)
+        window = frame[top:bottom, left:right]
+        if window.shape[0] < height or window.shape[1] < width:
+            return -1.0, (x, y)
+        scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+        return score, (left + best_x, top + best_y)
+
+    def match(self, frame, template, confidence=0.7):
+        """
+        在灰度图中查找模板
+        :param frame: 灰度截图
+        :param template: 灰度模板
+        :param confidence: 置信度阈值
+        :return: (得分, (x, y))，未达到阈值返回None
+        """
+        height, width = template.shape[:2]
+        if frame.shape[0] < height or frame.shape[1] < width:
+            return None
+
+        levels = self._levels_for(template)
+        if levels == 0:
+            scores = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, location = cv2.minMaxLoc(scores)
+        else:
+            score, location = -1.0, None
+            radius = 1 << levels
+            for x, y in self._coarse_candidates(frame, template, levels, confidence - self.coarse_margin):
+                candidate_score, candidate_location = self._refine(frame, template, x, y, radius)
+                if candidate_score > score:
+                    score, location = candidate_score, candidate_location
+
+        if location is None or score < confidence:
+            return None
+        return score, location
+
+    def snapshot(self, region=None):
+        """
+        截取一帧可复用的快照，可对其依次查找多个模板
+        :param region: 截图区域 (left, top, width, height)，None表示全屏
+        :return: FrameSnapshot
+        """
+        return FrameSnapshot(self, region)
+
+    def locate(self, image_path, region=None, confidence=0.7, template=None):
+        """
+        截取区域并查找图像
+        :param image_path: 图像路径
+        :param region: 截图区域 (left, top, width, height)，None表示全屏
+        :param confidence: 置信度阈值
+        :param template: 已加载的灰度模板（可选，不传则从image_path读取）
+        :return: 匹配结果字典{x,y,width,height,center_x,center_y,score,grab_time,match_time}，未找到返回None
+        """
+        if template is None:
+            template = self.load_template(image_path)
+        return self.snapshot(region).locate(image_path, template, confidence)
+
+    def locate_all(self, templates, region=None, confidence=0.7):
+        """
+        只截一次图，查找多个模板
+        :param templates: {名称: 灰度模板}
+        :param region: 截图区域 (left, top, width, height)，None表示全屏
+        :param confidence: 置信度阈值
+        :return: {名称: 匹配结果字典或None}
+        """
+        snapshot = self.snapshot(region)
+        return {name: snapshot.locate(name, template, confidence) for name, template in templates.items()}
+
+
+class FrameSnapshot:
+    """
+    一帧截图的可复用快照：同一帧上可查找任意多个模板，匹配结果按模板缓存
+    refresh()重新截图，帧指纹（降采样像素的哈希）不变时保留已有的匹配结果
+    """
+
+    FINGERPRINT_STRIDE = 8  # 计算指纹时的像素采样步长
+
+    def __init__(self, matcher, region=None):
+        """
+        :param matcher: ImageMatcher实例
+        :param region: 截图区域 (left, top, width, height)，None表示全屏
+        """
+        self.matcher = matcher
+        self.region = region
+        self._matches = {}  # (名称, 置信度) -> 匹配结果
+        self._capture()
+
+    def _capture(self):
+        """截图并计算指纹"""
+        start = time.perf_counter()
+        self.frame, self.offset = self.matcher.grab(self.region)
+        self.grab_time = time.perf_counter() - start
+        self.fingerprint = self.compute_fingerprint(self.frame)
+
+    @classmethod
+    def compute_fingerprint(cls, frame):
+        """对降采样后的像素做哈希，作为判断屏幕是否变化的廉价指纹"""
+        sample = np.ascontiguousarray(frame[::cls.FINGERPRINT_STRIDE, ::cls.FINGERPRINT_STRIDE])
+        return hash(sample.tobytes())
+
+    def refresh(self):
+        """
+        重新截图；屏幕有变化时清空匹配结果缓存
+        :return: 屏幕是否发生了变化
+        """
+        old_fingerprint = self.fingerprint
+        self._capture()
+        changed = self.fingerprint != old_fingerprint
+        if changed:
+            self._matches.clear()
+        return changed
+
+    def locate(self, name, template, confidence=0.7):
+        """
+        在本帧中查找模板
+        :param name: 模板名称（用于缓存，通常为图像路径）
+        :param template: 灰度模板
+        :param confidence: 置信度阈值
+        :return: 匹配结果字典{x,y,width,height,center_x,center_y,score,grab_time,match_time}，未找到返回None
+        """
+        key = (name, confidence)
+        if key in self._matches:
+            return self._matches[key]
+
+        start = time.perf_counter()
+        found = self.matcher.match(self.frame, template, confidence)
+        match_time = time.perf_counter() - start
+        result = None
+        if found is not None:
+            score, (x, y) = found
+            height, width = template.shape[:2]
+            x += self.offset[0]
+            y += self.offset[1]
+            result = {
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+                "center_x": x + width // 2,
+                "center_y": y + height // 2,
+                "score": float(score),
+                "grab_time": self.grab_time,
+                "match_time": match_time
+            }
+        self._matches[key] = result
+        return result
@@ -0,0 +1,322 @@
+import argparse
+import ast
+import fnmatch
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from display_pool import DisplayPool
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY_FILE = os.path.join(TEST_DIR, '.test_durations.json')
+DEFAULT_DURATION = 60.0  # 无历史记录时的预估耗时（秒）
+
+logger = logging.getLogger('ParallelRunner')
+
+
+class Worker:
+    """
+    测试执行环境：一个独立的被测QGIS会话（本机的某个X显示，或通过ssh等命令前缀访问的远程主机）
+    用例在执行环境中直接通过dogtail/pyautogui操作QGIS，因此不支持以TestedMachineCommunicator端点作为执行环境
+    """
+
+    def __init__(self, name, env=None, command_prefix=None, workdir=None, python=None, pool=None):
+        """
+        :param name: 名称（用于日志和报告）
+        :param env: 额外的环境变量，如{"DISPLAY": ":99", "DBUS_SESSION_BUS_ADDRESS": "..."}
+        :param command_prefix: 命令前缀，如["ssh", "user@host"]，为空表示在本机执行
+        :param workdir: 用例目录（远程执行时为远程路径，默认本目录）
+        :param python: Python解释器（默认本机为当前解释器，远程为python3）
+        :param pool: 本机DisplayPool（可选），每个用例运行前从池中租用一个显示会话
+        """
+        self.name = name
+        self.env = dict(env or {})
+        self.command_prefix = list(command_prefix or [])
+        self.workdir = workdir or TEST_DIR
+        self.python = python or ('python3' if self.command_prefix else sys.executable)
+        self.pool = pool
+
+    @classmethod
+    def from_dict(cls, config):
+        """由配置字典创建（字段同__init__参数）"""
+        return cls(**config)
+
+    def build_command(self, test_id, extra_env=None):
+        """
+        生成运行单个用例的命令
+        :param test_id: 用例id（模块.类.方法）
+        :param extra_env: 额外的环境变量（如租用的显示会话的环境变量）
+        :return: (命令参数列表, 环境变量字典或None, 工作目录或None)
+        """
+        args = [self.python, '-m', 'unittest', test_id]
+        worker_env = dict(self.env)
+        worker_env.update(extra_env or {})
+        if not self.command_prefix:
+            env = dict(os.environ)
+            env.update(worker_env)
+            return args, env, self.workdir
+        # 远程执行：环境变量和工作目录写入远程命令
+        assignments = [f"{key}={shlex.quote(value)}" for key, value in worker_env.items()]
+        remote = ' '.join(['cd', shlex.quote(self.workdir), '&&'] + assignments + [shlex.quote(a) for a in args])
+        return self.command_prefix + [remote], None, None
+
+    def __repr__(self):
+        return f"Worker({self.name})"
+
+
+def discover_tests(test_dir=TEST_DIR, pattern='test_*.py'):
+    """
+    静态扫描用例（不导入模块，运行调度器的机器无需安装dogtail）
+    :param test_dir: 用例目录
+    :param pattern: 文件名模式
+    :return: 用例id列表（模块.类.方法）
+    """
+    test_ids = []
+    for filename in sorted(os.listdir(test_dir)):
+        if not fnmatch.fnmatch(filename, pattern) or filename == 'test_base.py':
+            continue
+        module = filename[:-3]
+        with open(os.path.join(test_dir, filename), 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename)
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef) and node.name.startswith('Test'):
+                for item in node.body:
+                    if isinstance(item, ast.FunctionDef) and item.name.startswith('test'):
+                        test_ids.append(f"{module}.{node.name}.{item.name}")
+    return test_ids
+
+
+class DurationHistory:
+    """用例历史耗时（JSON文件），用于按耗时均衡调度"""
+
+    def __init__(self, path=DEFAULT_HISTORY_FILE, smoothing=0.5):
+        """
+        :param path: 历史文件路径
+        :param smoothing: 新耗时的权重（指数滑动平均）
+        """
+        self.path = path
+        self.smoothing = smoothing
+        self.durations = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.durations = json.load(f)
+
+    def estimate(self, test_id):
+        """预估耗时：有记录用记录，否则用已知耗时的中位数"""
+        if test_id in self.durations:
+            return self.durations[test_id]
+        if not self.durations:
+            return DEFAULT_DURATION
+        known = sorted(self.durations.values())
+        return known[len(known) // 2]
+
+    def record(self, test_id, duration):
+        """记录一次成功运行的耗时"""
+        old = self.durations.get(test_id)
+        self.durations[test_id] = duration if old is None else old + self.smoothing * (duration - old)
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.durations, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+class ParallelRunner:
+    """
+    并行调度用例：每个执行环境一个线程，按预估耗时从长到短领取用例（LPT），
+    失败的用例换一个执行环境重试，最后合并所有结果
+    """
+
+    def __init__(self, workers, history=None, retries=1, timeout=1800, lease_timeout=600):
+        """
+        :param workers: Worker列表
+        :param history: DurationHistory（可选）
+        :param retries: 失败后的重试次数（每次重试换一个尚未运行过该用例的执行环境）
+        :param timeout: 单个用例的超时时间（秒）
+        :param lease_timeout: 从显示池租用会话的超时时间（秒）
+        """
+        if not workers:
+            raise ValueError("至少需要一个执行环境")
+        self.workers = workers
+        self.history = history or DurationHistory()
+        self.retries = retries
+        self.timeout = timeout
+        self.lease_timeout = lease_timeout
+        self._condition = threading.Condition()
+        self._pending = []  # [(用例id, 已运行过的执行环境名称集合)]
+        self._running = 0
+        self._results = {}  # 用例id -> 运行记录列表
+
+    def _run_test(self, worker, test_id):
+        """在执行环境中运行单个用例，返回运行记录；执行环境带显示池时先租用一个显示会话"""
+        if worker.pool is None:
+            return self._run_in(worker, test_id)
+        try:
+            session = worker.pool.acquire(self.lease_timeout)
+        except RuntimeError as e:
+            # 没有可用的显示会话（等待超时或全部失效）时记为error，不阻塞调度
+            return {'test_id': test_id, 'worker': worker.name, 'status': 'error', 'duration': 0, 'output': str(e)}
+        try:
+            record = self._run_in(worker, test_id, session.env)
+            record['display'] = session.name
+            return record
+        finally:
+            worker.pool.release(session)
+
+    def _run_in(self, worker, test_id, extra_env=None):
+        args, env, cwd = worker.build_command(test_id, extra_env)
+        start = time.time()
+        try:
+            completed = subprocess.run(args, env=env, cwd=cwd, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, timeout=self.timeout)
+            status = 'passed' if completed.returncode == 0 else 'failed'
+            output = completed.stdout.decode('utf-8', errors='replace')
+        except subprocess.TimeoutExpired as e:
+            status = 'timeout'
+            output = (e.output or b'').decode('utf-8', errors='replace')
+        except OSError as e:
+            status = 'error'
+            output = str(e)
+        return {
+            'test_id': test_id,
+            'worker': worker.name,
+            'status': status,
+            'duration': round(time.time() - start, 3),
+            'output': output[-4000:]
+        }
+
+    def _take(self, worker):
+        """领取下一个可在该执行环境运行的用例；没有可领取的用例且无用例在运行时返回None"""
+        with self._condition:
+            while True:
+                for i, (test_id, tried) in enumerate(self._pending):
+                    # 重试必须换执行环境；所有环境都试过时允许任意环境
+                    if worker.name not in tried or len(tried) >= len(self.workers):
+                        self._pending.pop(i)
+                        self._running += 1
+                        return test_id, tried
+                if self._running == 0:
+                    return None
+                self._condition.wait()
+
+    def _worker_loop(self, worker):
+        while True:
+            task = self._take(worker)
+            if task is None:
+                return
+            test_id, tried = task
+            logger.info(f"[{worker.name}] 开始: {test_id}")
+            record = self._run_test(worker, test_id)
+            logger.info(f"[{worker.name}] {record['status']}: {test_id} ({record['duration']:.1f}秒)")
+            with self._condition:
+                self._running -= 1
+                self._results.setdefault(test_id, []).append(record)
+                if record['status'] == 'passed':
+                    self.history.record(test_id, record['duration'])
+                elif len(self._results[test_id]) <= self.retries:
+                    self._pending.append((test_id, tried | {worker.name}))
+                    logger.warning(f"{test_id} 将在其他执行环境重试")
+                self._condition.notify_all()
+
+    def run(self, test_ids):
+        """
+        并行运行用例
+        :param test_ids: 用例id列表
+        :return: 合并后的报告字典
+        """
+        start = time.time()
+        self._results = {}
+        self._pending = [(test_id, frozenset())
+                         for test_id in sorted(test_ids, key=self.history.estimate, reverse=True)]
+        threads = [threading.Thread(target=self._worker_loop, args=(worker,), name=worker.name)
+                   for worker in self.workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.history.save()
+        return self.merge(test_ids, time.time() - start)
+
+    def merge(self, test_ids, wall_time):
+        """合并各执行环境的运行记录：用例以最后一次运行的状态为准"""
+        tests = []
+        for test_id in test_ids:
+            attempts = self._results.get(test_id, [])
+            final = attempts[-1] if attempts else {'status': 'not_run', 'worker': None, 'duration': 0}
+            tests.append({
+                'test_id': test_id,
+                'status': final['status'],
+                'worker': final['worker'],
+                'duration': final['duration'],
+                'flaky': final['status'] == 'passed' and len(attempts) > 1,
+                'attempts': attempts
+            })
+        passed = sum(1 for test in tests if test['status'] == 'passed')
+        return {
+            'success': passed == len(tests),
+            'total': len(tests),
+            'passed': passed,
+            'failed': len(tests) - passed,
+            'workers': [worker.name for worker in self.workers],
+            'wall_time': round(wall_time, 3),
+            'test_time': round(sum(r['duration'] for rs in self._results.values() for r in rs), 3),
+            'tests': tests
+        }
+
+
+def load_workers(args, pool=None):
+    """由命令行参数生成执行环境列表"""
+    workers = [Worker(f"pool{i}", pool=pool) for i in range(pool.size)] if pool else []
+    if args.workers:
+        with open(args.workers, 'r', encoding='utf-8') as f:
+            workers.extend(Worker.from_dict(config) for config in json.load(f))
+    for display in args.display or []:
+        workers.append(Worker(f"display{display}", env={'DISPLAY': display}))
+    if not workers:
+        workers.append(Worker('local'))
+    return workers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在多个被测QGIS会话上并行运行用例")
+    parser.add_argument('tests', nargs='*', help="用例id（模块.类.方法），默认运行全部用例")
+    parser.add_argument('--workers', help="执行环境配置文件（JSON列表，字段见Worker）")
+    parser.add_argument('--display', action='append', help="本机X显示（如:99），可多次指定")
+    parser.add_argument('--xvfb', type=int, default=0, help="启动指定数量的无头显示会话（Xvfb+QGIS）并行运行")
+    parser.add_argument('--pattern', default='test_*.py', help="用例文件名模式")
+    parser.add_argument('--retries', type=int, default=1, help="失败重试次数")
+    parser.add_argument('--timeout', type=float, default=1800, help="单个用例超时时间（秒）")
+    parser.add_argument('--lease-timeout', type=float, default=600, help="等待空闲显示会话的超时时间（秒）")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE, help="历史耗时文件")
+    parser.add_argument('--report', help="合并后的JSON报告输出路径")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    test_ids = args.tests or discover_tests(pattern=args.pattern)
+    pool = DisplayPool(args.xvfb).start() if args.xvfb else None
+    try:
+        workers = load_workers(args, pool)
+        logger.info(f"共{len(test_ids)}个用例，{len(workers)}个执行环境")
+        runner = ParallelRunner(workers, DurationHistory(args.history), args.retries, args.timeout,
+                                args.lease_timeout)
+        report = runner.run(test_ids)
+    finally:
+        if pool:
+            pool.close()
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for test in report['tests']:
+        flaky = "（重试后通过）" if test['flaky'] else ""
+        logger.info(f"{test['status']:8} {test['test_id']} [{test['worker']}] {test['duration']:.1f}秒{flaky}")
+    logger.info(f"通过 {report['passed']}/{report['total']}，总耗时 {report['wall_time']:.1f}秒"
+                f"（用例累计 {report['test_time']:.1f}秒）")
+    return 0 if report['success'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+import logging
+
+# 复用communicators中的AT-SPI事件监听、元素等待与界面安静判断
+COMMUNICATORS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'communicators')
+if COMMUNICATORS_DIR not in sys.path:
+    sys.path.append(COMMUNICATORS_DIR)
+from atspi_events import AtspiEventMonitor
+from backends import SearchError, get_backend
+from element_waiter import ElementWaiter, WAIT_EVENT_TYPES
+from pacing import Pacer, PACING_EVENT_TYPES
+
+_monitor = None
+_waiter = None
+_events_lock = threading.Lock()
+
+
+def get_element_waiter():
+    """
+    获取进程内共享的元素等待器（首次调用时启动AT-SPI事件监听）
+    """
+    global _monitor, _waiter
+    with _events_lock:
+        if _waiter is None:
+            _monitor = AtspiEventMonitor(dict.fromkeys(WAIT_EVENT_TYPES + PACING_EVENT_TYPES))
+            _monitor.start()
+            _waiter = ElementWaiter(_monitor)
+    return _waiter
+
+
+class QGISSession:
+    """
+    进程内共享的QGIS会话：只附加一次应用，缓存menubar/statusbar/rect等常用句柄
+    以"主窗口可见且界面安静"作为就绪信号，代替每个用例前的固定等待
+    """
+
+    def __init__(self, app_name='QGIS3', timeout=60, quiet_period=0.5, fallback_delay=3.0):
+        """
+        :param app_name: 被测应用名称
+        :param timeout: 等待应用就绪的超时时间（秒）
+        :param quiet_period: 无AT-SPI事件持续多久视为界面安静（秒）
+        :param fallback_delay: AT-SPI事件不可用时的固定等待（秒，仅在附加时等待一次）
+        """
+        self.app_name = app_name
+        self.timeout = timeout
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.waiter = get_element_waiter()
+        self.pacer = Pacer(self.waiter.event_monitor, quiet_period=quiet_period, fallback_delay=fallback_delay)
+        self.qgis = None
+        self.menubar = None
+        self.statusbar = None
+        self.rect = None
+
+    def _find_application(self):
+        """查找被测应用（不使用dogtail的重试；元素树来自AUTO_TEST_BACKEND选择的后端）"""
+        try:
+            return get_backend().root().child(name=self.app_name, roleName='application', recursive=False, retry=False)
+        except (LookupError, SearchError):
+            return None
+
+    def _find_main_window(self):
+        """查找可见的主窗口"""
+        try:
+            rect = self.qgis.child(roleName="frame", retry=False)
+        except (LookupError, SearchError):
+            return None
+        return rect if rect.showing else None
+
+    def attach(self):
+        """
+        附加到被测应用并等待就绪：应用出现 -> 主窗口可见 -> 界面安静
+        :return: self
+        """
+        start = time.time()
+        self.qgis = self.waiter.wait(self._find_application, self.timeout)
+        if self.qgis is None:
+            raise RuntimeError(f"等待应用超时: {self.app_name}")
+        remaining = max(0.0, self.timeout - (time.time() - start))
+        self.rect = self.waiter.wait(self._find_main_window, remaining)
+        if self.rect is None:
+            raise RuntimeError(f"等待主窗口超时: {self.app_name}")
+        self.menubar = self.qgis.child(roleName='menu bar')
+        self.statusbar = self.qgis.child(roleName='status bar')
+        self.pacer.wait_for_idle(max(0.0, self.timeout - (time.time() - start)))
+        self.logger.info(f"{self.app_name}已就绪，耗时 {time.time() - start:.2f}秒")
+        return self
+
+    def is_alive(self):
+        """缓存的句柄是否仍然有效（应用未退出且主窗口可见）"""
+        if self.rect is None:
+            return False
+        try:
+            return bool(self.rect.showing)
+        except Exception:
+            return False
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_qgis_session(app_name='QGIS3'):
+    """
+    获取进程内共享的QGIS会话；首次调用或应用已重启时重新附加
+    """
+    global _session
+    with _session_lock:
+        if _session is None or _session.app_name != app_name:
+            _session = QGISSession(app_name)
+        if not _session.is_alive():
+            _session.attach()
+    return _session
@@ -0,0 +1,111 @@
+import os
+import threading
+import cv2
+
+# 默认模板目录：与本文件同级的qgis_image
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'qgis_image')
+
+
+class TemplateRegistry:
+    """
+    模板图像注册表：模板只解码一次，以灰度数组（及HiDPI缩放版本）常驻内存供匹配引擎使用
+    """
+
+    def __init__(self, image_dir=DEFAULT_IMAGE_DIR, scales=(1.0,), default_scale=1.0):
+        """
+        :param image_dir: 模板目录
+        :param scales: 预先生成的缩放比例（如HiDPI下的1.5、2.0）
+        :param default_scale: get()未指定比例时使用的缩放比例
+        """
+        self.image_dir = os.path.abspath(image_dir)
+        self.scales = tuple(scales)
+        self.default_scale = default_scale
+        self.decode_count = 0  # 实际从磁盘解码的次数
+        self._templates = {}  # (绝对路径, 缩放比例) -> 灰度数组
+        self._lock = threading.Lock()
+
+    def _resolve_path(self, image_path):
+        """将图像路径转换为绝对路径；相对路径先按当前目录查找，再按模板目录的上级目录查找"""
+        if os.path.isabs(image_path):
+            return os.path.normpath(image_path)
+        candidate = os.path.abspath(image_path)
+        if os.path.exists(candidate):
+            return candidate
+        return os.path.normpath(os.path.join(os.path.dirname(self.image_dir), image_path))
+
+    def _decode(self, path):
+        """从磁盘解码为灰度数组"""
+        template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            raise FileNotFoundError(f"无法读取模板图像: {path}")
+        self.decode_count += 1
+        return template
+
+    @staticmethod
+    def _rescale(template, scale):
+        """生成缩放版本"""
+        height, width = template.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(template, size, interpolation=interpolation)
+
+    def preload(self):
+        """
+        解码模板目录下的全部PNG，并生成各缩放比例的版本
+        :return: 已加载的模板数量
+        """
+        count = 0
+        for dirpath, _, filenames in os.walk(self.image_dir):
+            for filename in sorted(filenames):
+                if filename.lower().endswith('.png'):
+                    for scale in self.scales:
+                        self.get(os.path.join(dirpath, filename), scale)
+                    count += 1
+        return count
+
+    def get(self, image_path, scale=None):
+        """
+        获取模板的灰度数组，未加载过的模板按需解码并缓存
+        :param image_path: 图像路径（如'qgis_image/apply.png'）
+        :param scale: 缩放比例（默认default_scale）
+        :return: 灰度数组
+        """
+        scale = self.default_scale if scale is None else scale
+        path = self._resolve_path(image_path)
+        key = (path, scale)
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                base = self._templates.get((path, 1.0))
+                if base is None:
+                    base = self._decode(path)
+                    self._templates[(path, 1.0)] = base
+                template = base if scale == 1.0 else self._rescale(base, scale)
+                self._templates[key] = template
+        return template
+
+    def __len__(self):
+        return len(self._templates)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry():
+    """
+    获取进程内共享的模板注册表（首次调用时预加载模板目录）
+    HiDPI缩放比例可通过环境变量QT_SCALE_FACTOR指定
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            scale = float(os.environ.get('QT_SCALE_FACTOR', '1') or 1)
+            scales = (1.0,) if scale == 1.0 else (1.0, scale)
+            _registry = TemplateRegistry(scales=scales, default_scale=scale)
+            _registry.preload()
+    return _registry
@@ -90,6 +90,11 @@ class TestQGISProjectCreation(QGISDogtailTest):
         # self.addVectorLayer('/home/yys/QGIS/qgis-auto-test/data/ShangHai.geojson')
         beijing_layer = self.addVectorLayerFromBrowser('BeiJing.geojson')
         shanghai_layer = self.addVectorLayerFromBrowser('ShangHai.geojson')
+        # 验证：三个图层均已出现在图层列表中（一次遍历，本地批量校验）
+        self.assert_elements_exist(
+            ['//OSM Standard[table cell]', '//BeiJing[table cell]', '//ShangHai[table cell]'],
+            element=layer_tree, msg="图层未全部添加到图层列表"
+        )
 
         map_view = self.qgis.child(roleName="frame")
         self.drag_map_percentage(0.6, 0.7, 0.5, 0.6)
@@ -147,6 +152,10 @@ class TestQGISProjectCreation(QGISDogtailTest):
         self.drag_item_to_cousin(layers[0], layers[1])
         layer_bar = layers_panel.child(roleName='tool bar')
         layer_bar.child(name='Add Group', roleName='push button').click()
+        self.assert_elements_exist(
+            ['//BeiJing[table cell]', '//ShangHai[table cell]', '//group1[table cell]'],
+            element=layer_tree, msg="新建图层组后图层列表不完整"
+        )
         beijing_layer = layer_tree.child(name='BeiJing', roleName='table cell')
         shanghai_layer = layer_tree.child(name='ShangHai', roleName='table cell')
         group = layer_tree.child(name='group1', roleName='table cell')
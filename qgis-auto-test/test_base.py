@@ -1,44 +1,69 @@
 import os
+import sys
 import time
 import unittest
 import logging
 import pyautogui
-from dogtail.tree import root
+
+# 后端、锚点与树快照等模块位于communicators目录
+COMMUNICATORS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'communicators')
+if COMMUNICATORS_DIR not in sys.path:
+    sys.path.append(COMMUNICATORS_DIR)
+from image_matcher import ImageMatcher
+from template_registry import get_template_registry
+from qgis_session import get_element_waiter, get_qgis_session
+from backends import SearchError, get_backend
+from motion_path import perform_drag
+from anchors import resolve_point
+from tree_snapshot import TreeSnapshot, capture_tree
 
 class QGISDogtailTest(unittest.TestCase):
     """QGIS自动化测试基类，封装常用操作"""
-    
-    def setUp(self):
+
+    @classmethod
+    def setUpClass(cls):
         # 初始化日志
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
+        # 进程内共享的QGIS会话：只附加一次，等待主窗口可见且界面安静后返回
+        cls.session = get_qgis_session('QGIS3')
+        # 图像识别引擎与进程内共享的模板注册表（模板只解码一次）
+        cls.matcher = ImageMatcher(backend=get_backend())
+        cls.templates = get_template_registry()
+
+    @classmethod
+    def element_waiter(cls):
+        """获取进程内共享的元素等待器"""
+        return get_element_waiter()
+    
+    def setUp(self):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.setLevel(logging.INFO)
         
-        # 获取QGIS应用实例
-        self.qgis = root.application('QGIS3')
-        # self.dialog_app = root.application('qgis')
-        self.logger.info("QGIS应用已启动")
-        self.menubar = self.qgis.child(roleName='menu bar')
-        self.statusbar = self.qgis.child(roleName='status bar')
-        self.rect = self.qgis.child(roleName="frame")
-        
-        # 等待主界面加载完成
-        time.sleep(3)
+        # 复用会话中的QGIS句柄（应用重启后自动重新附加）
+        if not self.session.is_alive():
+            self.logger.warning("QGIS句柄已失效，重新附加")
+        session = get_qgis_session('QGIS3')
+        self.qgis = session.qgis
+        self.menubar = session.menubar
+        self.statusbar = session.statusbar
+        self.rect = session.rect
+        self.last_match = None
 
     
     def tearDown(self):
         self.logger.info("测试完成")
 
     
-    def find_element(self, path, roleName=None, recursive=True):
+    def find_element(self, path, roleName=None, recursive=True, retry=True):
         """
         通过路径查找元素
         :param path: 元素路径，格式为"父元素1/父元素2/目标元素"
         :param roleName: 元素角色名（可选）
         :param recursive: 是否递归查找（默认True）
+        :param retry: 是否使用dogtail的重试查找（默认True）
         :return: 找到的元素或None
         """
         elements = path.split("/")
@@ -47,17 +72,47 @@ class QGISDogtailTest(unittest.TestCase):
         for element_name in elements:
             try:
                 if recursive:
-                    current = current.child(name=element_name, roleName=roleName, recursive=True)
+                    current = current.child(name=element_name, roleName=roleName, recursive=True, retry=retry)
                 else:
-                    current = current.child(name=element_name, roleName=roleName, recursive=False)
+                    current = current.child(name=element_name, roleName=roleName, recursive=False, retry=retry)
                 self.logger.debug(f"找到元素: {element_name}")
-            except LookupError:
-                self.logger.error(f"未找到元素: {element_name}")
+            except (LookupError, SearchError):
+                if retry:
+                    self.logger.error(f"未找到元素: {element_name}")
+                else:
+                    self.logger.debug(f"未找到元素: {element_name}")
                 return None
         
         return current
     
     
+    def snapshot_tree(self, element=None, max_depth=None):
+        """
+        一次遍历元素子树，构建可在本地查询的索引树（查询不再访问AT-SPI）
+        :param element: 子树根元素（默认QGIS应用）
+        :param max_depth: 最大遍历深度（可选）
+        :return: TreeSnapshot，支持find()路径查询与query()通配/后代（//）查询
+        """
+        start_time = time.time()
+        tree = TreeSnapshot(capture_tree(element or self.qgis, max_depth))
+        self.logger.info(f"元素树快照: {len(tree)}个节点，耗时 {time.time() - start_time:.2f}秒")
+        return tree
+
+
+    def assert_elements_exist(self, paths, element=None, msg=None):
+        """
+        批量断言元素存在：只遍历一次元素树，所有路径在本地校验
+        :param paths: 元素列表，每项为路径字符串、(路径, 角色名列表)元组或查询表达式（如"//BeiJing[table cell]"）
+        :param element: 子树根元素（默认QGIS应用），路径相对于该元素
+        :param msg: 断言失败时的提示
+        :return: 元素树快照（可继续用于其他查询）
+        """
+        tree = self.snapshot_tree(element)
+        missing = tree.missing(paths)
+        self.assertEqual(missing, [], msg or f"未找到元素: {missing}")
+        return tree
+
+
     def click(self, x=None, y=None):
         if x and y:
             pyautogui.click(x,y)
@@ -146,39 +201,119 @@ class QGISDogtailTest(unittest.TestCase):
     
     def wait_for_element(self, path, roleName=None, timeout=10):
         """
-        等待元素出现
+        等待元素出现：仅在AT-SPI报告子节点变化/窗口创建时重新查找，事件不可用时短间隔轮询
         :param path: 元素路径
         :param roleName: 元素角色名（可选）
         :param timeout: 超时时间（秒）
-        :return: 找到元素返回True，超时返回False
+        :return: 找到元素返回元素，超时返回False
         """
         start_time = time.time()
-        while time.time() - start_time < timeout:
-            element = self.find_element(path, roleName)
-            if element:
-                return element
-            time.sleep(1)
-        return False
+        element = self.element_waiter().wait(
+            lambda: self.find_element(path, roleName, retry=False), timeout
+        )
+        if element is None:
+            self.logger.error(f"等待元素超时: {path}")
+            return False
+        self.logger.info(f"元素已出现: {path}，等待 {time.time() - start_time:.2f}秒")
+        return element
     
     
-    # 备用的pyautogui图像识别方法
-    def find_image(self, image_path, region=None, confidence=0.7, timeout=5):
+    # 备用的图像识别方法
+    def element_region(self, element):
+        """
+        获取元素所在的屏幕区域
+        :param element: 元素对象
+        :return: 区域元组 (left, top, width, height)
+        """
+        x, y = element.position
+        width, height = element.size
+        return (x, y, width, height)
+
+
+    def find_image(self, image_path, region=None, confidence=0.7, timeout=5, element=None):
         """
-        使用pyautogui识别图像
+        识别图像：只截取给定区域，降采样粗匹配后在候选位置精细匹配
         :param image_path: 图像路径
+        :param region: 查找区域 (left, top, width, height)（可选）
         :param confidence: 识别置信度
         :param timeout: 超时时间（秒）
-        :return: 找到图像返回位置元组 (x, y)，未找到返回None
+        :param element: 提示元素（可选），未指定region时只在该元素区域内查找
+        :return: 找到图像返回位置元组 (x, y)，未找到返回None；匹配得分与耗时记录在self.last_match
         """
+        if region is None and element is not None:
+            region = self.element_region(element)
+        template = self.templates.get(image_path)
         start_time = time.time()
         while time.time() - start_time < timeout:
-            pos = pyautogui.locateOnScreen(image_path, region=region, confidence=confidence)
-            if pos:
-                return pyautogui.center(pos)
+            match = self.matcher.locate(image_path, region=region, confidence=confidence, template=template)
+            if match:
+                self.last_match = match
+                self.logger.info(
+                    f"图像匹配: {image_path} 得分 {match['score']:.3f}，"
+                    f"截图 {match['grab_time'] * 1000:.1f}ms，匹配 {match['match_time'] * 1000:.1f}ms"
+                )
+                return (match["center_x"], match["center_y"])
             time.sleep(0.2)
         return None
     
     
+    def find_images(self, image_paths, region=None, confidence=0.7, timeout=5):
+        """
+        同时识别多个图像：每次轮询只截一帧，所有图像都在这一帧上查找
+        :param image_paths: 图像路径列表
+        :param region: 查找区域 (left, top, width, height)（可选）
+        :param confidence: 识别置信度
+        :param timeout: 超时时间（秒），全部找到或超时后返回
+        :return: {图像路径: 位置元组 (x, y) 或 None}
+        """
+        templates = {image_path: self.templates.get(image_path) for image_path in image_paths}
+        found = {}
+        snapshot = None
+        start_time = time.time()
+        while True:
+            if snapshot is None:
+                snapshot = self.matcher.snapshot(region)
+            elif not snapshot.refresh():
+                time.sleep(0.2)  # 屏幕未变化，无需重新匹配
+                if time.time() - start_time >= timeout:
+                    break
+                continue
+            for image_path, template in templates.items():
+                if image_path in found:
+                    continue
+                match = snapshot.locate(image_path, template, confidence)
+                if match:
+                    found[image_path] = (match["center_x"], match["center_y"])
+                    self.logger.info(f"图像匹配: {image_path} 得分 {match['score']:.3f}")
+            if len(found) == len(templates) or time.time() - start_time >= timeout:
+                break
+            time.sleep(0.2)
+        return {image_path: found.get(image_path) for image_path in image_paths}
+
+
+    def click_images(self, image_paths, confidence=0.7, timeout=5):
+        """
+        在同一帧中识别多个图像后依次点击（适用于同一对话框中同时可见、位置不会互相影响的按钮；
+        可能不出现的图像、或点击后界面会变化的按钮之后的图像，应单独使用click_image）
+        :param image_paths: 图像路径列表（按点击顺序）
+        :param confidence: 识别置信度
+        :param timeout: 超时时间（秒）
+        :return: 全部点击成功返回 True，否则返回 False
+        """
+        positions = self.find_images(image_paths, confidence=confidence, timeout=timeout)
+        success = True
+        for image_path in image_paths:
+            pos = positions[image_path]
+            if pos:
+                pyautogui.click(pos[0], pos[1])
+                self.logger.info(f"图像识别点击: {image_path}")
+                time.sleep(0.2)
+            else:
+                self.logger.warning(f"图像识别失败: {image_path}")
+                success = False
+        return success
+
+
     def find_image_in_percentage_region(self, image_path, percentage_region, confidence=0.7, timeout=5):
         """
         在指定百分比区域内查找图像
@@ -199,15 +334,16 @@ class QGISDogtailTest(unittest.TestCase):
         return self.find_image(image_path, region=region, confidence=confidence, timeout=timeout)
     
 
-    def click_image(self, image_path, confidence=0.7, timeout=5):
+    def click_image(self, image_path, confidence=0.7, timeout=5, element=None):
         """
         使用 pyautogui 识别并点击图像，复用 find_image
         :param image_path: 图像路径
         :param confidence: 识别置信度
         :param timeout: 超时时间（秒）
+        :param element: 提示元素（可选），只在该元素区域内查找
         :return: 点击成功返回 True，失败返回 False
         """
-        pos = self.find_image(image_path, confidence=confidence, timeout=timeout)
+        pos = self.find_image(image_path, confidence=confidence, timeout=timeout, element=element)
         if pos:
             pyautogui.click(pos[0], pos[1])
             self.logger.info(f"图像识别点击: {image_path}")
@@ -221,15 +357,16 @@ class QGISDogtailTest(unittest.TestCase):
         return False
     
 
-    def double_click_image(self, image_path, confidence=0.7, timeout=5):
+    def double_click_image(self, image_path, confidence=0.7, timeout=5, element=None):
         """
         使用 pyautogui 识别并双击图像，复用 find_image
         :param image_path: 图像路径
         :param confidence: 识别置信度
         :param timeout: 超时时间（秒）
+        :param element: 提示元素（可选），只在该元素区域内查找
         :return: 双击成功返回 True，失败返回 False
         """
-        pos = self.find_image(image_path, confidence=confidence, timeout=timeout)
+        pos = self.find_image(image_path, confidence=confidence, timeout=timeout, element=element)
         if pos:
             pyautogui.doubleClick(pos[0], pos[1])
             self.logger.info(f"图像识别双击: {image_path}")
@@ -312,9 +449,9 @@ class QGISDogtailTest(unittest.TestCase):
         :param offset_y: 相对Y偏移量
         :return: None
         """
-        x, y = element.position
-        pyautogui.moveTo(x + offset_x, y + offset_y)
-        self.logger.info(f"鼠标移动到元素相对位置: ({x + offset_x}, {y + offset_y})")
+        x, y = resolve_point(get_backend().geometry(element), "top-left", (offset_x, offset_y))
+        pyautogui.moveTo(x, y)
+        self.logger.info(f"鼠标移动到元素相对位置: ({x}, {y})")
         time.sleep(0.2)
 
 
@@ -335,8 +472,8 @@ class QGISDogtailTest(unittest.TestCase):
         :param end_y: 结束点Y坐标
         :return: None
         """
-        pyautogui.moveTo(start_x, start_y)
-        pyautogui.dragTo(end_x, end_y, duration=0.5)
+        # 经后端逐帧注入移动事件，按下/释放与移动间隔由后端统一处理
+        perform_drag(get_backend(), (start_x, start_y), (end_x, end_y), duration=0.5)
         self.logger.info(f"从 ({start_x}, {start_y}) 拖动到 ({end_x}, {end_y})")
         time.sleep(0.2)
 
@@ -351,12 +488,9 @@ class QGISDogtailTest(unittest.TestCase):
         :return: None
         """
         rect = self.qgis.child(roleName="frame")
-        x, y = rect.position
-        width, height = rect.size
-        start_x = x + int(width * start_x_pct)
-        start_y = y + int(height * start_y_pct)
-        end_x = x + int(width * end_x_pct)
-        end_y = y + int(height * end_y_pct)
+        geometry = get_backend().geometry(rect)
+        start_x, start_y = resolve_point(geometry, pct=(start_x_pct, start_y_pct))
+        end_x, end_y = resolve_point(geometry, pct=(end_x_pct, end_y_pct))
         
         self.drag_to(start_x, start_y, end_x, end_y)
 
@@ -0,0 +1,27 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'communicators'))
+
+from backends import AccessibilityBackend, RecordingBackend, SyntheticBackend
+
+
+class TestBackendInterface(unittest.TestCase):
+    """后端接口的抽象方法"""
+
+    def test_builtin_backends_implement_interface(self):
+        backend = SyntheticBackend.generate(2, 2)
+        RecordingBackend(backend)
+
+    def test_partial_backend_fails_on_creation(self):
+        class PartialBackend(AccessibilityBackend):
+            def root(self):
+                return None
+
+        with self.assertRaises(TypeError):
+            PartialBackend()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'communicators'))
+
+from backends import SyntheticBackend
+from tested_communicator import TestedMachineCommunicator
+from test_communicator import TestMachineCommunicator
+
+
+class TestDisconnect(unittest.TestCase):
+    """disconnect断开连接池中的全部连接"""
+
+    def setUp(self):
+        self.server = TestedMachineCommunicator('127.0.0.1', 0, backend=SyntheticBackend.generate(2, 2))
+        threading.Thread(target=self.server.start, kwargs={'app_name': 'QGIS3'}, daemon=True).start()
+        deadline = time.time() + 5
+        while not self.server.is_running and time.time() < deadline:
+            time.sleep(0.01)
+        self.client = TestMachineCommunicator('127.0.0.1', self.server.server_socket.getsockname()[1])
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_disconnect_drains_pool(self):
+        pool = self.client.pool
+        lent = pool.acquire()
+        idle = pool.acquire()
+        pool.release(idle)
+
+        self.assertTrue(self.client.disconnect()['success'])
+        self.assertEqual(pool.idle_count(), 0)
+        self.assertEqual(idle.fileno(), -1)
+        # 断开时仍被借出的连接在归还时关闭，不再放回连接池
+        pool.release(lent)
+        self.assertEqual(pool.idle_count(), 0)
+        self.assertEqual(lent.fileno(), -1)
+        # 连接池仍可使用，之后的请求重新建立连接
+        self.assertTrue(self.client.get_stats()['success'])
+        self.assertEqual(pool.idle_count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
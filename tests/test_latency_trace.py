@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'communicators'))
+
+from backends import SyntheticBackend
+from tested_communicator import TestedMachineCommunicator
+from test_communicator import TestMachineCommunicator
+
+
+class TestStreamTrace(unittest.TestCase):
+    """流式exec_commands的请求追踪记录"""
+
+    def setUp(self):
+        self.trace_dir = tempfile.TemporaryDirectory()
+        self.trace_path = os.path.join(self.trace_dir.name, 'server_trace.jsonl')
+        self.server = TestedMachineCommunicator('127.0.0.1', 0, backend=SyntheticBackend.generate(2, 2),
+                                                trace_file=self.trace_path)
+        threading.Thread(target=self.server.start, kwargs={'app_name': 'QGIS3'}, daemon=True).start()
+        deadline = time.time() + 5
+        while not self.server.is_running and time.time() < deadline:
+            time.sleep(0.01)
+        self.client = TestMachineCommunicator('127.0.0.1', self.server.server_socket.getsockname()[1])
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.trace_dir.cleanup()
+
+    def read_traces(self, request_type, timeout=2.0):
+        """读取追踪文件中指定类型的请求（记录在最后一帧发出后写入，需稍作等待）"""
+        deadline = time.time() + timeout
+        while True:
+            traces = []
+            if os.path.exists(self.trace_path):
+                with open(self.trace_path, 'r', encoding='utf-8') as f:
+                    traces = [json.loads(line) for line in f if line.strip()]
+            traces = [trace for trace in traces if trace['type'] == request_type]
+            if traces or time.time() > deadline:
+                return traces
+            time.sleep(0.02)
+
+    def test_stream_trace_includes_execute(self):
+        commands = [{'action': 'mouse_move', 'params': {'x': i, 'y': i}, 'pacing': 'none'} for i in range(3)]
+        frames = list(self.client.execute_commands_stream(commands))
+        self.assertTrue(frames[-1]['done'])
+
+        traces = self.read_traces('exec_commands')
+        self.assertEqual(len(traces), 1)
+        phases = traces[0]['phases_ms']
+        self.assertIn('queue_wait', phases)
+        self.assertIn('execute', phases)
+        self.assertIn('inject.mouse_move', phases)
+        self.assertGreaterEqual(traces[0]['total_ms'], phases['execute'])
+        # 总耗时直方图在execute之后记录
+        stats = self.server.stats.snapshot()['phases']
+        self.assertEqual(stats['request.exec_commands']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'communicators'))
+
+from anchors import symbolic_target
+from backends import SyntheticBackend, SyntheticNode
+from tested_communicator import TestedMachineCommunicator
+
+
+class TestPercentageTargets(unittest.TestCase):
+    """百分比符号目标在应用节点没有范围时的解析"""
+
+    def make_server(self, *frames):
+        root = SyntheticNode("main", "desktop frame")
+        app = root.add(SyntheticNode("QGIS3", "application", (0, 0), (0, 0)))
+        for frame in frames:
+            app.add(frame)
+        server = TestedMachineCommunicator('127.0.0.1', 0, backend=SyntheticBackend(root, screen_size=(1000, 800)))
+        server.app = app
+        self.addCleanup(server.stop)
+        return server
+
+    def resolve(self, server, start_pct, end_pct):
+        params = server._resolve_symbolic({
+            "at": symbolic_target("QGIS3", ["application"], pct=start_pct),
+            "end_at": symbolic_target("QGIS3", ["application"], pct=end_pct),
+        })
+        return (params["x"], params["y"]), (params["end_x"], params["end_y"])
+
+    def test_zero_extent_app_uses_main_frame(self):
+        server = self.make_server(SyntheticNode("QGIS", "frame", (100, 50), (800, 600)))
+        start, end = self.resolve(server, (0.5, 0.5), (0.75, 0.25))
+        self.assertEqual(start, (500, 350))
+        self.assertEqual(end, (700, 200))
+
+    def test_zero_extent_app_without_frame_uses_screen(self):
+        server = self.make_server()
+        start, end = self.resolve(server, (0.5, 0.5), (0.75, 0.25))
+        self.assertEqual(start, (500, 400))
+        self.assertEqual(end, (750, 200))
+
+
+if __name__ == '__main__':
+    unittest.main()